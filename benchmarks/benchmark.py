@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+"""End-to-end benchmark of the NEB acceleration with EMT as reference
+
+accelerate_neb is run on the initial and final images of
+examples/neb_acceleration and on Au adatom hops on Al(100) slabs of
+increasing size. For each system the wall time of every phase, the number of
+reference calls, the number of iterations and the error of the barrier
+with respect to a plain NEB computed with EMT are reported, and compared with
+a stored baseline.
+
+    python benchmark.py                   # compare with baseline.json
+    python benchmark.py --save-baseline   # store the results as baseline
+    python benchmark.py --systems example slab-2x2
+    python benchmark.py --max-iterations 20 --max-time 600
+
+accelerate_neb only stops at maxiter once the tolerance is met, so each run
+is also stopped by the harness after --max-iterations iterations or
+--max-time seconds, checked at the end of every iteration. The exit status
+is 1 when a regression is found, including a run that was stopped while its
+baseline converged, or when the baseline has no results for one of the
+systems.
+"""
+from collections import OrderedDict
+import argparse
+import shutil
+import json
+import time
+import sys
+import os
+
+directory = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(directory))
+
+from mlutils.neb import accelerate_neb
+from mlutils.workspace import Workspace
+from mlutils.frames import FrameReader
+from amp import Amp
+from amp.descriptor.gaussian import Gaussian
+from amp.model.neuralnetwork import NeuralNetwork
+from amp.model import LossFunction
+
+from ase.build import fcc100, add_adsorbate
+from ase.calculators.emt import EMT
+from ase.constraints import FixAtoms
+from ase.io import read, write
+from ase.neb import NEB
+from ase.optimize import BFGS
+
+
+def example_system():
+    """Images of examples/neb_acceleration"""
+    path = os.path.join(os.path.dirname(directory), 'examples',
+                        'neb_acceleration')
+    return (read(os.path.join(path, 'initial.traj')),
+            read(os.path.join(path, 'final.traj')))
+
+
+def slab_system(size, layers=3):
+    """Au adatom hopping between hollow sites of an Al(100) slab
+
+    Parameters
+    ----------
+    size : int
+        Number of surface atoms along each side of the slab.
+    layers : int
+        Number of layers. All but the top one are fixed.
+    """
+    initial = fcc100('Al', size=(size, size, layers))
+    add_adsorbate(initial, 'Au', 1.7, 'hollow')
+    initial.center(axis=2, vacuum=4.0)
+    initial.set_constraint(FixAtoms(mask=[atom.tag > 1
+                                          for atom in initial]))
+
+    final = initial.copy()
+    final.positions[-1, 0] += initial.get_cell()[0, 0] / size
+
+    for image in (initial, final):
+        image.set_calculator(EMT())
+        BFGS(image, logfile=None).run(fmax=0.01)
+    return initial, final
+
+
+SYSTEMS = OrderedDict([
+    ('example', example_system),
+    ('slab-2x2', lambda: slab_system(2)),
+    ('slab-4x4', lambda: slab_system(4)),
+    ('slab-6x6', lambda: slab_system(6, layers=4)),
+    ])
+
+
+def get_amp_calc(fortran=True):
+    """Amp instance used in examples/neb_acceleration
+
+    Training runs on a single core, so timings do not depend on the number
+    of cores of the machine. Logging is disabled: the log file is kept open
+    by Amp, so the instance could not be copied by accelerate_neb.
+    """
+    amp_calc = Amp(
+            descriptor=Gaussian(cutoff=6.5, fortran=fortran),
+            model=NeuralNetwork(hiddenlayers=(5, 5), fortran=fortran,
+                                checkpoints=None),
+            cores=1, logging=False)
+    convergence = {'energy_rmse': 0.0001, 'force_rmse': 0.01}
+    amp_calc.model.lossfunction = LossFunction(convergence=convergence)
+    return amp_calc
+
+
+def reference_barrier(initial, final, intermediates, fmax):
+    """Barrier of a NEB computed only with EMT"""
+    images = [initial.copy()]
+    for intermediate in range(intermediates):
+        images.append(initial.copy())
+    images.append(final.copy())
+
+    for image in images:
+        image.set_calculator(EMT())
+
+    neb = NEB(images)
+    neb.interpolate()
+    BFGS(neb, logfile=None).run(fmax=fmax)
+    energies = [image.get_potential_energy() for image in images]
+    return max(energies) - energies[0]
+
+
+class Limit(Exception):
+    """Raised when a run reaches the limit of iterations or wall time"""
+    pass
+
+
+def run_system(name, intermediates=5, fmax=0.05, fortran=True,
+               fast_inference=False, max_iterations=None, max_time=None):
+    """Accelerate the NEB of a system
+
+    Parameters
+    ----------
+    max_iterations : int
+        Iterations after which the run is stopped if it did not converge.
+    max_time : float
+        Wall time, in seconds, after which the run is stopped if it did not
+        converge. It is checked at the end of each iteration, so a run can
+        last up to one iteration longer.
+
+    Returns
+    -------
+    result : dict
+        Wall times, reference calls, iterations, barrier error and whether or
+        not the run converged before the limits. The barrier of a stopped run
+        is the one of its last cross validation.
+    """
+    initial, final = SYSTEMS[name]()
+    workspace = Workspace.scratch(prefix='benchmark-%s-' % name)
+    write(workspace.get_path('initial.traj'), initial)
+    write(workspace.get_path('final.traj'), final)
+
+    start = time.time()
+    neb = accelerate_neb(initial=workspace.get_path('initial.traj'),
+                         final=workspace.get_path('final.traj'),
+                         tolerance=0.05, maxiter=200, fmax=fmax, ifmax=1.,
+                         step=2., metric='fmax', workspace=workspace,
+                         fast_inference=fast_inference)
+    neb.initialize(calc=EMT(), amp_calc=get_amp_calc(fortran=fortran),
+                   intermediates=intermediates)
+
+    # The limits are checked once the checkpoint of an iteration is saved,
+    # so the images of its cross validation are on disk.
+    save_checkpoint = neb.save_checkpoint
+
+    def check_limits(phase, fmax):
+        save_checkpoint(phase, fmax)
+        if phase != 'cross_validate':
+            return
+        if max_iterations is not None and neb.iteration + 1 >= max_iterations:
+            raise Limit('%s iterations' % max_iterations)
+        if max_time is not None and time.time() - start > max_time:
+            raise Limit('%.0f s' % max_time)
+    neb.save_checkpoint = check_limits
+
+    iterations = None
+    try:
+        neb.accelerate()
+    except Limit as error:
+        print('%s: stopped after %s without converging' % (name, error))
+        iterations = neb.iteration + 1
+    neb.logfile.close()
+    wall = time.time() - start
+    converged = iterations is None
+    if converged is True:
+        iterations = neb.iteration
+
+    phases = OrderedDict()
+    reference_calls = 0
+    for record in neb.instrumentation.records:
+        phases[record['phase']] = (phases.get(record['phase'], 0.) +
+                                   record['wall'])
+        if '/' not in record['phase']:
+            reference_calls += record.get('reference_calls', 0)
+
+    energies = FrameReader(
+            workspace.get_path('images_from_neb.frames')).energies
+    barrier = energies.max() - energies[0]
+    reference = reference_barrier(initial, final, intermediates, fmax)
+
+    shutil.rmtree(workspace.path)
+
+    return OrderedDict([('wall', wall),
+                        ('reference_calls', reference_calls),
+                        ('iterations', iterations),
+                        ('converged', converged),
+                        ('barrier_error', float(abs(barrier - reference))),
+                        ('phases', phases)])
+
+
+def compare(results, baseline, tolerance=0.2, barrier_tolerance=0.01):
+    """Find regressions with respect to the baseline
+
+    Parameters
+    ----------
+    results : dict
+        Results of run_system() for each system.
+    baseline : dict
+        Results stored with --save-baseline.
+    tolerance : float
+        Relative increase of wall time that is accepted.
+    barrier_tolerance : float
+        Increase of the barrier error, in eV, that is accepted.
+
+    Returns
+    -------
+    regressions : list
+        Description of each regression. A system without baseline is a
+        regression too, as it can not be checked, and so is a run stopped by
+        the limits when its baseline converged.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            regressions.append('%s: no baseline, store one with '
+                               '--save-baseline' % name)
+            continue
+        reference = baseline[name]
+
+        if result['converged'] is False and reference.get('converged', True):
+            regressions.append('%s: stopped after %s iterations, baseline '
+                               'converged in %s' % (name,
+                                                    result['iterations'],
+                                                    reference['iterations']))
+        if result['wall'] > reference['wall'] * (1. + tolerance):
+            regressions.append('%s: wall time %.1f s, baseline %.1f s'
+                               % (name, result['wall'], reference['wall']))
+        if result['reference_calls'] > reference['reference_calls']:
+            regressions.append('%s: %s reference calls, baseline %s'
+                               % (name, result['reference_calls'],
+                                  reference['reference_calls']))
+        if (result['barrier_error'] >
+           reference['barrier_error'] + barrier_tolerance):
+            regressions.append('%s: barrier error %.4f eV, baseline %.4f eV'
+                               % (name, result['barrier_error'],
+                                  reference['barrier_error']))
+    return regressions
+
+
+def report(results, baseline):
+    """Print a table of results next to the baseline"""
+    columns = ('wall', 'reference_calls', 'iterations', 'converged',
+               'barrier_error')
+    print('%-10s %-16s %14s %14s' % ('system', 'quantity', 'result',
+                                     'baseline'))
+    for name, result in results.items():
+        reference = baseline.get(name, {})
+        for column in columns + tuple('phase %s' % phase
+                                      for phase in result['phases']):
+            if column.startswith('phase '):
+                value = result['phases'][column[6:]]
+                previous = reference.get('phases', {}).get(column[6:])
+            else:
+                value = result[column]
+                previous = reference.get(column)
+            if previous is None:
+                previous = '-'
+            else:
+                previous = '%.4g' % previous
+            print('%-10s %-16s %14.4g %14s' % (name, column, value,
+                                               previous))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--systems', nargs='+', default=list(SYSTEMS),
+                        choices=list(SYSTEMS))
+    parser.add_argument('--baseline',
+                        default=os.path.join(directory, 'baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Accepted relative increase of wall time.')
+    parser.add_argument('--intermediates', type=int, default=5)
+    parser.add_argument('--no-fortran', action='store_true')
+    parser.add_argument('--fast-inference', action='store_true',
+                        help='Predict with the NumPy inference engine.')
+    parser.add_argument('--max-iterations', type=int, default=50,
+                        help='Stop a run after this many iterations.')
+    parser.add_argument('--max-time', type=float, default=3600.,
+                        help='Stop a run after this wall time, in seconds.')
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.isfile(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    # Without a baseline nothing can be checked, so the comparison fails
+    # before spending time on the systems.
+    missing = [name for name in args.systems if name not in baseline]
+    if args.save_baseline is False and len(missing) > 0:
+        print('ERROR no baseline for %s in %s, store one with '
+              '--save-baseline' % (', '.join(missing), args.baseline))
+        return 1
+
+    results = OrderedDict()
+    for name in args.systems:
+        results[name] = run_system(name, intermediates=args.intermediates,
+                                   fortran=not args.no_fortran,
+                                   fast_inference=args.fast_inference,
+                                   max_iterations=args.max_iterations,
+                                   max_time=args.max_time)
+
+    report(results, baseline)
+
+    if args.save_baseline is True:
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2)
+        print('Baseline saved to %s' % args.baseline)
+        return 0
+
+    regressions = compare(results, baseline, tolerance=args.tolerance)
+    for regression in regressions:
+        print('REGRESSION %s' % regression)
+    return int(len(regressions) > 0)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
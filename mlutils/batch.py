@@ -0,0 +1,149 @@
+# General imports
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import os.path
+import copy
+
+from .neb import accelerate_neb
+from .workspace import Workspace
+from .fingerprints import FingerprintStore
+
+
+# Keyword arguments of accelerate_neb and initialize() whose objects keep
+# state of a run, and are copied for each reaction of a batch.
+STATEFUL = ['ensemble', 'monitor', 'schedule', 'baseline', 'prerelax_calc']
+
+
+def accelerate_batch(reactions, calc=None, amp_calc=None, workers=None,
+                     concurrent=None, path='.', neb_kwargs=None,
+                     initialize_kwargs=None):
+    """Accelerate the NEB calculations of several reactions at once
+
+    Every reaction runs its own accelerate() loop in a thread and in its own
+    workspace, <path>/reaction-<index>. Reference calculations of all
+    reactions are submitted to a single pool of worker processes, so cores
+    are kept busy with whichever reaction has reference work ready while the
+    others train their models or run ML-NEB.
+
+    Parameters
+    ----------
+    reactions : list
+        List of (initial, final) tuples with paths to the initial and final
+        images of each reaction.
+    calc : object
+        Reference calculator. It is sent to the workers with each image.
+    amp_calc : object
+        Amp instance used as template of the models of all reactions. Setting
+        its cores makes Amp train in separate processes, which lets training
+        of several reactions run in parallel.
+    workers : int
+        Number of processes of the shared pool of reference calculations.
+    concurrent : int
+        Maximum number of reactions running at the same time. By default all
+        of them.
+    path : str
+        Directory where the workspaces of the reactions are created.
+    neb_kwargs : dict
+        Keyword arguments passed to accelerate_neb. Each reaction gets its
+        own copy of them, see get_reaction_kwargs().
+    initialize_kwargs : dict
+        Keyword arguments passed to accelerate_neb.initialize, e.g.
+        intermediates. Each reaction gets its own copy of them.
+
+    Returns
+    -------
+    achieved : list
+        The metrics achieved by each reaction, in the order of reactions. If
+        a reaction failed, its exception is returned instead.
+
+    A KeyboardInterrupt cancels the reactions that did not start and the
+    pending reference calculations, and is raised without waiting for the
+    running reactions. These stop at their next reference calculation.
+    """
+    if neb_kwargs is None:
+        neb_kwargs = {}
+    if initialize_kwargs is None:
+        initialize_kwargs = {}
+    if concurrent is None:
+        concurrent = len(reactions)
+
+    pool = ProcessPoolExecutor(max_workers=workers)
+    threads = ThreadPoolExecutor(max_workers=concurrent)
+    futures = []
+    interrupted = False
+    try:
+        for index, (initial, final) in enumerate(reactions):
+            workspace = Workspace(os.path.join(path, 'reaction-%s' % index))
+            futures.append(threads.submit(
+                accelerate_reaction, initial, final, workspace, calc,
+                amp_calc, pool, get_reaction_kwargs(neb_kwargs, index),
+                get_reaction_kwargs(initialize_kwargs, index)))
+
+        achieved = []
+        for future in futures:
+            try:
+                achieved.append(future.result())
+            except (Exception, SystemExit) as error:
+                # SystemExit comes from the exit() of a reaction that can not
+                # extend its training set.
+                achieved.append(error)
+    except KeyboardInterrupt:
+        interrupted = True
+        for future in futures:
+            future.cancel()
+        raise
+    finally:
+        threads.shutdown(wait=not interrupted)
+        pool.shutdown(wait=not interrupted, cancel_futures=interrupted)
+    return achieved
+
+
+def get_reaction_kwargs(kwargs, index):
+    """Keyword arguments of one reaction of a batch
+
+    Objects that keep state of a run (see STATEFUL) are copied, so that
+    reactions running at the same time do not change each other's state. A
+    fingerprint store is replaced by one in <store path>/reaction-<index>.
+    Other values, such as a ReferenceCache, are shared: the cache is safe to
+    use from several workers, and its keys include the reference calculator,
+    so results are not shared between reactions with different settings.
+
+    Parameters
+    ----------
+    kwargs : dict
+        Keyword arguments given to accelerate_batch.
+    index : int
+        Index of the reaction.
+
+    Returns
+    -------
+    kwargs : dict
+        A new dictionary.
+    """
+    kwargs = dict(kwargs)
+    for name in STATEFUL:
+        if kwargs.get(name) is not None:
+            kwargs[name] = copy.deepcopy(kwargs[name])
+
+    store = kwargs.get('fingerprint_store')
+    if store is not None:
+        kwargs['fingerprint_store'] = FingerprintStore(
+                os.path.join(store.path, 'reaction-%s' % index))
+    return kwargs
+
+
+def accelerate_reaction(initial, final, workspace, calc, amp_calc, executor,
+                        neb_kwargs, initialize_kwargs):
+    """Run the acceleration of one reaction of a batch
+
+    Returns
+    -------
+    achieved : tuple
+        Energy and force metrics achieved at the end.
+    """
+    neb = accelerate_neb(initial=initial, final=final, workspace=workspace,
+                         **neb_kwargs)
+    neb.initialize(calc=calc, amp_calc=amp_calc, executor=executor,
+                   **initialize_kwargs)
+    neb.accelerate()
+    neb.logfile.close()
+    return neb.achieved
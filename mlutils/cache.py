@@ -0,0 +1,178 @@
+# General imports
+import hashlib
+import glob
+import json
+import os
+import numpy as np
+
+
+class ReferenceCache(object):
+    """Persistent cache of reference (DFT) calculations
+
+    Results are stored on disk, one file per image, under a key that is a
+    hash of the atomic numbers, the positions rounded to a tolerance, the cell
+    and the periodic boundary conditions. In this way identical or
+    near-identical geometries computed in previous iterations, or before a
+    restart, are not sent again to the reference calculator.
+
+    When the calculator is given to get() and put(), its name and parameters
+    are part of the key as well, see get_fingerprint(). A cache can then be
+    shared by runs with different reference calculators, or settings of the
+    same one, without returning the results of one to the other.
+
+    Parameters
+    ----------
+    path : str
+        Directory where results are stored. It is created if it does not
+        exist.
+    tolerance : float
+        Positions and cell are rounded to this value (in Angstrom) before
+        hashing. Two images that differ by less than this are considered the
+        same.
+    maxsize : int
+        Maximum number of entries kept in the cache. When it is exceeded the
+        least recently used entries are removed. By default the cache is not
+        bounded.
+    """
+    def __init__(self, path='reference-cache', tolerance=1e-4, maxsize=None):
+        self.path = path
+        self.tolerance = tolerance
+        self.maxsize = maxsize
+
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+    def get_hash(self, image, calc=None):
+        """Compute the key of an image
+
+        Parameters
+        ----------
+        image : object
+            Atoms object.
+        calc : object
+            Calculator of the results. None to leave it out of the key.
+
+        Returns
+        -------
+        key : str
+            Hexadecimal digest.
+        """
+        positions = np.round(image.get_positions() / self.tolerance)
+        cell = np.round(np.asarray(image.get_cell()) / self.tolerance)
+
+        sha1 = hashlib.sha1()
+        sha1.update(np.ascontiguousarray(image.get_atomic_numbers(),
+                                         dtype=np.int64).tobytes())
+        sha1.update(np.ascontiguousarray(positions, dtype=np.int64).tobytes())
+        sha1.update(np.ascontiguousarray(cell, dtype=np.int64).tobytes())
+        sha1.update(np.ascontiguousarray(image.get_pbc(),
+                                         dtype=np.int8).tobytes())
+        if calc is not None:
+            sha1.update(get_fingerprint(calc).encode())
+        return sha1.hexdigest()
+
+    def get(self, image, calc=None):
+        """Get the results of an image
+
+        Parameters
+        ----------
+        image : object
+            Atoms object.
+        calc : object
+            Calculator of the results, see get_hash().
+
+        Returns
+        -------
+        results : tuple or None
+            (energy, forces) if the image is in the cache, otherwise None.
+        """
+        filename = os.path.join(self.path,
+                                self.get_hash(image, calc) + '.npz')
+
+        try:
+            with np.load(filename) as data:
+                energy = float(data['energy'])
+                forces = np.array(data['forces'])
+        except (IOError, OSError, KeyError, ValueError):
+            return None
+
+        # The modification time is used as last access for eviction.
+        os.utime(filename, None)
+        return energy, forces
+
+    def put(self, image, energy, forces, calc=None):
+        """Store the results of an image
+
+        Parameters
+        ----------
+        image : object
+            Atoms object.
+        energy : float
+            Potential energy computed by the reference calculator.
+        forces : array
+            Forces computed by the reference calculator.
+        calc : object
+            Calculator of the results, see get_hash().
+        """
+        key = self.get_hash(image, calc)
+        filename = os.path.join(self.path, key + '.npz')
+        tmpname = os.path.join(self.path, '.%s.%s.tmp' % (key, os.getpid()))
+
+        # Writing to a temporary file and renaming it makes the store atomic
+        # when several processes share the cache.
+        with open(tmpname, 'wb') as f:
+            np.savez(f, energy=energy, forces=forces)
+        os.replace(tmpname, filename)
+
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries beyond maxsize"""
+        if self.maxsize is None:
+            return
+
+        entries = glob.glob(os.path.join(self.path, '*.npz'))
+
+        if len(entries) <= self.maxsize:
+            return
+
+        entries.sort(key=os.path.getmtime)
+
+        for filename in entries[:len(entries) - self.maxsize]:
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+
+    def __len__(self):
+        return len(glob.glob(os.path.join(self.path, '*.npz')))
+
+
+def get_fingerprint(calc):
+    """Name and parameters of a calculator, as a string
+
+    Parameters
+    ----------
+    calc : object
+        ASE calculator. Parameters are read from its parameters attribute,
+        if it has one.
+
+    Returns
+    -------
+    fingerprint : str
+        JSON of the class name and the parameters, with sorted keys. Arrays
+        are written as lists and other objects with their todict() method or
+        as strings.
+    """
+    parameters = getattr(calc, 'parameters', None) or {}
+    return json.dumps([calc.__class__.__name__, dict(parameters)],
+                      sort_keys=True, default=_encode)
+
+
+def _encode(obj):
+    """Encode values of the parameters that json does not know"""
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    if hasattr(obj, 'todict'):
+        return obj.todict()
+    return str(obj)
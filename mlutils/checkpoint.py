@@ -0,0 +1,145 @@
+# General imports
+import os
+import numpy as np
+
+# ASE imports
+from ase.io.jsonio import encode, decode
+
+
+# Phases of an iteration of accelerate_neb, in the order they are run.
+PHASES = ['extend', 'train', 'neb', 'cross_validate']
+
+
+class Checkpoint(object):
+    """State of a NEB acceleration saved at the end of each phase
+
+    The state is a JSON file that is written to a temporary file and then
+    renamed, so a run that is killed leaves either the previous or the new
+    state, never a half written one. A restart reads it and continues after
+    the last completed phase.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the checkpoint file.
+    """
+    def __init__(self, filename='checkpoint.json'):
+        self.filename = filename
+
+    def save(self, iteration, phase, fmax, final_fmax=False, achieved=None,
+             model=None, band=None, history=None, flagged=None,
+             ensemble=None, training_set=None):
+        """Write the state
+
+        Parameters
+        ----------
+        iteration : int
+            Current iteration.
+        phase : str
+            Last phase completed in the iteration, one of PHASES.
+        fmax : float
+            fmax of the ML-NEB of the iteration.
+        final_fmax : bool
+            Whether or not the tolerance was met with the requested fmax.
+        achieved : tuple
+            Energy and force metrics of the last cross validation.
+        model : str
+            Path to the latest trained model.
+        band : list
+            Images of the latest band. Only their cells and positions are
+            saved.
+        history : list
+            (fmax, energy metric, force metric) of each iteration, used by
+            the fmax schedule.
+        flagged : list
+            Intermediate images of the band found extrapolated while the
+            ML-NEB ran, see mlutils.monitor.
+        ensemble : list
+            Paths to the .amp files of the members of the bootstrap ensemble
+            trained with the model, see mlutils.ensemble.
+        training_set : str
+            Name of the .npz file with the training set of the state. It is
+            saved before the checkpoint under a new name, so the checkpoint
+            never refers to a training set of a later phase.
+        """
+        if phase not in PHASES:
+            raise ValueError('Unknown phase %s.' % phase)
+
+        state = {'iteration': int(iteration),
+                 'phase': phase,
+                 'fmax': float(fmax),
+                 'final_fmax': bool(final_fmax),
+                 'achieved': None,
+                 'model': model,
+                 'training_set': training_set,
+                 'history': [],
+                 'flagged': [],
+                 'ensemble': [],
+                 'positions': None,
+                 'cells': None}
+
+        if achieved is not None:
+            state['achieved'] = [float(metric) for metric in achieved]
+
+        if history is not None:
+            state['history'] = [[float(value) for value in entry]
+                                for entry in history]
+
+        if flagged is not None:
+            state['flagged'] = [int(index) for index in flagged]
+
+        if ensemble is not None:
+            state['ensemble'] = [str(filename) for filename in ensemble]
+
+        if band is not None:
+            state['positions'] = np.array([image.get_positions()
+                                           for image in band])
+            state['cells'] = np.array([np.asarray(image.get_cell())
+                                       for image in band])
+
+        tmpname = self.filename + '.tmp'
+        with open(tmpname, 'w') as f:
+            f.write(encode(state))
+        os.replace(tmpname, self.filename)
+
+    def load(self):
+        """Read the state
+
+        Returns
+        -------
+        state : dict or None
+            The arguments given to save(), with positions and cells of the
+            band instead of the images. None if there is no checkpoint.
+        """
+        if not os.path.isfile(self.filename):
+            return None
+
+        with open(self.filename) as f:
+            return decode(f.read())
+
+    def get_band(self, state, template):
+        """Images of the band saved in a state
+
+        Parameters
+        ----------
+        state : dict
+            State returned by load().
+        template : object
+            Atoms object copied for each image, e.g. the initial image. It
+            provides atomic numbers, boundary conditions and constraints.
+
+        Returns
+        -------
+        band : list or None
+            Atoms objects without calculator.
+        """
+        if state['positions'] is None:
+            return None
+
+        band = []
+        for positions, cell in zip(state['positions'], state['cells']):
+            image = template.copy()
+            image.set_cell(cell)
+            image.set_positions(positions)
+            band.append(image)
+        return band
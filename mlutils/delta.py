@@ -0,0 +1,114 @@
+# General imports
+import numpy as np
+
+# ASE imports
+from ase.calculators.calculator import Calculator, all_changes
+from ase.calculators.singlepoint import SinglePointCalculator
+
+# Amp imports
+from amp.utilities import get_hash
+
+
+class DeltaCalculator(Calculator):
+    """Sum of a cheap baseline calculator and a model of the correction
+
+    In delta learning the model is trained on the difference between the
+    reference and a cheap calculator (e.g. EMT) instead of on the reference
+    itself. The difference is smoother than the full potential energy
+    surface, so it is learned with fewer reference images. This calculator
+    adds both back.
+
+    Parameters
+    ----------
+    baseline : object
+        Cheap ASE calculator.
+    model : object
+        Trained model of the correction, an Amp instance or any ASE
+        calculator. When it has a predict(images) method, as the
+        NeuralNetworkCalculator of mlutils.inference, predict() uses it.
+    """
+    implemented_properties = ['energy', 'forces']
+
+    def __init__(self, baseline, model, **kwargs):
+        Calculator.__init__(self, **kwargs)
+        self.baseline = baseline
+        self.model = model
+
+    def calculate(self, atoms=None, properties=['energy'],
+                  system_changes=all_changes):
+        Calculator.calculate(self, atoms, properties, system_changes)
+        energy, forces = get_results(self.atoms, self.baseline)
+        model_energy, model_forces = get_results(self.atoms, self.model)
+        self.results['energy'] = energy + model_energy
+        self.results['forces'] = forces + model_forces
+
+    def predict(self, images):
+        """Energies and forces of several images
+
+        Returns
+        -------
+        energies, forces : array, array
+            Arrays of shape (images,) and (images, atoms, 3), see
+            mlutils.surrogate.predict().
+        """
+        results = [get_results(image, self.baseline) for image in images]
+        energies = np.array([energy for energy, forces in results])
+        forces = np.array([forces for energy, forces in results])
+
+        if hasattr(self.model, 'predict'):
+            model_energies, model_forces = self.model.predict(images)
+        else:
+            results = [get_results(image, self.model) for image in images]
+            model_energies = np.array([energy for energy, f in results])
+            model_forces = np.array([f for energy, f in results])
+        return energies + model_energies, forces + model_forces
+
+
+def get_results(image, calc):
+    """Energy and unconstrained forces of an image with a calculator
+
+    The image is copied, so its own calculator is not modified.
+    """
+    image = image.copy()
+    image.set_calculator(calc)
+    return (image.get_potential_energy(),
+            image.get_forces(apply_constraint=False))
+
+
+def get_delta_images(images, baseline, results=None):
+    """Images with the correction from a baseline to their results
+
+    Parameters
+    ----------
+    images : list
+        Atoms objects with reference energies and forces.
+    baseline : object
+        Cheap ASE calculator.
+    results : dict
+        Baseline (energy, forces) of images already computed, by the hash of
+        the image. It is updated with the new ones, so it can be kept to
+        avoid computing the baseline of the training set in every iteration.
+
+    Returns
+    -------
+    delta_images : list
+        Copies of the images with a SinglePointCalculator holding the
+        reference minus the baseline.
+    """
+    if results is None:
+        results = {}
+
+    delta_images = []
+    for image in images:
+        key = get_hash(image)
+        if key not in results:
+            results[key] = get_results(image, baseline)
+        energy, forces = results[key]
+
+        delta = image.copy()
+        delta.set_calculator(SinglePointCalculator(
+            delta,
+            energy=image.get_potential_energy() - energy,
+            forces=image.get_forces(apply_constraint=False) - forces))
+        delta_images.append(delta)
+    return delta_images
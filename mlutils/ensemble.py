@@ -0,0 +1,150 @@
+# General imports
+from concurrent.futures import ProcessPoolExecutor
+import copy
+import numpy as np
+
+# Amp imports
+from amp import Amp
+from amp.utilities import TrainingConvergenceError
+
+
+class BootstrapEnsemble(object):
+    """Ensemble of Amp models trained on bootstrap resamples
+
+    Each member is a copy of the same Amp calculator that is trained on a set
+    of images drawn with replacement from the training set. The spread of the
+    predictions of the members is used as a measure of the uncertainty of the
+    model for an image.
+
+    Parameters
+    ----------
+    amp_calc : object
+        Amp instance used as template for the members.
+    size : int
+        Number of members in the ensemble.
+    processes : int
+        Number of members trained at the same time, each one in its own
+        process. By default members are trained one after the other.
+    seed : int
+        Seed of the random number generator used for the resampling.
+    """
+    def __init__(self, amp_calc, size=5, processes=None, seed=None):
+        self.amp_calc = amp_calc
+        self.size = size
+        self.processes = processes
+        self.filenames = []
+        self.random = np.random.RandomState(seed)
+
+    def train(self, images, label, dblabel=None):
+        """Train the members of the ensemble
+
+        Parameters
+        ----------
+        images : list
+            Training images.
+        label : str
+            Label of the main model. Members are saved as
+            <label>-ensemble-<member>.amp.
+        dblabel : str
+            Label of the fingerprint databases. When it is None each member
+            uses its own label.
+        """
+        images = list(images)
+        labels = ['%s-ensemble-%s' % (label, member)
+                  for member in range(self.size)]
+        samples = []
+        for member in range(self.size):
+            indices = self.random.randint(0, len(images), len(images))
+            samples.append([images[index] for index in indices])
+
+        if self.processes is not None and self.processes > 1:
+            with ProcessPoolExecutor(max_workers=self.processes) as executor:
+                filenames = list(executor.map(train_member,
+                                              [self.amp_calc] * self.size,
+                                              samples, labels,
+                                              [dblabel] * self.size))
+        else:
+            filenames = [train_member(self.amp_calc, sample, member_label,
+                                      dblabel=dblabel)
+                         for sample, member_label in zip(samples, labels)]
+
+        self.filenames = filenames
+
+    def predict(self, images):
+        """Predictions of all members
+
+        Parameters
+        ----------
+        images : list
+            Images to be predicted.
+
+        Returns
+        -------
+        energies, forces : array, array
+            Arrays of shape (members, images) and (members, images, atoms, 3).
+        """
+        energies = []
+        forces = []
+        for filename in self.filenames:
+            calc = Amp.load(filename, label=filename[:-len('.amp')])
+            member_energies = []
+            member_forces = []
+            for image in images:
+                image = image.copy()
+                image.set_calculator(calc)
+                member_energies.append(image.get_potential_energy())
+                member_forces.append(image.get_forces())
+            energies.append(member_energies)
+            forces.append(member_forces)
+            del calc
+        return np.array(energies), np.array(forces)
+
+    def get_uncertainty(self, images):
+        """Uncertainty of the ensemble for each image
+
+        Parameters
+        ----------
+        images : list
+            Images to be evaluated.
+
+        Returns
+        -------
+        uncertainty : array
+            Standard deviation of the energies predicted by the members.
+        """
+        if len(self.filenames) == 0:
+            raise RuntimeError('The ensemble has no members, train it '
+                               'first.')
+        energies, forces = self.predict(images)
+        return energies.std(axis=0)
+
+
+def train_member(amp_calc, images, label, dblabel=None):
+    """Train one member of a BootstrapEnsemble
+
+    Parameters
+    ----------
+    amp_calc : object
+        Amp instance used as template.
+    images : list
+        Training images of the member.
+    label : str
+        Label of the member.
+    dblabel : str
+        Label of the fingerprint databases.
+
+    Returns
+    -------
+    filename : str
+        Path to the .amp file of the member. A member that did not converge
+        is still used with its current parameters.
+    """
+    calc = copy.deepcopy(amp_calc)
+    calc.set_label(label)
+    if dblabel is not None:
+        calc.dblabel = dblabel
+    try:
+        calc.train(images)
+    except TrainingConvergenceError:
+        return '%s-untrained-parameters.amp' % label
+    return '%s.amp' % label
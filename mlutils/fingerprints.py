@@ -0,0 +1,113 @@
+# General imports
+import tarfile
+import os
+
+# Amp imports
+from amp.utilities import hash_images
+
+
+class FingerprintStore(object):
+    """Amp fingerprint databases that survive across iterations
+
+    Amp only computes neighborlists, fingerprints and fingerprint primes of
+    images whose hash is not already in its databases. Keeping the databases
+    in a directory of their own, instead of removing all *.ampdb files after
+    each training, means that each iteration only computes the entries of the
+    images that were just added to the training set.
+
+    Parameters
+    ----------
+    path : str
+        Directory where the databases are kept. It is created if it does not
+        exist.
+    """
+    suffixes = ['neighborlists', 'fingerprints', 'fingerprint-primes']
+
+    def __init__(self, path='fingerprints'):
+        self.path = path
+        self.dblabel = os.path.join(self.path, 'amp')
+
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+    def get_databases(self):
+        """Paths of the Amp databases in the store"""
+        return ['%s-%s.ampdb' % (self.dblabel, suffix)
+                for suffix in self.suffixes]
+
+    def keys(self, database):
+        """Hashes with an entry in a database
+
+        Parameters
+        ----------
+        database : str
+            Path to an .ampdb directory.
+
+        Returns
+        -------
+        keys : set
+            Image hashes found in loose files and in the archive.
+        """
+        keys = set()
+        loosepath = os.path.join(database, 'loose')
+        tarpath = os.path.join(database, 'archive.tar.gz')
+
+        if os.path.isdir(loosepath):
+            keys.update(os.listdir(loosepath))
+
+        if os.path.isfile(tarpath):
+            with tarfile.open(tarpath) as tf:
+                keys.update(os.path.basename(name) for name in tf.getnames())
+        return keys
+
+    def prune(self, images, logfile=None):
+        """Remove entries of images that are no longer used
+
+        Parameters
+        ----------
+        images : list or object
+            Images that are going to be used, e.g. the training set.
+        logfile : object
+            File object where to log the number of removed entries.
+        """
+        keep = set(hash_images(images, log=None).keys())
+        removed = 0
+
+        for database in self.get_databases():
+            if not os.path.isdir(database):
+                continue
+
+            loosepath = os.path.join(database, 'loose')
+            if os.path.isdir(loosepath):
+                for key in os.listdir(loosepath):
+                    if key not in keep:
+                        os.remove(os.path.join(loosepath, key))
+                        removed += 1
+
+            tarpath = os.path.join(database, 'archive.tar.gz')
+            if os.path.isfile(tarpath):
+                removed += self._prune_archive(tarpath, keep)
+
+        if logfile is not None:
+            logfile.write('Fingerprint store: %s entries removed\n'
+                          % removed)
+            logfile.flush()
+
+    def _prune_archive(self, tarpath, keep):
+        """Rewrite an archive without the members that are not in keep"""
+        with tarfile.open(tarpath) as tf:
+            members = tf.getmembers()
+            stale = [member for member in members
+                     if os.path.basename(member.name) not in keep]
+
+            if len(stale) == 0:
+                return 0
+
+            tmppath = tarpath + '.tmp'
+            with tarfile.open(tmppath, 'w:gz') as new:
+                for member in members:
+                    if os.path.basename(member.name) in keep:
+                        new.addfile(member, tf.extractfile(member))
+
+        os.replace(tmppath, tarpath)
+        return len(stale)
@@ -0,0 +1,247 @@
+# General imports
+import struct
+import os
+import numpy as np
+
+# ASE imports
+from ase.atoms import Atoms
+from ase.calculators.singlepoint import SinglePointCalculator
+from ase.constraints import dict2constraint
+from ase.io import Trajectory
+from ase.io.jsonio import encode, decode
+
+
+MAGIC = b'MLFRAMES'
+
+
+def get_dtype(natoms):
+    """dtype of one frame of a system with natoms atoms"""
+    return np.dtype([('positions', '<f8', (natoms, 3)),
+                     ('cell', '<f8', (3, 3)),
+                     ('energy', '<f8'),
+                     ('forces', '<f8', (natoms, 3))])
+
+
+class FrameWriter(object):
+    """Writer of the frames format
+
+    A frames file stores images of a system with a fixed number of atoms. It
+    starts with a header with the atomic numbers, boundary conditions, tags
+    and constraints, followed by one fixed size record per image with
+    positions, cell, energy and forces. Writing an image is a single append
+    of the record, and FrameReader maps the records into arrays without
+    copying them.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the file.
+    mode : str
+        'w' to create the file, 'a' to append to an existing one. The header
+        is written with the first image.
+    """
+    def __init__(self, filename, mode='w'):
+        self.filename = filename
+        self.dtype = None
+
+        if mode == 'a' and os.path.isfile(filename):
+            header, offset = read_header(filename)
+            self.dtype = get_dtype(len(header['numbers']))
+            self.file = open(filename, 'ab')
+        elif mode in ('w', 'a'):
+            self.file = open(filename, 'wb')
+        else:
+            raise ValueError('Unknown mode %s.' % mode)
+
+    def write(self, image):
+        """Append an image
+
+        Parameters
+        ----------
+        image : object
+            Atoms object. Energy and forces are taken from its calculator
+            when it has them, otherwise they are stored as NaN.
+        """
+        if self.dtype is None:
+            self._write_header(image)
+        elif len(image) != self.dtype['positions'].shape[0]:
+            raise ValueError('All images in a frames file must have the same '
+                             'number of atoms.')
+
+        record = np.zeros(1, dtype=self.dtype)
+        record['positions'] = image.get_positions()
+        record['cell'] = np.asarray(image.get_cell())
+        record['energy'] = np.nan
+        record['forces'] = np.nan
+
+        calc = image.get_calculator()
+        if calc is not None and len(calc.check_state(image)) == 0:
+            energy = calc.results.get('energy')
+            forces = calc.results.get('forces')
+            if energy is not None:
+                record['energy'] = energy
+            if forces is not None:
+                record['forces'] = forces
+        self.file.write(record.tobytes())
+
+    def _write_header(self, image):
+        header = {'numbers': image.get_atomic_numbers().tolist(),
+                  'pbc': image.get_pbc().tolist(),
+                  'tags': image.get_tags().tolist(),
+                  'constraints': [c.todict() for c in image.constraints]}
+        data = encode(header).encode()
+        # Records start at a multiple of 64 bytes.
+        length = -(-(len(MAGIC) + 8 + len(data)) // 64) * 64
+        data += b' ' * (length - len(MAGIC) - 8 - len(data))
+        self.file.write(MAGIC + struct.pack('<Q', len(data)) + data)
+        self.dtype = get_dtype(len(image))
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class FrameReader(object):
+    """Reader of the frames format, see FrameWriter
+
+    The records are memory mapped, so positions, cells, energies and forces
+    are arrays of shape (frames, ...) that are read from disk only when they
+    are accessed. Images are converted to Atoms objects on access.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the file.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        header, offset = read_header(filename)
+        self.numbers = np.array(header['numbers'])
+        self.pbc = np.array(header['pbc'])
+        self.tags = np.array(header['tags'])
+        self.constraints = header['constraints']
+
+        dtype = get_dtype(len(self.numbers))
+        nframes = (os.path.getsize(filename) - offset) // dtype.itemsize
+        if nframes > 0:
+            self.frames = np.memmap(filename, dtype=dtype, mode='r',
+                                    offset=offset, shape=(nframes,))
+        else:
+            self.frames = np.zeros(0, dtype=dtype)
+
+        self.positions = self.frames['positions']
+        self.cells = self.frames['cell']
+        self.energies = self.frames['energy']
+        self.forces = self.frames['forces']
+
+    def get_image(self, index):
+        """Build the Atoms object of a frame
+
+        Parameters
+        ----------
+        index : int
+            Index of the frame.
+
+        Returns
+        -------
+        image : object
+            Atoms object, with a SinglePointCalculator when the frame has
+            energy and forces.
+        """
+        image = Atoms(numbers=self.numbers, positions=self.positions[index],
+                      cell=self.cells[index], pbc=self.pbc, tags=self.tags)
+        image.set_constraint([dict2constraint(c) for c in self.constraints])
+
+        energy = self.energies[index]
+        forces = self.forces[index]
+        if not np.isnan(energy) and not np.isnan(forces).any():
+            image.set_calculator(
+                    SinglePointCalculator(image, energy=float(energy),
+                                          forces=np.array(forces)))
+        return image
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            indices = range(*index.indices(len(self)))
+            return [self.get_image(i) for i in indices]
+
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError('Frame index out of range')
+        return self.get_image(index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.get_image(index)
+
+
+def read_header(filename):
+    """Read the header of a frames file
+
+    Returns
+    -------
+    header, offset : dict, int
+        The header and the position of the first record.
+    """
+    with open(filename, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise IOError('%s is not a frames file.' % filename)
+        length = struct.unpack('<Q', f.read(8))[0]
+        header = decode(f.read(length).decode())
+    return header, len(MAGIC) + 8 + length
+
+
+def write_frames(filename, images, mode='w'):
+    """Write images to a frames file
+
+    Parameters
+    ----------
+    filename : str
+        Path to the file.
+    images : list
+        Atoms objects, or any iterable of them like an ASE Trajectory.
+    mode : str
+        'w' or 'a', see FrameWriter.
+    """
+    with FrameWriter(filename, mode=mode) as writer:
+        for image in images:
+            writer.write(image)
+
+
+def to_trajectory(filename, trajectory):
+    """Convert a frames file to an ASE trajectory
+
+    Parameters
+    ----------
+    filename : str
+        Path to the frames file.
+    trajectory : str
+        Path to the trajectory file.
+    """
+    output = Trajectory(trajectory, mode='w')
+    for image in FrameReader(filename):
+        output.write(image)
+    output.close()
+
+
+def from_trajectory(trajectory, filename):
+    """Convert an ASE trajectory to a frames file
+
+    Parameters
+    ----------
+    trajectory : str
+        Path to the trajectory file.
+    filename : str
+        Path to the frames file.
+    """
+    write_frames(filename, Trajectory(trajectory, mode='r'))
+
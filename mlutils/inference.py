@@ -0,0 +1,793 @@
+# General imports
+from collections import OrderedDict
+import numpy as np
+
+# ASE imports
+from ase.calculators.calculator import Calculator, all_changes
+from ase.data import atomic_numbers
+from ase.neighborlist import neighbor_list
+
+
+class NeuralNetworkEngine(object):
+    """Batched inference of Amp neural network models with NumPy
+
+    The model is read from an .amp file with a Gaussian descriptor (G2 and
+    G4 symmetry functions with a cosine cutoff) and an atom-centered
+    NeuralNetwork model, such as the <iteration>.amp files written by
+    accelerate_neb. All images given to predict() are evaluated together:
+    the symmetry functions of each element are computed as matrices over all
+    pairs and triplets of neighbors of all images, the network of each
+    element is evaluated with one matrix product per layer for all its
+    atoms, and forces are obtained by back propagating the derivatives of
+    the energy to the pairs and triplets, without building fingerprint
+    primes.
+
+    Results are the same as those of Amp for these models.
+
+    Parameters
+    ----------
+    descriptor : dict
+        Parameters of the Gaussian descriptor, as saved by Amp.
+    model : dict
+        Parameters of the NeuralNetwork model, as saved by Amp.
+    skin : float
+        Skin of the neighbor lists, in Angstrom. The neighbor lists of the
+        last predicted images are kept and reused until an atom moves more
+        than half the skin, together with the energies and derivatives of
+        the atoms whose neighborhood did not change. None to build the
+        neighbor lists of each image from scratch.
+    cache_size : int
+        Number of neighbor lists that are kept. It should be at least the
+        number of images of the band.
+    """
+    def __init__(self, descriptor, model, skin=0.3, cache_size=32):
+        if not descriptor['importname'].endswith('gaussian.Gaussian'):
+            raise NotImplementedError('Only Gaussian descriptors are '
+                                      'supported.')
+        if not model['importname'].endswith('neuralnetwork.NeuralNetwork'):
+            raise NotImplementedError('Only NeuralNetwork models are '
+                                      'supported.')
+        if model.get('mode', 'atom-centered') != 'atom-centered':
+            raise NotImplementedError('Only atom-centered models are '
+                                      'supported.')
+
+        cutoff = descriptor['cutoff']
+        if isinstance(cutoff, dict):
+            if cutoff['name'] != 'Cosine':
+                raise NotImplementedError('Only cosine cutoff functions are '
+                                          'supported.')
+            cutoff = cutoff['kwargs']['Rc']
+        self.cutoff = float(cutoff)
+        self.skin = skin
+        self.cache_size = cache_size
+        self.neighbor_lists = []
+
+        self.activation = model['activation']
+        if self.activation not in ('tanh', 'sigmoid', 'linear'):
+            raise NotImplementedError('Unknown activation %s.'
+                                      % self.activation)
+
+        self.elements = sorted(descriptor['Gs'])
+        self.parameters = {}
+        self.weights = {}
+        self.scalings = {}
+        self.fprange = {}
+        for element in self.elements:
+            Gs = descriptor['Gs'][element]
+            self.parameters[element] = get_parameters(Gs)
+
+            weights = model['weights'][element]
+            self.weights[element] = [np.array(weights[layer], dtype=float)
+                                     for layer in sorted(weights)]
+            self.scalings[element] = (model['scalings'][element]['slope'],
+                                      model['scalings'][element]['intercept'])
+
+            fprange = np.array(model['fprange'][element], dtype=float)
+            if len(fprange) != len(Gs):
+                raise ValueError('fprange and Gs of %s do not match.'
+                                 % element)
+            width = fprange[:, 1] - fprange[:, 0]
+            # Fingerprints are scaled to [-1, 1] as x = shift + factor * G.
+            # Amp passes fingerprints without range through unscaled.
+            scaled = width > 1e-8
+            factor = np.ones(len(Gs))
+            factor[scaled] = 2. / width[scaled]
+            shift = np.zeros(len(Gs))
+            shift[scaled] = -1. - fprange[scaled, 0] * factor[scaled]
+            self.fprange[element] = (shift, factor)
+
+    @classmethod
+    def load(cls, filename, **kwargs):
+        """Create the engine from an .amp file
+
+        Parameters
+        ----------
+        filename : str
+            Path to the .amp file.
+        kwargs
+            Other arguments of NeuralNetworkEngine.
+        """
+        namespace = {'OrderedDict': OrderedDict, 'dict': dict,
+                     'array': np.array, '__builtins__': {}}
+        with open(filename) as f:
+            parameters = eval(f.read(), namespace)
+        return cls(eval(parameters['descriptor'], namespace),
+                   eval(parameters['model'], namespace), **kwargs)
+
+    def get_neighbor_list(self, image, exclude=()):
+        """Neighbor list of an image
+
+        With a skin, the cached neighbor list closest to the image is reused
+        when no atom moved more than half the skin since it was built, so
+        an image that is optimized step by step keeps its own list. A new
+        one is built and cached otherwise.
+
+        Parameters
+        ----------
+        image : object
+            Atoms object.
+        exclude : list
+            Neighbor lists that can not be used, e.g. the ones of other
+            images of the same batch.
+        """
+        if self.skin is None:
+            return NeighborList(image, self.cutoff, 0.)
+
+        best = None
+        displacement = self.skin / 2.
+        for neighbors in self.neighbor_lists:
+            if any(neighbors is other for other in exclude):
+                continue
+            distance = neighbors.get_displacement(image)
+            if distance is not None and distance <= displacement:
+                best = neighbors
+                displacement = distance
+
+        if best is None:
+            best = NeighborList(image, self.cutoff, self.skin)
+        else:
+            self.neighbor_lists.remove(best)
+        self.neighbor_lists.append(best)
+        del self.neighbor_lists[:-self.cache_size]
+        return best
+
+    def get_fingerprints(self, pairs, numbers, centers, derivatives=False):
+        """Fingerprints of some atoms
+
+        Parameters
+        ----------
+        pairs : object
+            Pairs of neighbors of the centers within the cutoff, sorted by
+            center.
+        numbers : array
+            Atomic numbers of all atoms.
+        centers : array
+            Sorted indices of the atoms whose fingerprints are computed.
+        derivatives : bool
+            Whether or not the pairs and triplets of each element are
+            returned too, as needed by get_gradients().
+
+        Returns
+        -------
+        fingerprints : dict
+            (atoms, fingerprints) of each element present, where atoms are
+            the indices of the centers of the element and fingerprints an
+            array of shape (atoms, Gs) in the order of the Gs of the
+            descriptor.
+        terms : dict
+            Only with derivatives. Pairs and triplets of each element.
+        """
+        total = len(numbers)
+
+        fingerprints = {}
+        terms = {}
+        for element in self.elements:
+            atoms = centers[numbers[centers] == atomic_numbers[element]]
+            if len(atoms) == 0:
+                continue
+            G2, G4 = self.parameters[element]
+            row = np.full(total, -1)
+            row[atoms] = np.arange(len(atoms))
+            selected = pairs.select(numbers[pairs.i] ==
+                                    atomic_numbers[element])
+
+            values = np.zeros((len(atoms), G2.size + G4.size))
+            pair_terms = None
+            triplet_terms = None
+
+            if G2.size > 0:
+                match = numbers[selected.j][:, None] == G2.numbers
+                shifted = selected.R[:, None] - G2.offset
+                gauss = np.exp(-G2.eta * shifted ** 2 /
+                               self.cutoff ** 2) * match
+                values[:, G2.columns] = sum_by(
+                        row[selected.i], gauss * selected.fc[:, None],
+                        len(atoms))
+                if derivatives is True:
+                    # Derivatives with respect to the distance.
+                    dvalues = gauss * (selected.dfc[:, None] -
+                                       2. * G2.eta * shifted /
+                                       self.cutoff ** 2 *
+                                       selected.fc[:, None])
+                    pair_terms = (selected, dvalues)
+
+            if G4.size > 0:
+                triplets = Triplets(selected, total)
+                kind = G4.get_kinds(numbers[triplets.j],
+                                    numbers[triplets.k])
+
+                # Each triplet contributes the same terms to the Gs of its
+                # pair of elements, so they are computed once for each
+                # distinct (gamma, zeta, eta) and summed by center and kind.
+                base = 1. + G4.gamma * triplets.cos[:, None]
+                angular = base ** G4.zeta
+                gauss = np.exp(-G4.eta * triplets.S[:, None] /
+                               self.cutoff ** 2)
+                sums = sum_by(row[triplets.center] * (G4.nkinds + 1) + kind,
+                              angular * gauss * triplets.fc[:, None],
+                              len(atoms) * (G4.nkinds + 1))
+                sums = sums.reshape(len(atoms), G4.nkinds + 1, -1)
+                values[:, G4.columns] = (sums[:, G4.kind, G4.shape] *
+                                         G4.norm)
+                if derivatives is True:
+                    dangular = G4.zeta * G4.gamma * base ** (G4.zeta - 1.)
+                    triplet_terms = (triplets, kind, angular, dangular,
+                                     gauss)
+
+            fingerprints[element] = (atoms, values)
+            terms[element] = (row, pair_terms, triplet_terms)
+
+        if derivatives is True:
+            return fingerprints, terms
+        return fingerprints
+
+    def get_atomic_energies(self, fingerprints, element, derivatives=False):
+        """Evaluate the network of an element
+
+        Parameters
+        ----------
+        fingerprints : array
+            Unscaled fingerprints of shape (atoms, Gs).
+        element : str
+            Chemical symbol.
+        derivatives : bool
+            Whether or not the derivatives of the energies with respect to
+            the unscaled fingerprints are returned too.
+
+        Returns
+        -------
+        energies : array
+            Atomic energies.
+        gradients : array
+            Only with derivatives, of the same shape as fingerprints.
+        """
+        shift, factor = self.fprange[element]
+        x = shift + fingerprints * factor
+
+        outputs = []
+        for weights in self.weights[element]:
+            x = activate(np.dot(x, weights[:-1]) + weights[-1],
+                         self.activation)
+            outputs.append(x)
+
+        slope, intercept = self.scalings[element]
+        energies = slope * x[:, 0] + intercept
+        if derivatives is False:
+            return energies
+
+        gradients = np.full((len(x), 1), slope)
+        for weights, output in zip(self.weights[element][::-1],
+                                   outputs[::-1]):
+            gradients = np.dot(gradients * derivative(output,
+                                                      self.activation),
+                               weights[:-1].T)
+        return energies, gradients * factor
+
+    def get_gradients(self, terms, gradients, npairs):
+        """Derivatives of the atomic energies with respect to the pairs
+
+        Parameters
+        ----------
+        terms : dict
+            Pairs and triplets of each element, see get_fingerprints().
+        gradients : dict
+            Derivatives of the atomic energies with respect to the
+            fingerprints of each element.
+        npairs : int
+            Number of pairs given to get_fingerprints().
+
+        Returns
+        -------
+        gradients : array
+            Array of shape (npairs, 3) with the derivative of the energy of
+            the center of each pair with respect to the vector from the
+            center to the neighbor.
+        """
+        output = np.zeros((npairs, 3))
+        for element, (row, pair_terms, triplet_terms) in terms.items():
+            G2, G4 = self.parameters[element]
+            weights = gradients[element]
+
+            if pair_terms is not None:
+                pairs, dvalues = pair_terms
+                dR = (weights[row[pairs.i]][:, G2.columns] *
+                      dvalues).sum(axis=1)
+                output[pairs.index] += (dR / pairs.R)[:, None] * pairs.D
+
+            if triplet_terms is not None:
+                triplets, kind, angular, dangular, gauss = triplet_terms
+                # Derivatives of the energy with respect to the terms of
+                # each kind and shape, of every atom.
+                dterms = np.zeros((len(weights), G4.nkinds + 1,
+                                   len(G4.eta)))
+                np.add.at(dterms, (slice(None), G4.kind, G4.shape),
+                          weights[:, G4.columns] * G4.norm)
+                w = dterms[row[triplets.center], kind] * gauss
+                # Derivatives of the energy with respect to the cosine of
+                # the angle, the sum of squared distances and the product
+                # of cutoff functions of each triplet.
+                dcos = (w * dangular).sum(axis=1) * triplets.fc
+                wa = w * angular
+                dS = np.dot(wa, -G4.eta / self.cutoff ** 2) * triplets.fc
+                dfc = wa.sum(axis=1)
+                grad_j, grad_k = triplets.get_gradients(dcos, dS, dfc)
+                add_to(output, triplets.a, grad_j)
+                add_to(output, triplets.b, grad_k)
+        return output
+
+    def evaluate(self, pairs, numbers, centers, forces=True):
+        """Energies of some atoms and their derivatives
+
+        Parameters
+        ----------
+        pairs, numbers, centers
+            See get_fingerprints().
+        forces : bool
+            Whether or not the derivatives are computed.
+
+        Returns
+        -------
+        energies, gradients : array, array
+            Energies of the centers and the output of get_gradients(), that
+            is None without forces.
+        """
+        if forces is True:
+            fingerprints, terms = self.get_fingerprints(pairs, numbers,
+                                                        centers,
+                                                        derivatives=True)
+        else:
+            fingerprints = self.get_fingerprints(pairs, numbers, centers)
+
+        atomic = np.zeros(len(numbers))
+        gradients = {}
+        for element, (atoms, values) in fingerprints.items():
+            if forces is True:
+                atomic[atoms], gradients[element] = self.get_atomic_energies(
+                        values, element, derivatives=True)
+            else:
+                atomic[atoms] = self.get_atomic_energies(values, element)
+
+        if forces is False:
+            return atomic[centers], None
+        return atomic[centers], self.get_gradients(terms, gradients,
+                                                   len(pairs.i))
+
+    def predict(self, images, forces=True):
+        """Energies and forces of several images
+
+        Only the atoms whose neighborhood changed since an image was last
+        predicted are evaluated again, see NeighborList.
+
+        Parameters
+        ----------
+        images : list
+            Atoms objects with the same atoms.
+        forces : bool
+            Whether or not forces are computed.
+
+        Returns
+        -------
+        energies, forces : array, array
+            Arrays of shape (images,) and (images, atoms, 3). Forces are not
+            constrained, and None when they are not requested.
+        """
+        natoms = len(images[0])
+        numbers = np.tile(images[0].get_atomic_numbers(), len(images))
+
+        lists = []
+        batch = []
+        for image in images:
+            neighbors = self.get_neighbor_list(image, exclude=lists)
+            positions = image.get_positions()
+            affected = neighbors.get_affected(positions, forces)
+            lists.append(neighbors)
+            batch.append((positions, affected,
+                          neighbors.get_pairs(positions, affected)))
+
+        # Atoms of all images are evaluated together, numbered
+        # consecutively.
+        offsets = [index * natoms for index in range(len(images))]
+        pairs = Pairs(
+                np.concatenate([i + offset for (p, a, (i, j, D, R, n)), offset
+                                in zip(batch, offsets)]),
+                np.concatenate([j + offset for (p, a, (i, j, D, R, n)), offset
+                                in zip(batch, offsets)]),
+                np.concatenate([D for p, a, (i, j, D, R, n) in batch]),
+                self.cutoff,
+                np.concatenate([R for p, a, (i, j, D, R, n) in batch]))
+        centers = np.concatenate([np.where(affected)[0] + offset
+                                  for (p, affected, pairs_), offset
+                                  in zip(batch, offsets)])
+        atomic, gradients = self.evaluate(pairs, numbers, centers,
+                                          forces=forces)
+
+        energies = np.zeros(len(images))
+        all_forces = np.zeros((len(images), natoms, 3))
+        first_center = 0
+        first_pair = 0
+        for index, (neighbors, (positions, affected, selection)) in \
+                enumerate(zip(lists, batch)):
+            ncenters = affected.sum()
+            npairs = len(selection[0])
+            if gradients is not None:
+                pair_gradients = gradients[first_pair:first_pair + npairs]
+            else:
+                pair_gradients = None
+            neighbors.update(positions, affected,
+                             atomic[first_center:first_center + ncenters],
+                             selection[4], pair_gradients)
+            first_center += ncenters
+            first_pair += npairs
+
+            energies[index] = neighbors.energies.sum()
+            if forces is True:
+                all_forces[index] = neighbors.get_forces()
+
+        if forces is False:
+            return energies, None
+        return energies, all_forces
+
+
+class NeuralNetworkCalculator(Calculator):
+    """ASE calculator of a NeuralNetworkEngine
+
+    It can be used wherever a trained Amp calculator is used to predict,
+    e.g. in set_calculators of accelerate_neb, and its predict() method
+    makes mlutils.surrogate.predict() evaluate all images in one batch.
+
+    Parameters
+    ----------
+    engine : object
+        A NeuralNetworkEngine instance.
+    """
+    implemented_properties = ['energy', 'forces']
+
+    def __init__(self, engine, **kwargs):
+        Calculator.__init__(self, **kwargs)
+        self.engine = engine
+
+    @classmethod
+    def load(cls, filename, **kwargs):
+        """Create the calculator from an .amp file
+
+        kwargs are passed to NeuralNetworkEngine.
+        """
+        return cls(NeuralNetworkEngine.load(filename, **kwargs))
+
+    def calculate(self, atoms=None, properties=['energy'],
+                  system_changes=all_changes):
+        Calculator.calculate(self, atoms, properties, system_changes)
+        energies, forces = self.engine.predict([self.atoms])
+        self.results['energy'] = float(energies[0])
+        self.results['forces'] = forces[0]
+
+    def predict(self, images):
+        """Energies and forces of several images, see
+        NeuralNetworkEngine.predict()"""
+        return self.engine.predict(images)
+
+
+class Parameters(object):
+    """Parameters of the symmetry functions of one type, as arrays
+
+    Parameters
+    ----------
+    Gs : list
+        Symmetry functions of an element, as in the Gaussian descriptor.
+    kind : str
+        'G2' or 'G4'.
+    """
+    def __init__(self, Gs, kind):
+        self.columns = np.array([n for n, G in enumerate(Gs)
+                                 if G['type'] == kind], dtype=int)
+        self.size = len(self.columns)
+        Gs = [Gs[n] for n in self.columns]
+
+        self.eta = np.array([G['eta'] for G in Gs], dtype=float)
+        if kind == 'G2':
+            self.numbers = np.array([atomic_numbers[G['element']]
+                                     for G in Gs], dtype=int)
+            self.offset = np.array([G.get('offset', 0.) for G in Gs],
+                                   dtype=float)
+            return
+
+        numbers = [tuple(sorted(atomic_numbers[element]
+                                for element in G['elements'])) for G in Gs]
+        shapes = [(G['gamma'], G['zeta'], G['eta']) for G in Gs]
+
+        # Pairs of elements (kinds) and distinct (gamma, zeta, eta)
+        # (shapes) of the Gs.
+        kinds = sorted(set(numbers))
+        distinct = sorted(set(shapes))
+        self.nkinds = len(kinds)
+        self.kind = np.array([kinds.index(pair) for pair in numbers],
+                             dtype=int)
+        self.shape = np.array([distinct.index(shape) for shape in shapes],
+                              dtype=int)
+        self.codes = np.array([low * 1000 + high for low, high in kinds],
+                              dtype=int)
+        self.gamma = np.array([shape[0] for shape in distinct])
+        self.zeta = np.array([shape[1] for shape in distinct])
+        self.eta = np.array([shape[2] for shape in distinct])
+        self.norm = 2. ** (1. - np.array([G['zeta'] for G in Gs]))
+
+    def get_kinds(self, first, second):
+        """Kind of each pair of atomic numbers, nkinds when no G uses it"""
+        codes = np.minimum(first, second) * 1000 + np.maximum(first, second)
+        kind = np.searchsorted(self.codes, codes)
+        kind[kind == self.nkinds] = 0
+        kind[self.codes[kind] != codes] = self.nkinds
+        return kind
+
+
+def get_parameters(Gs):
+    """G2 and G4 Parameters of the symmetry functions of an element"""
+    for G in Gs:
+        if G['type'] not in ('G2', 'G4'):
+            raise NotImplementedError('Unknown symmetry function %s.'
+                                      % G['type'])
+    return Parameters(Gs, 'G2'), Parameters(Gs, 'G4')
+
+
+class NeighborList(object):
+    """Verlet neighbor list of an image
+
+    Pairs are searched within the cutoff plus the skin, so they contain all
+    pairs within the cutoff until an atom moves more than half the skin.
+    The list also keeps the energy of each atom and the derivatives of the
+    energies with respect to each pair, as of the last time the image was
+    predicted, so only atoms with a neighbor that moved since then are
+    evaluated again.
+
+    Parameters
+    ----------
+    image : object
+        Atoms object.
+    cutoff : float
+        Cutoff radius of the descriptor.
+    skin : float
+        Skin, in Angstrom.
+    """
+    def __init__(self, image, cutoff, skin):
+        self.cutoff = cutoff
+        self.skin = skin
+        self.numbers = image.get_atomic_numbers().copy()
+        self.pbc = image.get_pbc().copy()
+        self.cell = np.array(image.get_cell())
+        self.reference = image.get_positions()
+        self.i, self.j, S = neighbor_list('ijS', image, cutoff + skin)
+        self.shifts = np.dot(S, self.cell)
+
+        self.positions = None
+        self.energies = None
+        self.gradients = None
+
+    def get_displacement(self, image):
+        """Largest displacement of an atom since the list was built, or None
+        when the list can not be used for the image"""
+        if (len(image) != len(self.numbers) or
+           (image.get_atomic_numbers() != self.numbers).any() or
+           (image.get_pbc() != self.pbc).any() or
+           not np.allclose(image.get_cell(), self.cell)):
+            return None
+        return np.sqrt(((image.get_positions() - self.reference) ** 2)
+                       .sum(axis=1)).max()
+
+    def get_affected(self, positions, forces=True):
+        """Atoms whose energy, or its derivatives, may have changed since the
+        last prediction, as a boolean array"""
+        if (self.positions is None or
+           (forces is True and self.gradients is None)):
+            return np.ones(len(positions), dtype=bool)
+
+        moved = (positions != self.positions).any(axis=1)
+        affected = moved.copy()
+        affected[self.i[moved[self.j]]] = True
+        return affected
+
+    def get_pairs(self, positions, affected):
+        """Pairs of the affected atoms within the cutoff
+
+        Returns
+        -------
+        i, j, D, R, index : array
+            Centers, neighbors, vectors and distances between them, and
+            the index of each pair in the list.
+        """
+        index = np.where(affected[self.i])[0]
+        D = positions[self.j[index]] - positions[self.i[index]]
+        D += self.shifts[index]
+        R = np.sqrt((D ** 2).sum(axis=1))
+        inside = R <= self.cutoff
+        index = index[inside]
+        return self.i[index], self.j[index], D[inside], R[inside], index
+
+    def update(self, positions, affected, energies, index, gradients=None):
+        """Store the results of the affected atoms
+
+        Parameters
+        ----------
+        positions : array
+            Positions of the image.
+        affected : array
+            Output of get_affected().
+        energies : array
+            Energies of the affected atoms.
+        index : array
+            Index of the pairs of the affected atoms, see get_pairs().
+        gradients : array
+            Derivatives of the energies with respect to those pairs. When
+            None, the stored derivatives are discarded.
+        """
+        if self.energies is None:
+            self.energies = np.zeros(len(positions))
+        self.energies[affected] = energies
+        self.positions = positions.copy()
+
+        if gradients is None:
+            self.gradients = None
+            return
+
+        if self.gradients is None:
+            self.gradients = np.zeros((len(self.i), 3))
+        self.gradients[affected[self.i]] = 0.
+        self.gradients[index] = gradients
+
+    def get_forces(self):
+        """Forces from the stored derivatives"""
+        forces = np.zeros((len(self.numbers), 3))
+        add_to(forces, self.j, -self.gradients)
+        add_to(forces, self.i, self.gradients)
+        return forces
+
+
+class Pairs(object):
+    """Pairs of neighbors i, j with distance vectors D, sorted by i
+
+    index is the position of each pair in the pairs they were selected from.
+    """
+    def __init__(self, i, j, D, cutoff, R=None, index=None):
+        self.i = i
+        self.j = j
+        self.D = D
+        self.cutoff = cutoff
+        if R is None:
+            R = np.sqrt((D ** 2).sum(axis=1))
+        self.R = R
+        if index is None:
+            index = np.arange(len(i))
+        self.index = index
+        self.fc, self.dfc = cutoff_function(R, cutoff)
+
+    def select(self, mask):
+        return Pairs(self.i[mask], self.j[mask], self.D[mask], self.cutoff,
+                     self.R[mask], self.index[mask])
+
+
+class Triplets(object):
+    """Triplets of atoms (center, j, k), one for each two neighbors of the
+    center
+
+    Parameters
+    ----------
+    pairs : object
+        Pairs instance.
+    total : int
+        Number of atoms.
+    """
+    def __init__(self, pairs, total):
+        # Each pair a is combined with the later pairs b of its center.
+        last = np.searchsorted(pairs.i, np.arange(total), side='right')
+        counts = last[pairs.i] - np.arange(len(pairs.i)) - 1
+        a = np.repeat(np.arange(len(pairs.i)), counts)
+        starts = np.cumsum(counts) - counts
+        b = a + 1 + np.arange(len(a)) - np.repeat(starts, counts)
+
+        self.center = pairs.i[a]
+        # Index of the pairs of j and k.
+        self.a = pairs.index[a]
+        self.b = pairs.index[b]
+        self.j = pairs.j[a]
+        self.k = pairs.j[b]
+        self.va = pairs.D[a]
+        self.vb = pairs.D[b]
+        self.vc = self.vb - self.va
+        self.ra = pairs.R[a]
+        self.rb = pairs.R[b]
+        self.rc = np.sqrt((self.vc ** 2).sum(axis=1))
+        self.cos = (self.va * self.vb).sum(axis=1) / self.ra / self.rb
+        self.S = self.ra ** 2 + self.rb ** 2 + self.rc ** 2
+        self.fa = pairs.fc[a]
+        self.fb = pairs.fc[b]
+        self.fjk, self.dfjk = cutoff_function(self.rc, pairs.cutoff)
+        self.dfa = pairs.dfc[a]
+        self.dfb = pairs.dfc[b]
+        self.fc = self.fa * self.fb * self.fjk
+
+    def get_gradients(self, dcos, dS, dfc):
+        """Gradients with respect to the positions of j and k
+
+        Parameters
+        ----------
+        dcos, dS, dfc : array
+            Derivatives of a function of the triplets with respect to the
+            cosine of the angle, the sum of squared distances and the
+            product of cutoff functions.
+        """
+        va, vb, vc = self.va, self.vb, self.vc
+        ra, rb, rc = self.ra, self.rb, self.rc
+        dfjk = (self.fa * self.fb * self.dfjk / rc)[:, None] * vc
+
+        grad_j = (dcos[:, None] * (vb / (ra * rb)[:, None] -
+                                   (self.cos / ra ** 2)[:, None] * va) +
+                  2. * dS[:, None] * (va - vc) +
+                  dfc[:, None] * ((self.dfa * self.fb * self.fjk /
+                                   ra)[:, None] * va - dfjk))
+        grad_k = (dcos[:, None] * (va / (ra * rb)[:, None] -
+                                   (self.cos / rb ** 2)[:, None] * vb) +
+                  2. * dS[:, None] * (vb + vc) +
+                  dfc[:, None] * ((self.fa * self.dfb * self.fjk /
+                                   rb)[:, None] * vb + dfjk))
+        return grad_j, grad_k
+
+
+def sum_by(index, values, size):
+    """Sum the rows of values with the same index"""
+    output = np.zeros((size, values.shape[1]))
+    for column in range(values.shape[1]):
+        output[:, column] = np.bincount(index, weights=values[:, column],
+                                        minlength=size)
+    return output
+
+
+def add_to(forces, index, values):
+    """Add the rows of values to the rows of forces given by index"""
+    for axis in range(3):
+        forces[:, axis] += np.bincount(index, weights=values[:, axis],
+                                       minlength=len(forces))
+
+
+def cutoff_function(R, Rc):
+    """Cosine cutoff function and its derivative"""
+    inside = R <= Rc
+    fc = np.where(inside, 0.5 * (np.cos(np.pi * R / Rc) + 1.), 0.)
+    dfc = np.where(inside, -0.5 * np.pi / Rc * np.sin(np.pi * R / Rc), 0.)
+    return fc, dfc
+
+
+def activate(net, activation):
+    """Activation function of Amp neural networks"""
+    if activation == 'tanh':
+        return np.tanh(net)
+    elif activation == 'sigmoid':
+        return 1. / (1. + np.exp(-net))
+    return net
+
+
+def derivative(output, activation):
+    """Derivative of the activation function from its output"""
+    if activation == 'tanh':
+        return 1. - output ** 2
+    elif activation == 'sigmoid':
+        return output * (1. - output)
+    return np.ones_like(output)
@@ -0,0 +1,139 @@
+# General imports
+from contextlib import contextmanager
+import threading
+import json
+import time
+import os
+
+
+class Instrumentation(object):
+    """Timings and counters of the phases of a NEB acceleration
+
+    Each phase is timed with phase(), and one JSON line is appended to the
+    output file when it finishes, e.g.
+
+        {"iteration": 2, "phase": "train", "wall": 81.2, "cpu": 80.9,
+         "training_set": 35}
+
+    Phases can be nested, in which case the name of the inner phase is
+    prefixed with the outer one ("cross_validate/reference"). Counters
+    incremented with count() are added to all the phases that are running.
+    They can be incremented from other threads, e.g. the predictions of a
+    pipelined cross validation, and are then added to the phases running in
+    the main thread.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the JSON lines file. When it is None nothing is written, but
+        phases are still recorded in the records attribute.
+    profile : str
+        Profile each outermost phase. 'cprofile' dumps the statistics to
+        profile-<iteration>-<phase>.prof next to filename, that can be read
+        with pstats. 'tracemalloc' adds the peak of memory allocated by
+        Python during the phase, in bytes, as peak_memory.
+    """
+    def __init__(self, filename='timings.jsonl', profile=None):
+        if profile not in (None, 'cprofile', 'tracemalloc'):
+            raise ValueError('Unknown profiler %s.' % profile)
+
+        self.filename = filename
+        self.profile = profile
+        self.records = []
+        self._running = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name, iteration=None):
+        """Time a phase
+
+        Parameters
+        ----------
+        name : str
+            Name of the phase.
+        iteration : int
+            Iteration where the phase runs.
+        """
+        with self._lock:
+            if len(self._running) > 0:
+                name = '%s/%s' % (self._running[-1]['phase'], name)
+            record = {'iteration': iteration, 'phase': name}
+            self._running.append(record)
+
+        profiler = None
+        if self.profile is not None and len(self._running) == 1:
+            profiler = self._start_profiler()
+
+        wall = time.time()
+        cpu = time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall'] = time.time() - wall
+            record['cpu'] = time.process_time() - cpu
+            if profiler is not None:
+                self._stop_profiler(profiler, record)
+            with self._lock:
+                self._running.remove(record)
+            self.write(record)
+
+    def count(self, name, value=1):
+        """Increment a counter of the running phases
+
+        Parameters
+        ----------
+        name : str
+            Name of the counter, e.g. reference_calls.
+        value : int
+            Increment.
+        """
+        with self._lock:
+            for record in self._running:
+                record[name] = record.get(name, 0) + value
+
+    def set(self, name, value):
+        """Set a value, e.g. the size of the training set, in the innermost
+        running phase"""
+        with self._lock:
+            if len(self._running) > 0:
+                self._running[-1][name] = value
+
+    def write(self, record):
+        """Append a record to the JSON lines file"""
+        with self._lock:
+            self.records.append(record)
+
+            if self.filename is None:
+                return
+
+            with open(self.filename, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+
+    def _start_profiler(self):
+        if self.profile == 'cprofile':
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+            return profiler
+
+        import tracemalloc
+        started = tracemalloc.is_tracing()
+        if started is False:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        return started
+
+    def _stop_profiler(self, profiler, record):
+        if self.profile == 'cprofile':
+            profiler.disable()
+            directory = os.path.dirname(self.filename or '')
+            profiler.dump_stats(os.path.join(
+                    directory, 'profile-%s-%s.prof' % (record['iteration'],
+                                                       record['phase'])))
+            return
+
+        import tracemalloc
+        record['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        # Tracing is only stopped if it was started here.
+        if profiler is False:
+            tracemalloc.stop()
@@ -0,0 +1,75 @@
+# General imports
+import numpy as np
+
+
+class Extrapolation(Exception):
+    """Raised by an observer of the ML-NEB optimizer to stop it when the band
+    left the region of the training set"""
+    pass
+
+
+class ExtrapolationMonitor(object):
+    """Detects when the ML-NEB band leaves the region of the training set
+
+    The intermediate images of the band are checked every interval steps of
+    the ML-NEB optimizer. An image is extrapolated when its distance to the
+    nearest image of the training set is above threshold or, with an
+    ensemble, when the spread of the energies predicted by the members is
+    above uncertainty. The ML-NEB is then stopped, and the extrapolated
+    images are computed with the reference calculator in the cross
+    validation that follows, so the next model covers them.
+
+    Parameters
+    ----------
+    threshold : float
+        Largest distance to the training set, in Angstrom, as the norm of the
+        difference of positions like the duplicate_threshold of
+        accelerate_neb. None to not check distances.
+    uncertainty : float
+        Largest spread of the energies of the ensemble, in eV. It needs the
+        ensemble of accelerate_neb, and loads its members in every check, so
+        a larger interval is advised. None to not check the ensemble.
+    interval : int
+        Number of optimizer steps between checks.
+    """
+    def __init__(self, threshold=None, uncertainty=None, interval=1):
+        if threshold is None and uncertainty is None:
+            raise ValueError('Either threshold or uncertainty must be set.')
+        self.threshold = threshold
+        self.uncertainty = uncertainty
+        self.interval = interval
+        self.distances = None
+        self.uncertainties = None
+
+    def check(self, images, training_set, ensemble=None):
+        """Find the extrapolated images
+
+        Parameters
+        ----------
+        images : list
+            Intermediate images of the band.
+        training_set : object
+            A mlutils.training_set.TrainingSet instance.
+        ensemble : object
+            A trained mlutils.ensemble.BootstrapEnsemble instance, needed
+            when uncertainty is set.
+
+        Returns
+        -------
+        flagged : list
+            Indices of the extrapolated images, in increasing order. The
+            distances and uncertainties of all images are kept in the
+            attributes of the same names.
+        """
+        flagged = np.zeros(len(images), dtype=bool)
+
+        if self.threshold is not None:
+            indices, distances = training_set.query(images, np.inf)
+            self.distances = np.array(distances, dtype=float)
+            flagged |= self.distances > self.threshold
+
+        if self.uncertainty is not None and ensemble is not None:
+            self.uncertainties = ensemble.get_uncertainty(images)
+            flagged |= self.uncertainties > self.uncertainty
+
+        return np.where(flagged)[0].tolist()
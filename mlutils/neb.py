@@ -2,6 +2,8 @@
 
 # General imports
 from sklearn.metrics import mean_absolute_error
+from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor,
+                                as_completed)
 import subprocess
 import os.path
 import copy
@@ -10,9 +12,22 @@ import numpy as np
 # ASE imports
 from ase.io import read, Trajectory
 from ase.neb import SingleCalculatorNEB as NEB
+from ase.calculators.singlepoint import SinglePointCalculator
 
 # Amp imports
 from amp import Amp
+from amp.utilities import TrainingConvergenceError, hash_images
+
+from .checkpoint import Checkpoint, PHASES
+from .instrumentation import Instrumentation
+from .schedule import StepSchedule
+from .training_set import TrainingSet
+from .frames import FrameReader, write_frames
+from .workspace import Workspace
+from .surrogate import SurrogateNEB, predict
+from .inference import NeuralNetworkCalculator
+from .monitor import Extrapolation
+from .delta import DeltaCalculator, get_delta_images, get_results
 
 
 class accelerate_neb(object):
@@ -52,13 +67,114 @@ class accelerate_neb(object):
         Maximum number of times that .run will execute a band optimization.
     previous_nebfile : bool
         Whether or not we will restart the process from a previous iteration.
+    warm_start : bool
+        Whether or not the model of each iteration is initialized with the
+        parameters trained in the previous iteration (<iteration-1>.amp). The
+        training then only has to absorb the images that were added.
+    fingerprint_store : object
+        A mlutils.fingerprints.FingerprintStore instance. Fingerprints of the
+        training set are then kept in it across iterations and only computed
+        for new images, instead of being computed from scratch every time.
+    ensemble : object
+        A mlutils.ensemble.BootstrapEnsemble instance. It is trained together
+        with the model in each iteration and is used to select the images
+        that are computed with the reference calculator.
+    nselect : int
+        Maximum number of intermediate images computed with the reference
+        calculator in each cross validation when an ensemble is used. The
+        images with the largest uncertainty are selected, and the rest of the
+        band keeps the predictions of the model.
+    workspace : object
+        A mlutils.workspace.Workspace instance where all files are written.
+        By default files are written in the current working directory.
+    instrumentation : object
+        A mlutils.instrumentation.Instrumentation instance where timings and
+        counters of each phase are recorded. By default they are appended to
+        timings.jsonl in the workspace.
+    schedule : object
+        Policy that sets the fmax of the ML-NEB of each iteration, see
+        mlutils.schedule. By default a StepSchedule that divides ifmax by
+        step in each iteration. An AdaptiveSchedule uses the errors achieved
+        in cross validation instead.
+    duplicate_threshold : float
+        Images of the band closer than this distance (norm of the difference
+        of positions, in Angstrom) to an image of the training set are near
+        duplicates. They are not added to the training set, and in cross
+        validation they reuse the reference results of the training image
+        instead of being computed again. By default all images are used.
+    max_training_set : int
+        Maximum number of images in the training set. When it is exceeded,
+        images are removed following the eviction policy. The initial band,
+        that includes the end points, and the images of the latest band are
+        never removed. By default the training set is not bounded.
+    eviction : str
+        Eviction policy, 'oldest', 'farthest' (from the current band) or
+        'diversity' (farthest point sampling). See TrainingSet.evict().
+    warm_optimizer : bool
+        Whether or not the ML-NEB optimizer of each iteration starts from the
+        state of the previous one, saved in neb_<iteration>.optimizer.npz:
+        the Hessian for BFGS, or the time step and mixing for FIRE. The
+        last positions and forces are not kept, so the first step does not
+        mix bands of different iterations. The state is not used when it
+        does not fit the band, e.g. after the number of images changed.
+        BFGS must keep H, r0 and f0 as attributes, as in the ASE versions
+        that provide ase.neb, or a RuntimeError is raised.
+    fast_inference : bool
+        Whether or not trained models are evaluated with the NumPy engine of
+        mlutils.inference instead of Amp. It predicts all images of the band
+        in one batch. Models that the engine does not support are loaded with
+        Amp.
+    monitor : object
+        A mlutils.monitor.ExtrapolationMonitor instance. It checks the band
+        while the ML-NEB runs and stops the optimizer as soon as an image
+        leaves the region of the training set. The extrapolated images are
+        then always computed with the reference calculator, and an iteration
+        stopped this way does not count as converged.
+    prescreen : float
+        Only with a baseline calculator, see initialize(). Images to be
+        computed with the reference whose baseline forces differ by less
+        than prescreen (eV/Angstrom, largest component) from those of the
+        nearest image of the training set are not computed. Their results are
+        estimated as the baseline plus the correction of that training image,
+        used in cross validation but not added to the training set. By
+        default all images are computed.
+    max_intermediates : int
+        Adaptive band. The ML-NEB of each iteration starts from the band of
+        the previous one, as with previous_nebfile, and insertions images
+        are added to it halfway between the neighbors with the largest
+        energy difference, i.e. where the profile is steepest near the
+        saddle point, until it has max_intermediates. Start with few
+        intermediates in initialize(). By default the band is fixed.
+    insertions : int
+        Number of images inserted in each iteration of an adaptive band.
+    saddle_window : float
+        Images whose energy is more than saddle_window (eV) below the
+        highest image of the band, and whose NEB forces are already below
+        fmax, are not computed with the reference in cross validation. By
+        default all images are computed.
     """
     def __init__(self, initial=None, final=None, tolerance=0.01, maxiter=200,
                  fmax=0.05, ifmax=None, logfile=None, step=None,
-                 maxrunsteps=None, previous_nebfile=False, metric='fmax'):
+                 maxrunsteps=None, previous_nebfile=False, metric='fmax',
+                 warm_start=False, fingerprint_store=None, ensemble=None,
+                 nselect=None, workspace=None, instrumentation=None,
+                 schedule=None, duplicate_threshold=None,
+                 max_training_set=None, eviction='oldest',
+                 warm_optimizer=False, fast_inference=False, monitor=None,
+                 prescreen=None, max_intermediates=None, insertions=1,
+                 saddle_window=None):
+
+        if workspace is None:
+            workspace = Workspace()
+        self.workspace = workspace
 
         if logfile is None:
-            logfile = 'acceleration.log'
+            logfile = self.workspace.get_path('acceleration.log')
+
+        if instrumentation is None:
+            instrumentation = Instrumentation(
+                    self.workspace.get_path('timings.jsonl'))
+        self.instrumentation = instrumentation
 
         self.initialized = False
         self.trained = False
@@ -66,10 +182,35 @@ class accelerate_neb(object):
         self.tolerance = tolerance
         self.fmax = fmax
         self.step = step
+        if schedule is None:
+            schedule = StepSchedule(step)
+        self.schedule = schedule
+        self.history = []
         self.final_fmax = False
         self.maxrunsteps = maxrunsteps
         self.previous_nebfile = previous_nebfile
         self.metric = metric
+        self.warm_start = warm_start
+        self.warm_optimizer = warm_optimizer
+        self.fast_inference = fast_inference
+        self.monitor = monitor
+        self.prescreen = prescreen
+        self.max_intermediates = max_intermediates
+        self.insertions = insertions
+        self.saddle_window = saddle_window
+        self.flagged = []
+        self.fingerprint_store = fingerprint_store
+        self.ensemble = ensemble
+        self.nselect = nselect
+        self.duplicate_threshold = duplicate_threshold
+        self.max_training_set = max_training_set
+        self.eviction = eviction
+        self.achieved = None
+        self.band = None
+        self.reference_images = None
+        self.training_file = None
+        self.checkpoint = Checkpoint(
+                self.workspace.get_path('checkpoint.json'))
 
         if ifmax is None:
             self.ifmax = fmax
@@ -89,7 +230,10 @@ class accelerate_neb(object):
 
     def initialize(self, calc=None, amp_calc=None, climb=False,
                    intermediates=None, restart=False, cores=None,
-                   neb_optimizer='BFGS'):
+                   neb_optimizer='BFGS', workers=None, cache=None,
+                   pipeline=False, executor=None, batched_prediction=False,
+                   worker=None, baseline=None, interpolation='linear',
+                   prerelax=None, prerelax_calc=None):
         """Method to initialize the acceleration of NEB
 
         Parameters
@@ -108,9 +252,80 @@ class accelerate_neb(object):
             Restart a calculation.
         neb_optimizer : str
             Optimizer used by NEB.
+        workers : int
+            Number of processes used to evaluate images with the reference
+            calculator concurrently. By default images are computed one after
+            the other. Not used with GPAW, that is parallelized with `cores`.
+        cache : object
+            A mlutils.cache.ReferenceCache instance. Reference calculations
+            are then looked up on it before calling the reference calculator,
+            and are reused across iterations and restarts. Keys include the
+            name and parameters of calc.
+        pipeline : bool
+            Overlap work during cross validation. Reference images are
+            submitted to the workers from the highest to the lowest energy,
+            model predictions are computed while they run, and once half of
+            the results arrived the next model starts training on them in the
+            background. Requires workers > 1 or an executor, and can not be
+            used with GPAW or a worker, that compute images in one call.
+        executor : object
+            A concurrent.futures.ProcessPoolExecutor where reference
+            calculations are submitted instead of creating a pool of workers
+            in each round. It can be shared by several instances, see
+            mlutils.batch.
+        batched_prediction : bool
+            Whether or not all images of the band are predicted together,
+            with one call to the descriptor, both during the ML-NEB and in
+            cross_validate. See mlutils.surrogate.
+        worker : object
+            A mlutils.worker.CalculatorWorker. Reference calculations are
+            sent to this long-lived process, which keeps its calculator (and
+            for GPAW its wavefunctions) across iterations, instead of
+            starting gpaw-python in every round. Close it when done.
+        baseline : object
+            Cheap ASE calculator, e.g. EMT, for delta learning. The model is
+            trained on the difference between calc and the baseline, and
+            predicts with the baseline added back, see mlutils.delta.
+        interpolation : str
+            How the initial band is built between the initial and final
+            images, 'linear' or 'idpp' (image dependent pair potential).
+            IDPP avoids atoms getting too close in the interpolated images,
+            that are expensive to converge with the reference and poor
+            training data.
+        prerelax : float
+            fmax of a NEB run on the initial band with a cheap calculator
+            before the first reference calculations. By default the band is
+            not relaxed.
+        prerelax_calc : object
+            Cheap ASE calculator used by prerelax. By default the baseline.
         """
+        if pipeline is True and (
+                calc is None or worker is not None or
+                (executor is None and (workers is None or workers <= 1))):
+            raise ValueError('pipeline needs workers > 1 or an executor, '
+                             'and can not be used with GPAW or a worker.')
+
         self.calc = calc
         self.cores = cores
+        self.workers = workers
+        self.cache = cache
+        self.pipeline = pipeline
+        self.executor = executor
+        self.batched_prediction = batched_prediction
+        self.worker = worker
+        self.baseline = baseline
+        # Baseline results of the training images, by hash.
+        self.baseline_results = {}
+        if interpolation not in ('linear', 'idpp'):
+            raise ValueError('Unknown interpolation %s.' % interpolation)
+        self.interpolation = interpolation
+        if prerelax_calc is None:
+            prerelax_calc = baseline
+        if prerelax is not None and prerelax_calc is None:
+            raise ValueError('prerelax needs prerelax_calc or a baseline.')
+        self.prerelax = prerelax
+        self.prerelax_calc = prerelax_calc
+        self.pretraining = None
         self.neb_optimizer = neb_optimizer
         if restart is None:
             self.logfile.write('NEB acceleration initialized\n')
@@ -122,6 +337,16 @@ class accelerate_neb(object):
                                % self.cores)
             self.logfile.flush()
 
+        if self.workers is not None:
+            self.logfile.write('Number of workers for reference calculator is '
+                               '%s \n' % self.workers)
+            self.logfile.flush()
+
+        if self.executor is not None:
+            self.logfile.write('Reference calculations are submitted to a '
+                               'shared pool of workers \n')
+            self.logfile.flush()
+
         self.logfile.write('The optimizer used for the NEB calculation is %s'
                            '\n' % self.neb_optimizer)
 
@@ -147,106 +372,57 @@ class accelerate_neb(object):
 
             images.append(self.final)
 
-            # When using something different from GPAW, we need to write the
-            # images to file, and then read them back.
-            if self.calc_name != 'GPAW':
+            with self.instrumentation.phase('extend', iteration=0):
                 self.neb_images = self.run_neb(images, interpolate=True)
-            else:
-                self.run_neb(images, interpolate=True)
-                self.neb_images = read('training.traj',
-                                       index=slice(0, self.nreadimg))
+                self.training_set = TrainingSet(self.neb_images)
+                self.instrumentation.set('training_set',
+                                         len(self.training_set))
 
             self.initialized = True
+            self.iteration = 0
+            self.band = self.neb_images
+            self.state = None
+            # Reference calculations of the initial band are the extend phase
+            # of iteration 0.
+            self.save_checkpoint('extend', self.ifmax)
 
         elif self.initialized is True:
-            nreadimg = -(self.intermediates + 2)
-            self.neb_images = read('training.traj',
-                                   index=slice(0, self.nreadimg))
-
-            # We check the existance of previous files and we restart the
-            # calculations. #FIXME this is not probably finished for all cases.
-
-            nebfile, digit = check_files()
-
-            if nebfile is not False:
-                """
-                This case only requires crossvalidation
-                """
-                self.training_set = Trajectory('training.traj')
-                self.iteration = int(digit)
-                self.logfile.write('Restarting at iteration %s \n'
-                                   % self.iteration)
-                self.logfile.write('Using NEB trajectory %s \n' % nebfile)
+            state = self.checkpoint.load()
+            if state is not None:
+                self.training_file = state.get('training_set')
+            self.training_set = self.load_training_set(self.training_file)
+            self.neb_images = self.training_set[0:self.nreadimg]
+
+            if state is None:
+                self.logfile.write('No checkpoint found in %s, restarting at '
+                                   'iteration 0 \n'
+                                   % self.checkpoint.filename)
                 self.logfile.flush()
-                self.trained = True
-                new_neb_images = read(nebfile, index=slice(nreadimg, None))
-                newcalc = Amp.load('%s.amp' % self.iteration)
-                self.achieved = self.cross_validate(new_neb_images,
-                                                    calc=self.calc,
-                                                    amp_calc=newcalc,
-                                                    metric=self.metric)
-                clean_dir(logfile=self.logfile)
-                del newcalc
+                self.band = self.neb_images
+                self.state = None
+            else:
+                self.iteration = state['iteration']
+                self.final_fmax = state['final_fmax']
+                self.achieved = state['achieved']
+                self.history = [tuple(entry)
+                                for entry in state.get('history', [])]
+                self.flagged = list(state.get('flagged', []))
+                # Members are only set by ensemble.train(), so they are
+                # restored for a run that resumes after training.
+                if self.ensemble is not None:
+                    self.ensemble.filenames = list(state.get('ensemble', []))
+                band = self.checkpoint.get_band(state, self.training_set[0])
+                if band is not None:
+                    self.band = band
+                else:
+                    self.band = self.neb_images
+                self.trained = state['phase'] != 'extend'
+                self.state = state
+                self.logfile.write('Restarting at iteration %s after phase '
+                                   '%s \n' % (self.iteration, state['phase']))
                 self.logfile.flush()
 
-            elif nebfile is False:
-                self.training_set = Trajectory('training.traj')
-                try:
-                    self.iteration = int(digit)
-                    self.logfile.write('Restarting at iteration %s \n'
-                                       % self.iteration)
-                    self.logfile.write('Using calc %s.amp \n' % digit)
-                    self.logfile.flush()
-                    self.trained = True
-                    self.neb_images = read('training.traj',
-                                           index=slice(0, self.nreadimg))
-                    self.logfile.write('Starting ML-NEB calculation... '
-                                       'Go, and grab a cup of coffee :) \n')
-                    self.logfile.flush()
-                    newcalc = Amp.load('%s.amp' % digit)
-                    calc_name = newcalc.__class__.__name__
-
-                    if self.previous_nebfile is False:
-                        self.neb_images = read('training.traj',
-                                               index=slice(0, self.nreadimg))
-                    else:
-                        nebfile = 'neb_%s.traj' % (digit - 1)
-                        self.neb_images = read(nebfile,
-                                               index=slice(-self.nreadimg,
-                                                           None))
-                    images = self.set_calculators(
-                            self.neb_images,
-                            newcalc,
-                            calc_name=calc_name,
-                            logfile=self.logfile,
-                            cores=self.cores
-                            )
-                    self.run_neb(self.neb_images, fmax=self.fmax)
-                    del newcalc
-                    clean_dir(logfile=self.logfile)
-                    self.logfile.write('ML-NEB calculation finished... \o/ \n')
-
-                    # We now read the last images from the NEB: initial,
-                    # intermediate, and final states.
-                    ini_neb_images = read(self.traj,
-                                          index=slice(nreadimg, None))
-                    self.logfile.write('New guessed ML-MEP was read from %s \n'
-                                       % self.traj)
-                    self.logfile.flush()
-
-                    newcalc = Amp.load('%s.amp' % label)
-                    self.achieved = self.cross_validate(ini_neb_images,
-                                                        calc=self.calc,
-                                                        amp_calc=newcalc,
-                                                        metric=self.metric)
-                    clean_dir(logfile=self.logfile)
-                    del newcalc
-                    self.logfile.flush()
-                    self.training_set.close()
-                except:
-                    self.iteration = 0
-
-    def run_neb(self, images, interpolate=False, fmax=None):
+    def run_neb(self, images, interpolate=False, fmax=None, amp_calc=None):
         """This method runs NEB calculations
 
         Parameters
@@ -256,23 +432,47 @@ class accelerate_neb(object):
         interpolate : bool
             Interpolate images. Needed when initializing this module.
         fmax : the maximum force to be used in your NEB.
+        amp_calc : object
+            The model attached to the images. When batched_prediction is set,
+            intermediates are predicted together with it at each optimizer
+            step.
+
+        Returns
+        -------
+        images : list
+            With interpolate, the interpolated images with their reference
+            results. Otherwise, copies of the optimized band with the results
+            of the model, so it does not need to be read back from the
+            trajectory file.
         """
-        neb = NEB(images)
+        if self.batched_prediction is True and amp_calc is not None:
+            neb = SurrogateNEB(images, amp_calc)
+        else:
+            neb = NEB(images)
 
         if interpolate is True:
             neb.interpolate()
+            if self.interpolation == 'idpp':
+                neb.idpp_interpolate(
+                        traj=self.workspace.get_path('idpp.traj'),
+                        log=self.workspace.get_path('idpp.log'))
+            if self.prerelax is not None:
+                self.prerelax_band(neb.images)
             calc = self.calc
             self.set_calculators(neb.images,
                                  calc,
                                  calc_name=self.calc_name,
-                                 write_training_set=True,
-                                 cores=self.cores)
+                                 cores=self.cores,
+                                 workers=self.workers,
+                                 cache=self.cache,
+                                 executor=self.executor,
+                                 worker=self.worker)
             del calc
             return neb.images
 
         else:
-            self.traj = 'neb_%s.traj' % self.iteration
-            logfile = 'neb_%s.log' % self.iteration
+            self.traj = self.workspace.get_path('neb_%s.traj' % self.iteration)
+            logfile = self.workspace.get_path('neb_%s.log' % self.iteration)
 
             if self.neb_optimizer.lower() == 'bfgs':
                 from ase.optimize import BFGS
@@ -281,197 +481,226 @@ class accelerate_neb(object):
                 from ase.optimize import FIRE
                 qn = FIRE(neb, trajectory=self.traj, logfile=logfile)
 
+            if self.warm_optimizer is True:
+                self.load_optimizer_state(qn, neb)
+
+            # Observers are called once per force evaluation of the band.
+            qn.attach(lambda: self.instrumentation.count(
+                'surrogate_calls', len(images) - 2))
+            if self.monitor is not None:
+                qn.attach(lambda: self.check_extrapolation(neb.images),
+                          interval=self.monitor.interval)
+
+            try:
+                if self.maxrunsteps is None:
+                    qn.run(fmax=fmax)
+                else:
+                    qn.run(fmax=fmax, steps=self.maxrunsteps)
+            except Extrapolation as error:
+                self.logfile.write('ML-NEB stopped after %s steps: %s\n'
+                                   % (qn.nsteps, error))
+                self.logfile.flush()
+            self.instrumentation.count('optimizer_steps', qn.nsteps)
+            if self.warm_optimizer is True:
+                self.save_optimizer_state(qn)
+            clean_dir(logfile=self.logfile, path=self.workspace.path)
+
+            # With a shared calculator, iterimages() attaches the results
+            # stored by the NEB to each image, as is done when the trajectory
+            # is written.
+            if hasattr(neb, 'iterimages'):
+                return freeze_images(list(neb.iterimages()))
+            return freeze_images(neb.images)
+
+    def prerelax_band(self, images):
+        """Relax the initial band with the cheap calculator
+
+        Each image gets its own copy of prerelax_calc, that is removed
+        afterwards. The optimizer is the one of the ML-NEB, run to prerelax
+        or maxrunsteps.
+
+        Parameters
+        ----------
+        images : list
+            Images of the band, relaxed in place.
+        """
+        for image in images:
+            image.set_calculator(copy.deepcopy(self.prerelax_calc))
+
+        with self.instrumentation.phase('prerelax', iteration=0):
+            neb = NEB(images)
+            traj = self.workspace.get_path('prerelax.traj')
+            logfile = self.workspace.get_path('prerelax.log')
+            if self.neb_optimizer.lower() == 'bfgs':
+                from ase.optimize import BFGS
+                qn = BFGS(neb, trajectory=traj, logfile=logfile)
+            elif self.neb_optimizer.lower() == 'fire':
+                from ase.optimize import FIRE
+                qn = FIRE(neb, trajectory=traj, logfile=logfile)
+
             if self.maxrunsteps is None:
-                qn.run(fmax=fmax)
+                qn.run(fmax=self.prerelax)
             else:
-                qn.run(fmax=fmax, steps=self.maxrunsteps)
-        clean_dir(logfile=self.logfile)
+                qn.run(fmax=self.prerelax, steps=self.maxrunsteps)
+            self.instrumentation.count('optimizer_steps', qn.nsteps)
+
+        self.logfile.write('Initial band relaxed with %s in %s steps\n'
+                           % (self.prerelax_calc.__class__.__name__,
+                              qn.nsteps))
+        self.logfile.flush()
+
+        for image in images:
+            image.set_calculator(None)
+
+    def check_extrapolation(self, images):
+        """Stop the ML-NEB when the monitor finds extrapolated images
+
+        Parameters
+        ----------
+        images : list
+            Images of the band, with the end points.
+        """
+        flagged = self.monitor.check(images[1:-1], self.training_set,
+                                     ensemble=self.ensemble)
+        if len(flagged) == 0:
+            return
+
+        self.flagged = flagged
+        self.instrumentation.count('extrapolation_stops')
+        if self.monitor.distances is not None:
+            self.logfile.write('Distances of images to the training set are '
+                               '%s\n' % self.monitor.distances.tolist())
+        if self.monitor.uncertainties is not None:
+            self.logfile.write('Ensemble uncertainty of images is %s\n'
+                               % self.monitor.uncertainties.tolist())
+        raise Extrapolation('images %s are extrapolated' % flagged)
+
+    def save_optimizer_state(self, qn):
+        """Save the state of the ML-NEB optimizer of this iteration
+
+        Parameters
+        ----------
+        qn : object
+            BFGS or FIRE instance after the run.
+        """
+        if self.neb_optimizer.lower() == 'bfgs':
+            if getattr(qn, 'H', None) is None:
+                return
+            state = {'H': np.asarray(qn.H)}
+        else:
+            state = {'dt': qn.dt, 'a': qn.a}
+
+        filename = self.workspace.get_path('neb_%s.optimizer.npz'
+                                           % self.iteration)
+        with open(filename + '.tmp', 'wb') as f:
+            np.savez(f, **state)
+        os.replace(filename + '.tmp', filename)
+
+    def load_optimizer_state(self, qn, neb):
+        """Seed the ML-NEB optimizer with the state of the last iteration
+
+        Parameters
+        ----------
+        qn : object
+            BFGS or FIRE instance, before the run.
+        neb : object
+            The NEB being optimized.
+        """
+        # The state is set on the attributes of the optimizer, checked in
+        # every iteration so an unsupported optimizer fails at the first.
+        if self.neb_optimizer.lower() == 'bfgs':
+            names = ('H', 'r0', 'f0')
+        else:
+            names = ('dt', 'a')
+        for name in names:
+            if (not hasattr(qn, name) or
+               isinstance(getattr(type(qn), name, None), property)):
+                raise RuntimeError(
+                        'warm_optimizer needs the %s attribute of %s to be '
+                        'settable, as in ASE versions that provide ase.neb.'
+                        % (name, qn.__class__.__name__))
+
+        filename = self.workspace.get_path('neb_%s.optimizer.npz'
+                                           % (self.iteration - 1))
+        if not os.path.isfile(filename):
+            return
+
+        with np.load(filename) as data:
+            state = dict(data)
+
+        try:
+            if self.neb_optimizer.lower() == 'bfgs':
+                ndofs = 3 * len(neb)
+                if 'H' not in state or state['H'].shape != (ndofs, ndofs):
+                    raise ValueError('the Hessian does not fit the band')
+                qn.H = state['H']
+                # The update of the first step is skipped when positions did
+                # not move since r0, so forces of the previous band are not
+                # mixed with the new one.
+                qn.r0 = neb.get_positions().ravel()
+                qn.f0 = np.zeros(ndofs)
+            else:
+                qn.dt = float(state['dt'])
+                qn.a = float(state['a'])
+        except (KeyError, ValueError) as error:
+            self.logfile.write('Optimizer state of %s not used: %s\n'
+                               % (filename, error))
+            self.logfile.flush()
+            return
+
+        self.logfile.write('Optimizer state read from %s\n' % filename)
+        self.logfile.flush()
 
     def accelerate(self):
         """This method performs all the acceleration algorithm"""
 
-        nreadimg = -(self.intermediates + 2)
-
         if self.step is None:
             step = 1.
         else:
             step = self.step
-        fmax = self.ifmax
 
-        if self.initialized is True and self.trained is False:
+        if self.state is None:
             self.iteration = 0
-            self.training_set = Trajectory('training.traj')
+            fmax = self.ifmax
             self.logfile.write('Iteration %s \n' % self.iteration)
             self.logfile.write('Number images to slice from NEB Trajectory is '
-                               '%s. \n' % nreadimg)
+                               '%s. \n' % -self.nreadimg)
             self.logfile.write('New training set lenght is %s. \n' %
                                len(self.training_set))
-            self.logfile.flush()
-
-            self.logfile.write('Starting Training, sit tight... \n')
-            self.logfile.flush()
-            label = str(self.iteration)
-            amp_calc = copy.deepcopy(self.amp_calc)
-            amp_calc.set_label(label)
-            self.train(self.training_set, amp_calc, label=label)
-            del amp_calc
-            clean_train_data()
-            self.logfile.write('Training process finished. \n')
-            self.logfile.flush()
-
             self.logfile.write('Step = %s, ifmax = %s, fmax = %s \n' %
                                (step, fmax, self.fmax))
-            self.logfile.write('Starting ML-NEB calculation... '
-                               'Go, and grab a cup of coffee :) \n')
             self.logfile.flush()
-            newcalc = Amp.load('%s.amp' % label)
-            calc_name = newcalc.__class__.__name__
-
-            self.neb_images = read('training.traj',
-                                   index=slice(0, self.nreadimg))
-
-            images = self.set_calculators(
-                    self.neb_images,
-                    newcalc,
-                    calc_name=calc_name,
-                    logfile=self.logfile,
-                    cores=self.cores
-                    )
-
-            self.run_neb(self.neb_images, fmax=fmax)
-            del newcalc
-            clean_dir(logfile=self.logfile)
-            self.logfile.write('ML-NEB calculation finished... \o/ \n')
-
-            # We now read the last images from the NEB: initial, intermediate,
-            # and final states.
-            ini_neb_images = read(self.traj, index=slice(nreadimg, None))
-            self.logfile.write('New guessed ML-MEP was read from %s \n'
-                               % self.traj)
-            self.logfile.flush()
-
-            newcalc = Amp.load('%s.amp' % label)
-            self.achieved = self.cross_validate(ini_neb_images,
-                                                calc=self.calc,
-                                                amp_calc=newcalc,
-                                                metric=self.metric)
-            clean_dir(logfile=self.logfile)
-            del newcalc
-            self.logfile.flush()
-            self.training_set.close()
+            self.run_iteration(fmax, phase='extend')
+        else:
+            fmax = self.state['fmax']
+            if self.state['phase'] != PHASES[-1]:
+                self.run_iteration(fmax, phase=self.state['phase'])
+        self.state = None
 
         while True:
+            self.workspace.checkpoint(logfile=self.logfile)
             self.iteration += 1
 
             self.logfile.write('Iteration %s \n' % self.iteration)
             self.logfile.flush()
 
-            fmax = fmax / step
+            fmax = self.schedule.get_fmax(fmax, self.fmax, self.history)
             if fmax < self.fmax or fmax == self.fmax:
                 fmax = self.fmax
             else:
-                self.logfile.write('Step = %s, new ifmax = %s \n'
-                                   % (step, fmax))
+                self.logfile.write('%s, new ifmax = %s \n'
+                                   % (self.schedule.__class__.__name__, fmax))
                 self.logfile.flush()
 
             if ((self.achieved[0] > self.tolerance) or
                (self.achieved[1] > self.tolerance)):
-                print('Line 182', fmax)
-                if (self.iteration - 1) == 0:
-                    self.logfile.write('INITIAL\n')
-                    self.logfile.flush()
-                    if os.path.isfile('images_from_neb.traj'):
-                        ini_neb_images = Trajectory('images_from_neb.traj',
-                                                    mode='r')
-                        ini_neb_images = list(ini_neb_images)[1:-1]
-                        training_file = Trajectory('training.traj',
-                                                   mode='a')
-                        for _ in ini_neb_images:
-                            training_file.write(_)
-                        training_file.close()
-                    else:
-                        self.logfile.write('images_from_neb.traj does not '
-                                           'exist\n')
-                        self.logfile.write('Aborting...\n')
-                        exit()
-                    self.logfile.write('I added %s more images to the training'
-                                       'set \n'
-                                       % len(ini_neb_images))
-                    self.logfile.flush()
-                else:
-                    self.traj_to_add = 'neb_%s.traj' % (self.iteration - 1)
-                    self.logfile.write('Previous NEB Trajectory read from %s'
-                                       '\n' % self.traj_to_add)
-                    self.logfile.flush()
-                    if os.path.isfile('images_from_neb.traj'):
-                        ini_neb_images = Trajectory('images_from_neb.traj',
-                                                    mode='r')
-                        ini_neb_images = list(ini_neb_images)[1:-1]
-                        training_file = Trajectory('training.traj', mode='a')
-                        for _ in ini_neb_images:
-                            training_file.write(_)
-                        training_file.close()
-                    else:
-                        self.logfile.write('images_from_neb.traj does not'
-                                           'exist\n')
-                        self.logfile.write('Aborting...\n')
-                        exit()
-                    self.logfile.write('I added %s more images to the training'
-                                       'set\n' % len(ini_neb_images))
-                    self.logfile.flush()
-
-                self.training_set = Trajectory('training.traj')
-                self.logfile.write('Length of training set is now %s.\n'
-                                   % len(self.training_set))
-                label = str(self.iteration)
-                amp_calc = copy.deepcopy(self.amp_calc)
-                amp_calc.set_label(label)
-                self.train(self.training_set, amp_calc, label=label)
-                del amp_calc
-                clean_train_data()
-                newcalc = Amp.load('%s.amp' % label)
-                calc_name = newcalc.__class__.__name__
-
-                if self.previous_nebfile is False:
-                    self.neb_images = read('training.traj',
-                                           index=slice(0, self.nreadimg))
-                else:
-                    nebfile = 'neb_%s.traj' % (self.iteration - 1)
-                    self.neb_images = read(nebfile,
-                                           index=slice(-self.nreadimg, None))
-
-                images = self.set_calculators(self.neb_images, newcalc,
-                                              calc_name=calc_name,
-                                              logfile=self.logfile,
-                                              cores=self.cores)
-
-                self.run_neb(images, fmax=fmax)
-                clean_dir(logfile=self.logfile)
-                del newcalc
-                new_neb_images = read(self.traj, index=slice(nreadimg, None))
-                newcalc = Amp.load('%s.amp' % label)
-                self.achieved = self.cross_validate(
-                        new_neb_images,
-                        calc=self.calc,
-                        amp_calc=newcalc,
-                        metric=self.metric
-                        )
-                clean_dir(logfile=self.logfile)
-                del newcalc
-                self.logfile.flush()
-
-                if ((self.achieved[0] < self.tolerance) and
-                   (self.achieved[1] < self.tolerance) and
-                   (fmax <= self.fmax)):
-                    self.final_fmax = True
+                self.run_iteration(fmax)
 
             elif self.iteration == self.maxiter:
-                print('Line 294', fmax)
                 self.logfile.write('Maximum number of iterations reached')
                 break
 
             elif fmax == self.fmax and self.final_fmax is True:
-                print('Line 299', fmax)
                 self.logfile.write('\n')
                 self.logfile.write("Calculation converged!\n")
                 self.logfile.write('     fmax = %s.\n' % fmax)
@@ -483,149 +712,277 @@ class accelerate_neb(object):
                 break
 
             elif fmax < self.fmax:
-                self.logfile.write('Iteration %s \n' % self.iteration)
-                self.logfile.flush()
-                print('Line 248', fmax)
-                self.traj_to_add = 'neb_%s.traj' % (self.iteration - 1)
-                self.logfile.write('Trajectory to be added %s \n'
-                                   % self.traj_to_add)
-                self.logfile.flush()
-
-                if os.path.isfile('images_from_neb.traj'):
-                    ini_neb_images = Trajectory('images_from_neb.traj',
-                                                mode='r')
-                    ini_neb_images = list(ini_neb_images)[1:-1]
-                    training_file = Trajectory('training.traj', mode='a')
-                    for _ in ini_neb_images:
-                        training_file.write(_)
-                    training_file.close()
-                else:
-                    self.logfile.write('images_from_neb.traj does not exist\n')
-                    self.logfile.write('Aborting...\n')
-                    exit()
-                self.logfile.write('I added %s more images to the training set'
-                                   '\n' % len(ini_neb_images))
-                self.logfile.flush()
-
-                self.training_set = Trajectory('training.traj')
-                self.logfile.write('Length of training set is now %s.\n'
-                                   % len(self.training_set))
-
-                label = str(self.iteration)
-                amp_calc = copy.deepcopy(self.amp_calc)
-                amp_calc.set_label(label)
-                self.train(self.training_set, amp_calc, label=label)
-                del amp_calc
-                clean_train_data()
-                newcalc = Amp.load('%s.amp' % label)
-
-                if self.previous_nebfile is False:
-                    self.neb_images = read('training.traj', index=slice(0,
-                                           self.nreadimg))
-                else:
-                    nebfile = 'neb_%s.traj' % (self.iteration - 1)
-                    self.neb_images = read(nebfile,
-                                           index=slice(-self.nreadimg, None))
-
-                images = self.set_calculators(self.neb_images, newcalc,
-                                              calc_write=self.calc_write,
-                                              logfile=self.logfile,
-                                              cores=self.cores)
-
                 fmax = self.fmax
                 self.logfile.write('Step = %s, input requested fmax = %s \n'
                                    % (step, fmax))
-                self.run_neb(images, fmax=fmax)
-                clean_dir(logfile=self.logfile)
-                del newcalc
-                new_neb_images = read(self.traj, index=slice(nreadimg, None))
-                newcalc = Amp.load('%s.amp' % label)
-                self.achieved = self.cross_validate(new_neb_images,
-                                                    calc=self.calc,
-                                                    amp_calc=newcalc,
-                                                    metric=self.metric)
+                self.run_iteration(fmax)
                 self.logfile.write('Energy and Force metrics achieved are %s '
                                    'and %s, tolerance requested is %s \n'
                                    % (float(self.achieved[0]),
                                       float(self.achieved[1]),
                                       self.tolerance))
-                clean_dir(logfile=self.logfile)
-                del newcalc
-                self.logfile.flush()
-
-                if ((self.achieved[0] < self.tolerance) and
-                   (self.achieved[1] < self.tolerance) and
-                   (fmax <= self.fmax)):
-                    self.final_fmax = True
 
             else:
-                print('Line 307', fmax)
-                self.logfile.write('Iteration %s \n' % self.iteration)
-                self.logfile.flush()
-                self.traj_to_add = 'neb_%s.traj' % (self.iteration - 1)
-                self.logfile.write('Trajectory to be added %s \n'
-                                   % self.traj_to_add)
-                self.logfile.flush()
+                self.run_iteration(fmax)
 
-                if os.path.isfile('images_from_neb.traj'):
-                    ini_neb_images = Trajectory('images_from_neb.traj',
-                                                mode='r')
-                    ini_neb_images = list(ini_neb_images)[1:-1]
-                    training_file = Trajectory('training.traj', mode='a')
-                    for _ in ini_neb_images:
-                        training_file.write(_)
-                    training_file.close()
+    def run_iteration(self, fmax, phase=None):
+        """Run the phases of an iteration
 
-                else:
-                    self.logfile.write('images_from_neb.traj does not exist\n')
-                    self.logfile.write('Aborting...\n')
-                    exit()
-                self.logfile.write('I added %s more images to the training set'
-                                   '\n' % len(ini_neb_images))
-                self.logfile.flush()
+        The phases are extend (images computed in the last cross validation
+        are added to the training set), train, neb (ML-NEB) and
+        cross_validate. The checkpoint is saved at the end of each of them, so
+        a restart continues after the last completed phase without repeating
+        reference calculations or training.
 
-                self.training_set = Trajectory('training.traj')
-                self.logfile.write('Length of training set is now %s.\n'
-                                   % len(self.training_set))
-                label = str(self.iteration)
-                amp_calc = copy.deepcopy(self.amp_calc)
-                amp_calc.set_label(label)
-                self.train(self.training_set, amp_calc, label=label)
-                del amp_calc
-                clean_train_data()
-                newcalc = Amp.load('%s.amp' % label)
-                calc_name = newcalc.__class__.__name__
-
-                if self.previous_nebfile is False:
-                    self.neb_images = read('training.traj',
-                                           index=slice(0, self.nreadimg))
-                else:
-                    nebfile = 'neb_%s.traj' % (self.iteration - 1)
-                    self.neb_images = read(nebfile,
-                                           index=slice(-self.nreadimg, None))
-
-                images = self.set_calculators(self.neb_images, newcalc,
-                                              calc_name=calc_name,
-                                              logfile=self.logfile,
-                                              cores=self.cores)
-
-                self.run_neb(images, fmax=fmax)
-                clean_dir(logfile=self.logfile)
-                del newcalc
-                new_neb_images = read(self.traj, index=slice(nreadimg, None))
-                newcalc = Amp.load('%s.amp' % label)
-                self.achieved = self.cross_validate(new_neb_images,
-                                                    calc=self.calc,
-                                                    amp_calc=newcalc,
-                                                    metric=self.metric)
-                clean_dir(logfile=self.logfile)
-                del newcalc
+        Parameters
+        ----------
+        fmax : float
+            fmax of the ML-NEB.
+        phase : str
+            Last phase already completed when resuming an iteration. By
+            default all phases are run.
+        """
+        if phase is None:
+            done = -1
+        else:
+            done = PHASES.index(phase)
+            if phase != PHASES[0] or self.iteration > 0:
+                self.logfile.write('Resuming iteration %s after phase %s \n'
+                                   % (self.iteration, phase))
                 self.logfile.flush()
 
-                if ((self.achieved[0] < self.tolerance) and
-                   (self.achieved[1] < self.tolerance) and
-                   (fmax <= self.fmax)):
-                    self.final_fmax = True
+        run_phase = {'extend': self.extend_phase,
+                     'train': self.train_phase,
+                     'neb': self.neb_phase,
+                     'cross_validate': self.cross_validate_phase}
+
+        for name in PHASES[done + 1:]:
+            with self.instrumentation.phase(name, iteration=self.iteration):
+                run_phase[name](fmax)
+                self.instrumentation.set('training_set',
+                                         len(self.training_set))
+                self.save_checkpoint(name, fmax)
+
+    def extend_phase(self, fmax):
+        """Add the images of the last cross validation to the training set"""
+        if (self.iteration - 1) == 0:
+            self.logfile.write('INITIAL\n')
+            self.logfile.flush()
+        else:
+            self.traj_to_add = self.workspace.get_path(
+                    'neb_%s.traj' % (self.iteration - 1))
+            self.logfile.write('Previous NEB Trajectory read from %s'
+                               '\n' % self.traj_to_add)
+            self.logfile.flush()
+        self.extend_training_set()
+        self.logfile.write('Length of training set is now %s.\n'
+                           % len(self.training_set))
+
+    def train_phase(self, fmax):
+        """Train the model of the iteration"""
+        label = str(self.iteration)
+        self.logfile.write('Starting Training, sit tight... \n')
+        self.logfile.flush()
+        amp_calc = self.get_model(label)
+        self.train(self.training_set[:], amp_calc, label=label)
+        del amp_calc
+        clean_train_data(path=self.workspace.path)
+        self.trained = True
+        self.logfile.write('Training process finished. \n')
+        self.logfile.flush()
+
+    def neb_phase(self, fmax):
+        """Optimize the band with the model of the iteration"""
+        label = str(self.iteration)
+        self.logfile.write('Starting ML-NEB calculation... '
+                           'Go, and grab a cup of coffee :) \n')
+        self.logfile.flush()
+        newcalc = self.load_model(label)
+        calc_name = newcalc.__class__.__name__
+        self.flagged = []
+
+        if self.max_intermediates is not None and self.iteration > 0:
+            # The band optimized in the previous iteration, with new images.
+            self.neb_images = self.insert_images(self.band)
+        elif self.previous_nebfile is False or self.iteration == 0:
+            self.neb_images = self.training_set[0:self.nreadimg]
+        else:
+            # The band optimized in the previous iteration.
+            self.neb_images = [image.copy() for image in self.band]
+
+        images = self.set_calculators(self.neb_images, newcalc,
+                                      calc_name=calc_name,
+                                      logfile=self.logfile,
+                                      cores=self.cores)
+
+        self.band = self.run_neb(images, fmax=fmax, amp_calc=newcalc)
+        clean_dir(logfile=self.logfile, path=self.workspace.path)
+        del newcalc
+        self.logfile.write('ML-NEB calculation finished... \o/ \n')
+        self.logfile.write('New guessed ML-MEP was written to %s \n'
+                           % self.traj)
+        self.logfile.flush()
+
+    def cross_validate_phase(self, fmax):
+        """Compute the band with the reference calculator and the metrics"""
+        label = str(self.iteration)
+        newcalc = self.load_model(label)
+        self.achieved = self.cross_validate(self.band,
+                                            calc=self.calc,
+                                            amp_calc=newcalc,
+                                            metric=self.metric)
+        clean_dir(logfile=self.logfile, path=self.workspace.path)
+        del newcalc
+        self.logfile.flush()
+
+        self.history.append((fmax, float(self.achieved[0]),
+                             float(self.achieved[1])))
+
+        # A band stopped by the monitor did not reach fmax.
+        if (self.iteration > 0 and len(self.flagged) == 0 and
+           (self.achieved[0] < self.tolerance) and
+           (self.achieved[1] < self.tolerance) and
+           (fmax <= self.fmax)):
+            self.final_fmax = True
+
+    def save_checkpoint(self, phase, fmax):
+        """Save the state of the acceleration after a phase
+
+        After the extend phase, the training set is first saved to
+        training-<iteration>.npz, and the file of the previous iteration is
+        removed once the checkpoint refers to the new one. A run killed in
+        between resumes with the training set of the last checkpoint, so
+        images are never added twice.
+
+        Parameters
+        ----------
+        phase : str
+            Phase that was completed, see mlutils.checkpoint.PHASES.
+        fmax : float
+            fmax of the ML-NEB of the current iteration.
+        """
+        if phase == 'extend':
+            label = self.iteration - 1
+        else:
+            label = self.iteration
+
+        if label < 0:
+            model = None
+        else:
+            model = self.workspace.get_path('%s.amp' % label)
+
+        if self.ensemble is None:
+            ensemble = None
+        else:
+            ensemble = self.ensemble.filenames
+
+        previous = self.training_file
+        if phase == 'extend':
+            self.training_file = 'training-%s.npz' % self.iteration
+            with self.instrumentation.phase('save',
+                                            iteration=self.iteration):
+                self.training_set.save(
+                        self.workspace.get_path(self.training_file))
+
+        with self.instrumentation.phase('checkpoint',
+                                        iteration=self.iteration):
+            self.checkpoint.save(self.iteration, phase, fmax,
+                                 final_fmax=self.final_fmax,
+                                 achieved=self.achieved, model=model,
+                                 band=self.band, history=self.history,
+                                 flagged=self.flagged, ensemble=ensemble,
+                                 training_set=self.training_file)
+
+        if (previous is not None and previous != self.training_file and
+           os.path.isfile(self.workspace.get_path(previous))):
+            os.remove(self.workspace.get_path(previous))
+
+    def load_training_set(self, filename=None):
+        """Load the training set
+
+        Parameters
+        ----------
+        filename : str
+            Name of the .npz file in the workspace, as stored in the
+            checkpoint. By default, as in older runs, it is read from
+            training.npz, or from training.traj when the former was not yet
+            saved.
+
+        Returns
+        -------
+        training_set : object
+            A TrainingSet instance.
+        """
+        if filename is not None:
+            return TrainingSet.load(self.workspace.get_path(filename))
+        if os.path.isfile(self.workspace.get_path('training.npz')):
+            return TrainingSet.load(self.workspace.get_path('training.npz'))
+        return TrainingSet(self.workspace.get_path('training.traj'))
+
+    def extend_training_set(self):
+        """Add intermediates computed by cross_validate to the training set
+
+        The images are taken from memory, or after a restart from
+        images_from_neb.frames (images_from_neb.traj in older runs). They are
+        appended in memory, and the training set is saved together with the
+        checkpoint of the phase, see save_checkpoint().
+        """
+        frames = self.workspace.get_path('images_from_neb.frames')
+        traj = self.workspace.get_path('images_from_neb.traj')
+
+        if self.reference_images is not None:
+            ini_neb_images = self.reference_images
+        elif os.path.isfile(frames):
+            ini_neb_images = FrameReader(frames)[:]
+        elif os.path.isfile(traj):
+            ini_neb_images = list(Trajectory(traj, mode='r'))
+        else:
+            ini_neb_images = None
+
+        if ini_neb_images is not None:
+            self.reference_images = None
+            ini_neb_images = ini_neb_images[1:-1]
+            if self.duplicate_threshold is not None:
+                ini_neb_images, rejected = self.training_set.filter_duplicates(
+                        ini_neb_images, self.duplicate_threshold)
+                for image, distance in rejected:
+                    self.logfile.write('Image rejected as near duplicate, '
+                                       'it is %.4f from another image\n'
+                                       % distance)
+                self.instrumentation.count('duplicates_rejected',
+                                           len(rejected))
+            self.training_set.extend(ini_neb_images)
+            if self.max_training_set is not None:
+                self.evict_training_set(len(ini_neb_images))
+        else:
+            self.logfile.write('images_from_neb.frames does not exist\n')
+            self.logfile.write('Aborting...\n')
+            exit()
+        self.logfile.write('I added %s more images to the training set\n'
+                           % len(ini_neb_images))
+        self.logfile.flush()
+
+    def evict_training_set(self, nadded):
+        """Bound the size of the training set
+
+        Parameters
+        ----------
+        nadded : int
+            Number of images just added, that are pinned together with the
+            initial band.
+        """
+        length = len(self.training_set)
+        pinned = (list(range(self.nreadimg)) +
+                  list(range(length - nadded, length)))
+        removed = self.training_set.evict(self.max_training_set,
+                                          policy=self.eviction,
+                                          pinned=pinned, band=self.band)
+        if len(removed) > 0:
+            self.logfile.write('Removed %s images from the training set with '
+                               'the %s policy\n'
+                               % (len(removed), self.eviction))
+            self.logfile.flush()
+        self.instrumentation.count('evicted', len(removed))
 
     def train(self, trainingset, amp_calc, label=None):
         """This method takes care of training
@@ -635,21 +992,149 @@ class accelerate_neb(object):
         trainingset : object
             List of images to be trained.
         amp_calc : object
-            The Amp instance to do the training of the model.
+            The Amp instance to do the training of the model. It is trained
+            in place, see get_model().
         label : str
             An integer converted to string.
         """
         if label is None:
             label = str(self.iteration)
-        try:
-            calc = copy.deepcopy(amp_calc)
-            calc.dblabel = label
-            calc.label = label
-            calc.train(trainingset)
-            # subprocess.call(['mv', 'amp-log.txt', label + '-train.log'])
-            del calc
-        except:
-            raise
+        label = self.workspace.get_path(label)
+        trainingset = self.get_training_images(trainingset)
+
+        if self.fingerprint_store is not None:
+            self.fingerprint_store.prune(trainingset, logfile=self.logfile)
+            amp_calc.dblabel = self.fingerprint_store.dblabel
+        else:
+            amp_calc.dblabel = label
+        amp_calc.label = label
+
+        # Fingerprints are computed here, instead of inside Amp.train(), only
+        # to time them separately. Amp.train() then finds them in dblabel.
+        with self.instrumentation.phase('fingerprints',
+                                        iteration=self.iteration):
+            amp_calc.descriptor.calculate_fingerprints(
+                    hash_images(trainingset),
+                    parallel=getattr(amp_calc, '_parallel', None),
+                    calculate_derivatives=amp_calc.model.forcetraining)
+
+        with self.instrumentation.phase('fit', iteration=self.iteration):
+            amp_calc.train(trainingset)
+
+        if self.ensemble is not None:
+            self.logfile.write('Training ensemble of %s models\n'
+                               % self.ensemble.size)
+            self.logfile.flush()
+            with self.instrumentation.phase('ensemble',
+                                            iteration=self.iteration):
+                self.ensemble.train(trainingset, label,
+                                    dblabel=amp_calc.dblabel)
+        # subprocess.call(['mv', 'amp-log.txt', label + '-train.log'])
+
+    def get_training_images(self, images):
+        """Images the model is trained on
+
+        With a baseline they hold the correction from the baseline to the
+        reference, otherwise they are the images themselves.
+        """
+        if self.baseline is None:
+            return images
+
+        with self.instrumentation.phase('baseline',
+                                        iteration=self.iteration):
+            known = len(self.baseline_results)
+            images = get_delta_images(images, self.baseline,
+                                      results=self.baseline_results)
+            self.instrumentation.count('baseline_calls',
+                                       len(self.baseline_results) - known)
+        return images
+
+    def get_model(self, label, previous=None):
+        """Get the Amp instance to be trained in an iteration
+
+        The instance is a copy of the amp_calc passed to initialize(), or if
+        warm_start is set, the model trained in the previous iteration. In
+        pipeline mode, the model pretrained during the last cross validation
+        is used when it is available.
+
+        Parameters
+        ----------
+        label : str
+            An integer converted to string.
+        previous : str
+            Path to an .amp file to start from, instead of the default.
+
+        Returns
+        -------
+        amp_calc : object
+            The Amp instance. It is not shared with other iterations so that
+            train() can modify it in place.
+        """
+        if previous is None:
+            if self.pretraining is not None:
+                previous = self.pretraining.result()
+                self.pretraining = None
+            elif self.warm_start is True:
+                previous = self.workspace.get_path(
+                        '%s.amp' % (int(label) - 1))
+
+        if previous is not None and os.path.isfile(previous):
+            self.logfile.write('Warm start from parameters in %s\n'
+                               % previous)
+            self.logfile.flush()
+            # With a label, Amp writes its log inside the workspace, or not
+            # at all as set in the template, instead of the current
+            # directory.
+            amp_calc = Amp.load(previous,
+                                label=self.workspace.get_path(label),
+                                cores=self.amp_calc.cores,
+                                logging=self.amp_calc.logging)
+            # Training settings are not saved in .amp files, so they are
+            # taken from the amp_calc passed to initialize().
+            for name in ('lossfunction', 'regressor', 'checkpoints',
+                         'fortran'):
+                if hasattr(self.amp_calc.model, name):
+                    setattr(amp_calc.model, name, copy.deepcopy(
+                        getattr(self.amp_calc.model, name)))
+            if hasattr(self.amp_calc.descriptor, 'fortran'):
+                amp_calc.descriptor.fortran = self.amp_calc.descriptor.fortran
+        else:
+            amp_calc = copy.deepcopy(self.amp_calc)
+
+        amp_calc.set_label(self.workspace.get_path(label))
+        return amp_calc
+
+    def load_model(self, label):
+        """Load a trained model from the workspace
+
+        Parameters
+        ----------
+        label : str or int
+            Label of the model, i.e. the iteration where it was trained.
+
+        Returns
+        -------
+        amp_calc : object
+            The Amp instance read from <label>.amp. Its databases are created
+            inside the workspace. With fast_inference, a
+            NeuralNetworkCalculator when the engine supports the model. With
+            a baseline, a DeltaCalculator of the baseline and the model.
+        """
+        filename = self.workspace.get_path('%s.amp' % label)
+        model = None
+        if self.fast_inference is True:
+            try:
+                model = NeuralNetworkCalculator.load(filename)
+            except NotImplementedError as error:
+                self.logfile.write('Model %s is loaded with Amp: %s\n'
+                                   % (filename, error))
+                self.logfile.flush()
+        if model is None:
+            model = Amp.load(filename, label=self.workspace.get_path('amp'))
+
+        if self.baseline is not None:
+            return DeltaCalculator(self.baseline, model)
+        return model
 
     def cross_validate(self, neb_images, calc=None, amp_calc=None,
                        metric='fmax'):
@@ -670,40 +1155,86 @@ class accelerate_neb(object):
         """
         self.logfile.write('Length of NEB images %s \n' % len(neb_images))
 
-        # Computing energies and forces using Amp.
-
-        calc_name = amp_calc.__class__.__name__
-
-        amp_energies = []
-        amp_forces = []
-
-        amp_images = self.set_calculators(neb_images, amp_calc,
-                                          calc_name=calc_name)
-
-        for image in amp_images:
-            energy = image.get_potential_energy()
-            forces = image.get_forces()
-            amp_energies.append(energy)
-            amp_forces.append(forces.sum(axis=1))
+        # Only the selected intermediates are sent to the reference
+        # calculator. All of them unless an ensemble is used.
+        intermediates = neb_images[1:-1]
+        selected = self.select_images(intermediates)
+
+        # Selected images that nearly duplicate an image of the training set
+        # take its reference results instead of being computed again.
+        duplicates = self.find_duplicates(
+                [intermediates[index] for index in selected])
+        candidates = [index for index, duplicate in zip(selected, duplicates)
+                      if duplicate is None]
+
+        # With a baseline, images that the prescreen finds close to the
+        # training set are estimated instead of computed. Images flagged by
+        # the monitor are always computed.
+        screened = [index for index in candidates
+                    if index not in self.flagged]
+        estimates = self.prescreen_images(
+                [intermediates[index] for index in screened])
+        estimated = dict((index, estimate) for index, estimate
+                         in zip(screened, estimates) if estimate is not None)
+        compute = [index for index in candidates if index not in estimated]
+
+        # Computing energies and forces using Amp. In pipeline mode this is
+        # done in a thread while reference calculations are running.
+        if self.pipeline is True:
+            background = ThreadPoolExecutor(max_workers=1)
+            predictions = background.submit(self.predict_images, neb_images,
+                                            amp_calc)
+            background.shutdown(wait=False)
+
+            # Pretraining starts once half of the images submitted to the
+            # workers arrived. Images found in the cache are not submitted.
+            callback = self.start_pretraining
+            callback_fraction = 0.5
+        else:
+            with self.instrumentation.phase('predict',
+                                            iteration=self.iteration):
+                predictions = self.predict_images(neb_images, amp_calc)
+            callback = None
+            callback_fraction = None
 
         # Computing energies and forces from references
         dft_energies = []
         dft_forces = []
 
-        self.set_calculators(neb_images, amp_calc, calc_name=self.calc_name,
-                             cores=self.cores, cross_validate=True)
+        with self.instrumentation.phase('reference',
+                                        iteration=self.iteration):
+            computed = []
+            if len(compute) > 0:
+                computed = self.set_calculators(
+                        [intermediates[index] for index in compute],
+                        self.calc, calc_name=self.calc_name,
+                        cores=self.cores, workers=self.workers,
+                        cache=self.cache, callback=callback,
+                        callback_fraction=callback_fraction,
+                        executor=self.executor, worker=self.worker)
+
+        if self.pipeline is True:
+            predictions = predictions.result()
+        amp_energies, amp_forces, surrogate_images = predictions
 
         dft_images = []
         dft_images.append(self.training_set[0])
+        reference_images = [dft_images[0]]
+
+        dft_intermediates = iter(computed)
+        for index, duplicate in zip(selected, duplicates):
+            if duplicate is not None:
+                image = self.training_set[duplicate]
+            elif index in estimated:
+                image = estimated[index]
+            else:
+                image = next(dft_intermediates)
+            dft_images.append(image)
+            if index not in estimated:
+                reference_images.append(image)
 
-        dft_intermediates = Trajectory('calculator.traj')
-
-        for intermediate in dft_intermediates:
-            dft_images.append(intermediate)
-
-        dft_images.append(self.training_set[len(dft_images)])
-
-        images_from_neb = Trajectory('images_from_neb.traj', mode='w')
+        dft_images.append(self.training_set[self.nreadimg - 1])
+        reference_images.append(dft_images[-1])
 
         for i in range(len(dft_images)):
             energy = dft_images[i].get_potential_energy()
@@ -711,9 +1242,26 @@ class accelerate_neb(object):
             dft_energies.append(energy)
             dft_forces.append(forces.sum(axis=1))
 
-            images_from_neb.write(dft_images[i])
-
-        images_from_neb.close()
+        # They are kept in memory for the next iteration, and written to
+        # disk for restarts. Estimated images are not added to the training
+        # set.
+        self.reference_images = reference_images
+        with self.instrumentation.phase('save', iteration=self.iteration):
+            write_frames(self.workspace.get_path('images_from_neb.frames'),
+                         reference_images)
+
+        # Predictions of the images that were computed with the reference.
+        computed = ([0] + [index + 1 for index in selected] +
+                    [len(neb_images) - 1])
+        amp_energies = [amp_energies[index] for index in computed]
+        amp_forces = [amp_forces[index] for index in computed]
+
+        # The band used for the fmax metric takes the surrogate results for
+        # the intermediates that were not computed with the reference.
+        band = list(surrogate_images)
+        for index, image in zip(computed, dft_images):
+            band[index] = image
+        dft_images = band
 
         if metric == 'fmax':
             f_metric = get_fmax(dft_images)
@@ -733,15 +1281,328 @@ class accelerate_neb(object):
                                   self.tolerance))
             return e_metric, f_metric
 
-    def run_gpaw(self, images):
+    def find_duplicates(self, images):
+        """Find images that nearly duplicate images of the training set
+
+        Parameters
+        ----------
+        images : list
+            Images to be looked up.
+
+        Returns
+        -------
+        duplicates : list
+            For each image, the index of its duplicate in the training set,
+            or None. All None when duplicate_threshold is not set.
+        """
+        if self.duplicate_threshold is None:
+            return [None] * len(images)
+
+        duplicates, distances = self.training_set.query(
+                images, self.duplicate_threshold)
+        found = len(images) - duplicates.count(None)
+
+        if found > 0:
+            self.logfile.write('%s images are within %s of the training set, '
+                               'their reference results are reused: %s\n'
+                               % (found, self.duplicate_threshold,
+                                  duplicates))
+            self.logfile.flush()
+        self.instrumentation.count('duplicates_reused', found)
+        return duplicates
+
+    def prescreen_images(self, images):
+        """Estimate images that are well described by the training set
+
+        The baseline is computed for each image and compared with the
+        baseline of the nearest image of the training set. When no force
+        component changed by more than prescreen, the correction from the
+        baseline to the reference of that training image is added to the
+        baseline of the image, instead of computing it with the reference.
+
+        Parameters
+        ----------
+        images : list
+            Images to be computed with the reference calculator.
+
+        Returns
+        -------
+        estimates : list
+            For each image, a copy with the estimated results attached, or
+            None when it has to be computed. All None without baseline or
+            prescreen.
+        """
+        if (self.baseline is None or self.prescreen is None or
+           len(images) == 0):
+            return [None] * len(images)
+
+        nearest, distances = self.training_set.query(images, np.inf)
+
+        estimates = []
+        with self.instrumentation.phase('prescreen',
+                                        iteration=self.iteration):
+            for image, index in zip(images, nearest):
+                training = self.training_set[index]
+                correction = self.get_training_images([training])[0]
+                energy, forces = get_results(image, self.baseline)
+                self.instrumentation.count('baseline_calls')
+
+                change = np.abs(forces - training.get_forces(
+                    apply_constraint=False) + correction.get_forces(
+                    apply_constraint=False)).max()
+                if change > self.prescreen:
+                    estimates.append(None)
+                    continue
+
+                estimate = image.copy()
+                estimate.set_calculator(SinglePointCalculator(
+                    estimate,
+                    energy=energy + correction.get_potential_energy(),
+                    forces=forces + correction.get_forces(
+                        apply_constraint=False)))
+                estimates.append(estimate)
+
+        found = len(images) - estimates.count(None)
+        if found > 0:
+            self.logfile.write('%s images passed the baseline prescreen and '
+                               'are estimated instead of computed\n' % found)
+            self.logfile.flush()
+        self.instrumentation.count('prescreened', found)
+        return estimates
+
+    def predict_images(self, images, amp_calc):
+        """Compute energies and forces of images with the model
+
+        Parameters
+        ----------
+        images : list
+            Images of the band. They are copied, so the calculators attached
+            to them are not modified.
+        amp_calc : object
+            This is the machine learning model used to perform predictions.
+
+        Returns
+        -------
+        energies, forces, images : list, list, list
+            Energies, forces summed over the Cartesian components, and copies
+            of the images with the predicted results attached.
+        """
+        calc_name = amp_calc.__class__.__name__
+
+        amp_energies = []
+        amp_forces = []
+
+        if self.batched_prediction is True:
+            amp_images = [image.copy() for image in images]
+            predict(amp_images, amp_calc)
+        else:
+            amp_images = self.set_calculators(
+                    [image.copy() for image in images], amp_calc,
+                    calc_name=calc_name)
+
+        surrogate_images = []
+        for image in amp_images:
+            energy = image.get_potential_energy()
+            forces = image.get_forces()
+            amp_energies.append(energy)
+            amp_forces.append(forces.sum(axis=1))
+
+            surrogate = image.copy()
+            surrogate.set_calculator(
+                    SinglePointCalculator(
+                        surrogate, energy=energy,
+                        forces=image.get_forces(apply_constraint=False)))
+            surrogate_images.append(surrogate)
+        return amp_energies, amp_forces, surrogate_images
+
+    def start_pretraining(self, images):
+        """Start training the next model in a background thread
+
+        The model of the current iteration is trained on the training set
+        plus the reference results that already arrived. The next iteration
+        starts from its parameters, so it only needs to absorb the rest of
+        the images.
+
+        Parameters
+        ----------
+        images : list
+            Images computed with the reference calculator so far.
+        """
+        label = '%s-pretrained' % self.iteration
+        self.logfile.write('Pretraining %s with %s new images\n'
+                           % (label, len(images)))
+        self.logfile.flush()
+
+        amp_calc = self.get_model(
+                label,
+                previous=self.workspace.get_path('%s.amp' % self.iteration))
+        if self.fingerprint_store is not None:
+            amp_calc.dblabel = self.fingerprint_store.dblabel
+
+        background = ThreadPoolExecutor(max_workers=1)
+        self.pretraining = background.submit(
+                pretrain_model, amp_calc,
+                self.get_training_images(self.training_set[:] + images),
+                self.workspace.get_path(label))
+        background.shutdown(wait=False)
+
+    def select_images(self, images):
+        """Select the images to be computed with the reference calculator
+
+        When an ensemble is used and nselect is set, only the nselect images
+        with the largest spread of the ensemble predictions are selected.
+        With saddle_window, images far below the highest one that are
+        already converged are not selected. Images flagged as extrapolated
+        by the monitor are always selected.
+
+        Parameters
+        ----------
+        images : list
+            Intermediate images of the band.
+
+        Returns
+        -------
+        selected : list
+            Indices of the selected images, in increasing order.
+        """
+        selected = list(range(len(images)))
+
+        if (self.ensemble is not None and self.nselect is not None and
+           self.nselect < len(images)):
+            uncertainty = self.ensemble.get_uncertainty(images)
+            selected = np.argsort(-uncertainty)[:self.nselect].tolist()
+            self.logfile.write('Ensemble uncertainty of images is %s\n'
+                               % uncertainty.tolist())
+
+        if self.saddle_window is not None:
+            converged = self.find_converged(images)
+            selected = [index for index in selected
+                        if index not in converged]
+
+        selected = sorted(set(selected) | set(self.flagged))
+        if len(selected) < len(images):
+            self.logfile.write('Images selected for reference calculations '
+                               'are %s\n' % selected)
+            self.logfile.flush()
+        return selected
+
+    def find_converged(self, images):
+        """Find converged images far from the saddle point
+
+        Parameters
+        ----------
+        images : list
+            Intermediate images of the band, with the results of the model.
+
+        Returns
+        -------
+        converged : list
+            Indices of the images whose energy is more than saddle_window
+            below the highest one and whose NEB forces are below fmax.
+            Empty when the images have no results, e.g. a band restored
+            from a checkpoint.
+        """
+        band = ([self.training_set[0]] + list(images) +
+                [self.training_set[self.nreadimg - 1]])
+        try:
+            energies = np.array([image.get_potential_energy()
+                                 for image in images])
+            forces = NEB(band).get_forces().reshape(len(images), -1, 3)
+        except RuntimeError:
+            self.logfile.write('Images have no results, all are computed '
+                               'with the reference\n')
+            self.logfile.flush()
+            return []
+        fmax = np.sqrt((forces ** 2).sum(axis=2)).max(axis=1)
+
+        converged = np.where((energies < energies.max() - self.saddle_window)
+                             & (fmax < self.fmax))[0].tolist()
+        if len(converged) > 0:
+            self.logfile.write('Images %s are converged and far from the '
+                               'saddle point, they are not computed with '
+                               'the reference\n' % converged)
+            self.logfile.flush()
+        self.instrumentation.count('converged_skipped', len(converged))
+        return converged
+
+    def insert_images(self, band):
+        """Insert images where the band changes fastest
+
+        New images are placed halfway between the two neighbors with the
+        largest energy difference, that is where the profile is steepest,
+        around the saddle point. Energies of the intermediates are those of
+        the model, and those of the end points are taken from the training
+        set, as the model attached to them no longer matches them after the
+        ML-NEB. Without energies of the intermediates, e.g. a band restored
+        from a checkpoint, the two neighbors farthest apart are used.
+
+        Parameters
+        ----------
+        band : list
+            Images of the band, with end points.
+
+        Returns
+        -------
+        band : list
+            Copies of the images with the new ones.
+        """
+        room = self.max_intermediates - (len(band) - 2)
+        ninsert = min(self.insertions, room)
+        images = [image.copy() for image in band]
+        if ninsert <= 0:
+            return images
+
+        endpoints = [self.training_set[0],
+                     self.training_set[self.nreadimg - 1]]
+        try:
+            energies = np.array([endpoints[0].get_potential_energy()] +
+                                [image.get_potential_energy()
+                                 for image in band[1:-1]] +
+                                [endpoints[1].get_potential_energy()])
+            gaps = np.abs(np.diff(energies))
+        except RuntimeError:
+            self.logfile.write('Images have no results, images are inserted '
+                               'between the neighbors farthest apart\n')
+            positions = np.array([image.get_positions() for image in band])
+            gaps = np.sqrt(((np.diff(positions, axis=0)) ** 2)
+                           .sum(axis=(1, 2)))
+
+        segments = sorted(np.argsort(-gaps)[:ninsert].tolist())
+        for segment in reversed(segments):
+            image = images[segment].copy()
+            image.set_positions((images[segment].get_positions() +
+                                 images[segment + 1].get_positions()) / 2.)
+            images.insert(segment + 1, image)
+
+        self.logfile.write('Inserted %s images after images %s, the band '
+                           'has %s intermediates\n'
+                           % (ninsert, segments, len(images) - 2))
+        self.logfile.flush()
+        self.instrumentation.count('images_inserted', ninsert)
+        return images
+
+    def run_gpaw(self, images, worker=None):
         """Method for running gpaw weird parallelization
 
         Parameters
         ---------
         images : object
             The images.
+        worker : object
+            A mlutils.worker.CalculatorWorker. Images are sent to it instead
+            of launching a new gpaw-python process.
+
+        Returns
+        -------
+        results : list
+            (energy, forces) of each image.
         """
-        input_traj = Trajectory('input.traj', mode='w')
+        if worker is not None:
+            return [worker.calculate(image) for image in images]
+
+        write_gpaw_file(path=self.workspace.path)
+        input_traj = Trajectory(self.workspace.get_path('input.traj'),
+                                mode='w')
 
         for image in images:
             input_traj.write(image)
@@ -754,11 +1615,21 @@ class accelerate_neb(object):
                 'gpaw-python',
                 'gpaw_script.py'
                 ]
-        subprocess.call(gpaw)
+        subprocess.call(gpaw, cwd=self.workspace.path)
+
+        results = []
+        output = Trajectory(self.workspace.get_path('calculator.traj'),
+                            mode='r')
+        for image in output:
+            results.append((image.get_potential_energy(apply_constraint=False),
+                            image.get_forces(apply_constraint=False)))
+        output.close()
+        return results
 
     def set_calculators(self, images, calc, calc_name=None, label=None,
-                        logfile=None, write_training_set=False, cores=None,
-                        cross_validate=False):
+                        logfile=None, cores=None, workers=None, cache=None,
+                        callback=None, callback_fraction=None, executor=None,
+                        worker=None):
         """Function to set calculators
 
         Parameters
@@ -773,54 +1644,242 @@ class accelerate_neb(object):
             Set a label for Amp calculators.
         logfile : str
             Path to create logfile.
-        write_training_set : bool
-            Whether we will write (or not) training set to a trajectory file.
-        cross_validate : bool
-            Whether this method is called or not for cross validating or not.
+        workers : int
+            Number of processes used to compute the images concurrently.
+        cache : object
+            ReferenceCache instance. Only images that are not found in the
+            cache are computed, and new results are stored on it.
+        callback : function
+            Called with a copy of each image, with its results attached, as
+            soon as it is computed by a worker. Images are submitted from the
+            highest to the lowest energy when energies are known.
+        callback_fraction : float
+            When set, callback is called only once, with the list of images
+            computed so far, when this fraction of the images submitted to
+            the workers arrived (at least one image).
+        executor : object
+            Executor where images are submitted. When it is None and workers
+            is larger than one, a pool of workers is created for this call.
+        worker : object
+            A mlutils.worker.CalculatorWorker that computes the images
+            instead of calc.
+
+        Returns
+        -------
+        images : list
+            The images. Those computed with the reference calculator have
+            their results attached in single point calculators.
         """
 
         if label is not None:
             self.logfile.write('Label was set to %s\n' % label)
             calc.label = label
 
-        if write_training_set is True:
-            if os.path.isfile('training.traj'):
-                training_file = Trajectory('training.traj', mode='a')
-            else:
-                training_file = Trajectory('training.traj', mode='w')
-
-        if calc_name != 'GPAW':
-            intermediate_traj = Trajectory('calculator.traj', mode='w')
-            if cross_validate is True:
-                images = images[1:-1]
-
-            for index in range(len(images)):
-                images[index].set_calculator(calc)
-                images[index].get_potential_energy(apply_constraint=False)
-                images[index].get_forces(apply_constraint=False)
-                intermediate_traj.write(images[index])
-        else:
-            write_gpaw_file()
-            if cross_validate is True:
-                # We only need the energy and forces of intermediates!
-                intermediates = images[1:-1]
-                self.run_gpaw(intermediates)
+        if calc_name != 'GPAW' and worker is None:
+            results, missing = self.lookup_cache(images, cache, calc)
+
+            # Reference results are attached as single point calculators, so
+            # they are kept when the calculator moves to the next image.
+            # Models stay attached, as they are used by the NEB.
+            reference = calc is self.calc
+            if reference is True:
+                self.instrumentation.count('reference_calls', len(missing))
             else:
-                self.run_gpaw(images)
+                self.instrumentation.count('surrogate_calls', len(missing))
 
-        if write_training_set is True:
-            to_dump = Trajectory('calculator.traj', mode='r')
-            for element in to_dump:
-                training_file.write(element)
+            if executor is not None or (workers is not None and workers > 1):
+                if executor is None:
+                    pool = ProcessPoolExecutor(max_workers=workers)
+                else:
+                    pool = executor
+
+                futures = {}
+                for index in sort_by_energy(images, missing):
+                    future = pool.submit(compute_image, images[index].copy(),
+                                         calc)
+                    futures[future] = index
+
+                arrived = []
+                if callback_fraction is not None:
+                    callback_after = max(1, int(len(futures) *
+                                                callback_fraction))
+
+                for future in as_completed(futures):
+                    index = futures[future]
+                    results[index] = future.result()
+                    if callback is not None:
+                        energy, forces = results[index]
+                        image = images[index].copy()
+                        image.set_calculator(
+                                SinglePointCalculator(image, energy=energy,
+                                                      forces=forces))
+                        if callback_fraction is None:
+                            callback(image)
+                        else:
+                            arrived.append(image)
+                            if len(arrived) == callback_after:
+                                callback(list(arrived))
+
+                if executor is None:
+                    pool.shutdown()
+            else:
+                for index in missing:
+                    images[index].set_calculator(calc)
+                    energy = images[index].get_potential_energy(
+                            apply_constraint=False)
+                    forces = images[index].get_forces(apply_constraint=False)
+                    if reference is True:
+                        results[index] = (energy, forces)
+
+            for index, result in enumerate(results):
+                if result is not None:
+                    energy, forces = result
+                    images[index].set_calculator(
+                            SinglePointCalculator(images[index],
+                                                  energy=energy,
+                                                  forces=forces))
+                    if cache is not None and index in missing:
+                        cache.put(images[index], energy, forces, calc)
+        else:
+            results, missing = self.lookup_cache(images, cache, calc)
+            self.instrumentation.count('reference_calls', len(missing))
+            if len(missing) > 0:
+                new_results = self.run_gpaw(
+                        [images[index] for index in missing], worker=worker)
+                for index, result in zip(missing, new_results):
+                    results[index] = result
+                    if cache is not None:
+                        cache.put(images[index], *result, calc=calc)
+
+            for image, (energy, forces) in zip(images, results):
+                image.set_calculator(
+                        SinglePointCalculator(image, energy=energy,
+                                              forces=forces))
 
         if logfile is not None:
             logfile.write('Calculator set for %s images\n' % len(images))
             logfile.flush()
-
-        if write_training_set is True and calc_name != 'GPAW':
-            training_file.close()
         return images
 
+    def lookup_cache(self, images, cache, calc=None):
+        """Look up images in the cache of reference calculations
+
+        Parameters
+        ----------
+        images : list
+            Images to be looked up.
+        cache : object
+            ReferenceCache instance, or None.
+        calc : object
+            Calculator the results are looked up for, see
+            mlutils.cache.ReferenceCache.get_hash().
+
+        Returns
+        -------
+        results, missing : list, list
+            The (energy, forces) pairs found in the cache (None for misses),
+            and the indices of images that still need to be computed.
+        """
+        if cache is None:
+            return [None] * len(images), list(range(len(images)))
+
+        results = [cache.get(image, calc) for image in images]
+        missing = [index for index, result in enumerate(results)
+                   if result is None]
+        self.instrumentation.count('cache_hits', len(images) - len(missing))
+
+        self.logfile.write('Reference cache: %s hits, %s misses\n'
+                           % (len(images) - len(missing), len(missing)))
+        self.logfile.flush()
+        return results, missing
+
+
+def compute_image(image, calc):
+    """Compute energy and forces of an image in a worker process
+
+    Parameters
+    ----------
+    image : object
+        Atoms object without calculator.
+    calc : object
+        Calculator to be attached to the image.
+
+    Returns
+    -------
+    energy, forces : float, array
+        Results computed without applying constraints.
+    """
+    image.set_calculator(calc)
+    energy = image.get_potential_energy(apply_constraint=False)
+    forces = image.get_forces(apply_constraint=False)
+    return energy, forces
+
+
+def freeze_images(images):
+    """Copy images together with the results already computed for them
+
+    Parameters
+    ----------
+    images : list
+        Atoms objects, e.g. the images of a band after an optimization.
+
+    Returns
+    -------
+    images : list
+        Copies with a SinglePointCalculator holding the energy and forces
+        that the calculator of each image has for its current positions.
+        Images without results are copied without calculator.
+    """
+    frozen = []
+    for image in images:
+        copy = image.copy()
+        calc = image.get_calculator()
+        # Results are only valid if the image did not change since they
+        # were computed. get_property() is not used as it would reset a
+        # calculator shared with other images.
+        if calc is not None and len(calc.check_state(image)) == 0:
+            energy = calc.results.get('energy')
+            forces = calc.results.get('forces')
+            if energy is not None and forces is not None:
+                copy.set_calculator(
+                        SinglePointCalculator(copy, energy=energy,
+                                              forces=forces))
+        frozen.append(copy)
+    return frozen
+
+
+def sort_by_energy(images, indices):
+    """Sort indices of images from the highest to the lowest energy
+
+    Only energies already stored in single point calculators are used, e.g.
+    those of images read from a NEB trajectory. Images without them keep
+    their order after the rest.
+    """
+    def key(index):
+        calc = images[index].get_calculator()
+        if isinstance(calc, SinglePointCalculator):
+            energy = calc.results.get('energy')
+            if energy is not None:
+                return (0, -energy)
+        return (1, index)
+    return sorted(indices, key=key)
+
+
+def pretrain_model(amp_calc, images, label):
+    """Train a model in the background
+
+    Returns
+    -------
+    filename : str
+        Path to the .amp file with the parameters, even if the training did
+        not converge.
+    """
+    try:
+        amp_calc.train(images)
+    except TrainingConvergenceError:
+        return '%s-untrained-parameters.amp' % label
+    return '%s.amp' % label
+
 
 def get_fmax(images, **kwargs):
     """Returns fmax, as used by optimizers with NEB."""
@@ -829,7 +1888,7 @@ def get_fmax(images, **kwargs):
     return np.sqrt((forces**2).sum(axis=1).max())
 
 
-def clean_dir(logfile=None):
+def clean_dir(logfile=None, path='.'):
     """Cleaning some directories"""
     remove = [
             'rm',
@@ -839,23 +1898,26 @@ def clean_dir(logfile=None):
             'amp-log.txt',
             'amp-neighborlists.ampdb'
             ]
-    subprocess.call(remove)
+    subprocess.call(remove, cwd=path)
 
     if logfile is not None:
         logfile.write('Cleaning up...\n')
         logfile.flush()
 
 
-def clean_train_data():
-    subprocess.call('rm -r *.ampdb', shell=True)
+def clean_train_data(path='.'):
+    subprocess.call('rm -r *.ampdb', shell=True, cwd=path)
 
 
-def write_gpaw_file():
+def write_gpaw_file(path='.'):
     """Ugly function that writes a gpaw python script. The problem is not you
     `write_gpaw_file()`, the problem is me.
+
+    The script is written in path, and it is run from there. The calculator
+    is still read from gpaw.calc in the current working directory.
     """
 
-    gpaw_file = open('gpaw_script.py', 'w')
+    gpaw_file = open(os.path.join(path, 'gpaw_script.py'), 'w')
     header0 = """#!/usr/bin/env python
 from gpaw import GPAW, PW, FermiDirac
 from ase.io import read, Trajectory, write
@@ -882,29 +1944,3 @@ output.close()
 """
     gpaw_file.write(header2)
 
-
-def check_files():
-    """ Check files
-    """
-    import glob
-    import os
-
-    logfiles = sorted(glob.glob('*.txt'))
-
-    if 'amp-log.txt' in logfiles:
-        logfiles.remove('amp-log.txt')
-
-    if 'out.txt' in logfiles:
-        logfiles.remove('out.txt')
-
-    if len(logfiles) is not 0:
-        digit = logfiles[-1][0]
-
-        nebfile = 'neb_%s.traj' % digit
-
-        if os.path.isfile(nebfile):
-            return nebfile, digit
-        else:
-            return False, digit
-    else:
-        return False, None
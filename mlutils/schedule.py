@@ -0,0 +1,88 @@
+# General imports
+import numpy as np
+
+
+class StepSchedule(object):
+    """fmax schedule that divides the fmax by a constant step
+
+    This is the schedule set by the ifmax and step arguments of
+    accelerate_neb. The fmax of the ML-NEB starts at ifmax and is divided by
+    step in each iteration until it reaches the requested fmax.
+
+    Parameters
+    ----------
+    step : float
+        Number that divides the fmax in each iteration.
+    """
+    def __init__(self, step=None):
+        if step is None:
+            step = 1.
+        self.step = step
+
+    def get_fmax(self, fmax, target, history):
+        """fmax of the ML-NEB of the next iteration
+
+        Parameters
+        ----------
+        fmax : float
+            fmax used in the last iteration.
+        target : float
+            fmax requested by the user. The schedule never goes below it.
+        history : list
+            (fmax, energy metric, force metric) of each iteration so far,
+            as achieved in cross validation.
+
+        Returns
+        -------
+        fmax : float
+        """
+        return max(fmax / self.step, target)
+
+
+class AdaptiveSchedule(object):
+    """fmax schedule driven by the errors achieved in cross validation
+
+    The fmax is divided by a factor between 1 and max_factor that depends on
+    how far the last achieved error is from the tolerance. A model within
+    tolerance is pushed by max_factor, and the factor decreases towards 1 as
+    the error grows. The factor is then multiplied by the rate at which the
+    error decreased since the previous iteration, so a model that improves
+    quickly is pushed faster. When the error got worse, the fmax is kept, and
+    the new reference images are used to fix the model before asking it for
+    a tighter band.
+
+    Parameters
+    ----------
+    tolerance : float
+        Tolerance of the metrics, usually the one of accelerate_neb.
+    max_factor : float
+        Largest factor the fmax is divided by in one iteration.
+    """
+    def __init__(self, tolerance, max_factor=4.):
+        self.tolerance = tolerance
+        self.max_factor = max_factor
+
+    def get_fmax(self, fmax, target, history):
+        """fmax of the ML-NEB of the next iteration, see
+        StepSchedule.get_fmax"""
+        if len(history) == 0:
+            return max(fmax, target)
+
+        error = max(history[-1][1:])
+        ratio = error / self.tolerance
+
+        if ratio <= 1.:
+            factor = self.max_factor
+        else:
+            factor = 1. + (self.max_factor - 1.) / ratio
+
+        if len(history) > 1:
+            previous = max(history[-2][1:])
+            # Rate at which the model improved in the last iteration.
+            rate = previous / max(error, np.finfo(float).tiny)
+            if rate < 1.:
+                factor = 1.
+            else:
+                factor = min(self.max_factor, factor * rate)
+
+        return max(fmax / factor, target)
@@ -0,0 +1,90 @@
+# General imports
+from collections import OrderedDict
+import numpy as np
+
+# ASE imports
+from ase.neb import NEB
+from ase.calculators.singlepoint import SinglePointCalculator
+
+# Amp imports
+from amp.utilities import get_hash
+
+
+def predict(images, amp_calc, attach=True):
+    """Predict energies and forces of several images
+
+    Fingerprints and fingerprint primes of all images are computed with a
+    single call to the descriptor, instead of going through the ASE
+    calculator interface image by image. The Amp model is still evaluated
+    on each image in turn, atom by atom, as Amp has no batched evaluation.
+    Models with a predict() method, such as the NeuralNetworkCalculator of
+    mlutils.inference, evaluate all images in a single vectorized pass.
+
+    Parameters
+    ----------
+    images : list
+        Atoms objects.
+    amp_calc : object
+        Trained Amp instance. Any object with a predict(images) method
+        returning energies and forces is used through that method instead.
+    attach : bool
+        Whether or not a SinglePointCalculator with the predicted results is
+        attached to each image.
+
+    Returns
+    -------
+    energies, forces : array, array
+        Arrays of shape (images,) and (images, atoms, 3). Forces are not
+        constrained.
+    """
+    if hasattr(amp_calc, 'predict'):
+        energies, forces = amp_calc.predict(images)
+    else:
+        keys = [get_hash(image) for image in images]
+        hashed = OrderedDict(zip(keys, images))
+
+        descriptor = amp_calc.descriptor
+        descriptor.calculate_fingerprints(
+                hashed, parallel=getattr(amp_calc, '_parallel', None),
+                calculate_derivatives=True)
+
+        energies = np.empty(len(images))
+        forces = np.empty((len(images), len(images[0]), 3))
+        for index, key in enumerate(keys):
+            fingerprints = descriptor.fingerprints[key]
+            energies[index] = amp_calc.model.calculate_energy(fingerprints)
+            forces[index] = amp_calc.model.calculate_forces(
+                    fingerprints, descriptor.fingerprintprimes[key])
+
+    if attach is True:
+        for image, energy, image_forces in zip(images, energies, forces):
+            image.set_calculator(
+                    SinglePointCalculator(image, energy=float(energy),
+                                          forces=image_forces.copy()))
+    return energies, forces
+
+
+class SurrogateNEB(NEB):
+    """NEB whose intermediate images are predicted together
+
+    Each time forces are requested, all intermediates are predicted with
+    predict() and the results are attached to them before the NEB forces
+    are computed. The end points do not move, so they are predicted once
+    here. Every image then has its own calculator, as the NEB of ASE
+    requires, even when the model was attached to all of them.
+
+    Parameters
+    ----------
+    images : list
+        Images of the band.
+    amp_calc : object
+        Trained Amp instance, see predict().
+    """
+    def __init__(self, images, amp_calc, **kwargs):
+        NEB.__init__(self, images, **kwargs)
+        self.amp_calc = amp_calc
+        predict([self.images[0], self.images[-1]], self.amp_calc)
+
+    def get_forces(self):
+        predict(self.images[1:-1], self.amp_calc)
+        return NEB.get_forces(self)
@@ -1,7 +1,14 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 from ase.io import Trajectory
+from ase.atoms import Atoms
+from ase.calculators.singlepoint import SinglePointCalculator
+from ase.constraints import dict2constraint
+from ase.io.jsonio import encode, decode
+from scipy.spatial import cKDTree
+import numpy as np
 import random
+import os
 
 
 def split(images, trainingname='trainingimages.traj',
@@ -56,3 +63,344 @@ def split(images, trainingname='trainingimages.traj',
         log.write(str(testimages))
     log.close()
     return
+
+
+class TrainingSet(object):
+    """Training set kept in contiguous NumPy arrays
+
+    Positions, cells, energies and forces of all images are stored in arrays
+    of shape (n_images, ...). Appending is amortized O(1) and images are only
+    converted to Atoms objects when they are accessed. The set can be saved
+    to, and loaded from, a compressed .npz file which is much faster to read
+    than an ASE trajectory.
+
+    All images must have the same atoms in the same order, as is the case for
+    NEB images.
+
+    Parameters
+    ----------
+    images : list or str
+        Atoms objects with energies and forces, or path to a trajectory file
+        or to an .npz file created with save().
+    """
+    def __init__(self, images=None):
+        self.length = 0
+        self.numbers = None
+        self._tree = None
+
+        if isinstance(images, str):
+            if images.endswith('.npz'):
+                self._read(images)
+                return
+            images = Trajectory(images)
+
+        if images is not None:
+            self.extend(images)
+
+    def _allocate(self, image, capacity):
+        """Create the arrays using image as template"""
+        natoms = len(image)
+        self.numbers = image.get_atomic_numbers()
+        self.pbc = image.get_pbc()
+        self.tags = image.get_tags()
+        self.constraints = [c.todict() for c in image.constraints]
+        self.positions = np.empty((capacity, natoms, 3))
+        self.cells = np.empty((capacity, 3, 3))
+        self.energies = np.empty(capacity)
+        self.forces = np.empty((capacity, natoms, 3))
+
+    def _grow(self, capacity):
+        """Resize the arrays to hold at least capacity images"""
+        if capacity <= len(self.energies):
+            return
+        capacity = max(capacity, 2 * len(self.energies))
+        for name in ['positions', 'cells', 'energies', 'forces']:
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:])
+            new[:self.length] = old[:self.length]
+            setattr(self, name, new)
+
+    def append(self, image):
+        """Append an image
+
+        Parameters
+        ----------
+        image : object
+            Atoms object with a calculator that provides energy and forces.
+        """
+        if self.numbers is None:
+            self._allocate(image, 16)
+        elif (len(image) != len(self.numbers) or
+              (image.get_atomic_numbers() != self.numbers).any()):
+            raise ValueError('All images in a TrainingSet must have the '
+                             'same atoms.')
+
+        self._grow(self.length + 1)
+        index = self.length
+        self.positions[index] = image.get_positions()
+        self.cells[index] = image.get_cell()
+        self.energies[index] = image.get_potential_energy(
+                apply_constraint=False)
+        self.forces[index] = image.get_forces(apply_constraint=False)
+        self.length += 1
+
+    def extend(self, images):
+        """Append several images
+
+        Parameters
+        ----------
+        images : list
+            Atoms objects with energies and forces.
+        """
+        for image in images:
+            self.append(image)
+
+    def get_image(self, index):
+        """Build the Atoms object of an image
+
+        Parameters
+        ----------
+        index : int
+            Index of the image.
+
+        Returns
+        -------
+        image : object
+            Atoms object with a SinglePointCalculator attached.
+        """
+        image = Atoms(numbers=self.numbers, positions=self.positions[index],
+                      cell=self.cells[index], pbc=self.pbc, tags=self.tags)
+        image.set_constraint([dict2constraint(c) for c in self.constraints])
+        image.set_calculator(
+                SinglePointCalculator(image,
+                                      energy=float(self.energies[index]),
+                                      forces=self.forces[index].copy()))
+        return image
+
+    def get_tree(self):
+        """KD-tree of the flattened positions of the images
+
+        It is built when it is first needed and rebuilt only after the set
+        changed, so several queries between appends share the same tree.
+        """
+        if self._tree is None or self._tree.n != self.length:
+            self._tree = cKDTree(
+                    self.positions[:self.length].reshape(self.length, -1))
+        return self._tree
+
+    def query(self, images, threshold):
+        """Find images of the set that nearly duplicate other images
+
+        The distance between two images is the norm of the difference of
+        their positions, flattened to a single vector. Cells are not
+        compared, as they are the same for all NEB images.
+
+        Parameters
+        ----------
+        images : list
+            Atoms objects.
+        threshold : float
+            Images closer than this distance, in Angstrom, are duplicates.
+
+        Returns
+        -------
+        indices, distances : list, list
+            For each image, the index of the nearest image of the set and its
+            distance, or None and None when there is none within threshold.
+        """
+        if self.length == 0 or len(images) == 0:
+            return [None] * len(images), [None] * len(images)
+
+        positions = np.array([image.get_positions().ravel()
+                              for image in images])
+        distances, indices = self.get_tree().query(
+                positions, distance_upper_bound=threshold)
+
+        found = np.isfinite(distances)
+        return ([int(i) if f else None for i, f in zip(indices, found)],
+                [float(d) if f else None for d, f in zip(distances, found)])
+
+    def filter_duplicates(self, images, threshold):
+        """Split images into new ones and near duplicates
+
+        Images are compared with the set, see query(), and with the images
+        accepted before them in the list.
+
+        Parameters
+        ----------
+        images : list
+            Atoms objects.
+        threshold : float
+            Images closer than this distance, in Angstrom, are duplicates.
+
+        Returns
+        -------
+        accepted, rejected : list, list
+            The images that are not duplicates, and (image, distance) pairs
+            of those that are.
+        """
+        indices, distances = self.query(images, threshold)
+
+        accepted = []
+        rejected = []
+        for image, distance in zip(images, distances):
+            if distance is None:
+                positions = image.get_positions()
+                for other in accepted:
+                    norm = np.linalg.norm(positions - other.get_positions())
+                    if norm < threshold:
+                        distance = float(norm)
+                        break
+
+            if distance is None:
+                accepted.append(image)
+            else:
+                rejected.append((image, distance))
+        return accepted, rejected
+
+    def keep(self, indices):
+        """Keep only some images, in their current order
+
+        Parameters
+        ----------
+        indices : list
+            Indices of the images that are kept.
+        """
+        indices = sorted(set(indices))
+        n = len(indices)
+        for name in ['positions', 'cells', 'energies', 'forces']:
+            array = getattr(self, name)
+            array[:n] = array[indices]
+        self.length = n
+        self._tree = None
+
+    def evict(self, maxsize, policy='oldest', pinned=(), band=None):
+        """Remove images until the set has at most maxsize of them
+
+        Parameters
+        ----------
+        maxsize : int
+            Maximum number of images.
+        policy : str
+            'oldest' removes the images that were added first. 'farthest'
+            removes the images farthest from the band, i.e. with the largest
+            distance to the nearest image of the band. 'diversity' keeps the
+            images selected by farthest point sampling, starting from the
+            pinned ones, so the set covers the explored geometries as evenly
+            as possible.
+        pinned : list
+            Indices of images that are never removed.
+        band : list
+            Images of the current band. Required by 'farthest'.
+
+        Returns
+        -------
+        removed : list
+            Indices, before the removal, of the images that were removed.
+        """
+        if self.length <= maxsize:
+            return []
+
+        pinned = sorted(set(pinned))
+        candidates = [index for index in range(self.length)
+                      if index not in pinned]
+        nremove = min(self.length - maxsize, len(candidates))
+        positions = self.positions[:self.length].reshape(self.length, -1)
+
+        if policy == 'oldest':
+            removed = candidates[:nremove]
+        elif policy == 'farthest':
+            if band is None:
+                raise ValueError('The farthest policy needs the band.')
+            tree = cKDTree([image.get_positions().ravel() for image in band])
+            distances = tree.query(positions[candidates])[0]
+            order = np.argsort(-distances, kind='stable')
+            removed = [candidates[i] for i in order[:nremove]]
+        elif policy == 'diversity':
+            kept = list(pinned)
+            if len(kept) == 0:
+                kept.append(candidates.pop(0))
+            nearest = np.min([np.linalg.norm(positions[candidates] -
+                                             positions[index], axis=1)
+                              for index in kept], axis=0)
+            while len(kept) < self.length - nremove:
+                farthest = int(np.argmax(nearest))
+                kept.append(candidates[farthest])
+                nearest = np.minimum(nearest, np.linalg.norm(
+                    positions[candidates] - positions[candidates[farthest]],
+                    axis=1))
+                # Kept candidates are not picked again, even when the
+                # others are duplicates at distance zero.
+                nearest[farthest] = -np.inf
+            removed = sorted(set(range(self.length)) - set(kept))
+        else:
+            raise ValueError('Unknown eviction policy %s.' % policy)
+
+        removed = sorted(removed)
+        self.keep(sorted(set(range(self.length)) - set(removed)))
+        return removed
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            indices = range(*index.indices(len(self)))
+            return [self.get_image(i) for i in indices]
+
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError('TrainingSet index out of range')
+        return self.get_image(index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.get_image(index)
+
+    def save(self, filename='training.npz'):
+        """Save the training set to an .npz file
+
+        Parameters
+        ----------
+        filename : str
+            Path to the file. It is written to a temporary file first and then
+            renamed, so a file that is being read is never left half written.
+        """
+        n = self.length
+        tmpname = filename + '.tmp'
+        with open(tmpname, 'wb') as f:
+            np.savez_compressed(f,
+                                numbers=self.numbers,
+                                pbc=self.pbc,
+                                tags=self.tags,
+                                constraints=encode(self.constraints),
+                                positions=self.positions[:n],
+                                cells=self.cells[:n],
+                                energies=self.energies[:n],
+                                forces=self.forces[:n])
+        os.replace(tmpname, filename)
+
+    def _read(self, filename):
+        """Read a training set saved with save()"""
+        with np.load(filename) as data:
+            self.numbers = data['numbers']
+            self.pbc = data['pbc']
+            self.tags = data['tags']
+            self.constraints = decode(str(data['constraints']))
+            self.positions = data['positions']
+            self.cells = data['cells']
+            self.energies = data['energies']
+            self.forces = data['forces']
+        self.length = len(self.energies)
+
+    @classmethod
+    def load(cls, filename='training.npz'):
+        """Load a training set saved with save()
+
+        Parameters
+        ----------
+        filename : str
+            Path to the .npz file.
+        """
+        return cls(filename)
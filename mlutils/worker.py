@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+"""Long-lived worker process for reference calculations
+
+The worker keeps one calculator, and one Atoms object attached to it, in
+memory for the whole NEB acceleration. Images are sent to it through a local
+socket. Because the same calculator is reused, the setup is only done once,
+and calculators like GPAW start each SCF from the wavefunctions of the
+previous image.
+
+The worker is started by CalculatorWorker, either with the current python
+interpreter or under MPI with gpaw-python. It can also be run by hand:
+
+    python worker.py --address-file worker.address --calc emt
+"""
+from multiprocessing.connection import Client, Listener
+import subprocess
+import argparse
+import binascii
+import json
+import time
+import sys
+import os
+
+# ASE imports
+from ase.atoms import Atoms
+from ase.calculators.singlepoint import SinglePointCalculator
+from ase.io import Trajectory
+
+
+class CalculatorWorker(object):
+    """Client of a long-lived calculator worker
+
+    Parameters
+    ----------
+    calc : str
+        Either 'emt', or path to a python file that defines a calculator
+        named `calc`, like the gpaw.calc file used by accelerate_neb.
+    cores : int
+        Number of MPI processes. When it is set the worker is started with
+        mpiexec and gpaw-python, otherwise with the current interpreter.
+    command : list
+        Command used to start the worker, instead of the default one. The
+        path to this file and its arguments are appended to it.
+    path : str
+        Directory where the worker runs and writes its address.
+    timeout : float
+        Seconds to wait for the worker to start.
+    """
+    def __init__(self, calc='gpaw.calc', cores=None, command=None, path='.',
+                 timeout=600.):
+        if command is None:
+            if cores is None:
+                command = [sys.executable]
+            else:
+                command = ['mpiexec', '-n', str(cores), 'gpaw-python']
+
+        address_file = os.path.join(path, 'worker.address')
+        if os.path.isfile(address_file):
+            os.remove(address_file)
+
+        if calc != 'emt':
+            calc = os.path.abspath(calc)
+
+        authkey = binascii.hexlify(os.urandom(16)).decode()
+        env = dict(os.environ, MLUTILS_WORKER_AUTHKEY=authkey)
+        self.process = subprocess.Popen(
+                command + [os.path.abspath(__file__),
+                           '--address-file', 'worker.address',
+                           '--calc', calc],
+                cwd=path, env=env)
+
+        start = time.time()
+        while not os.path.isfile(address_file):
+            if self.process.poll() is not None:
+                raise RuntimeError('The calculator worker exited with code '
+                                   '%s.' % self.process.returncode)
+            if time.time() - start > timeout:
+                self.process.kill()
+                raise RuntimeError('The calculator worker did not start.')
+            time.sleep(0.1)
+
+        with open(address_file) as f:
+            address = tuple(json.load(f))
+        self.connection = Client(address, authkey=authkey.encode())
+
+    def calculate(self, image):
+        """Compute energy and forces of an image
+
+        Parameters
+        ----------
+        image : object
+            Atoms object.
+
+        Returns
+        -------
+        energy, forces : float, array
+            Results computed without applying constraints.
+        """
+        self.connection.send(('calculate', image.get_atomic_numbers(),
+                              image.get_positions(),
+                              image.get_cell()[:], image.get_pbc()))
+        message = self.connection.recv()
+
+        if message[0] == 'error':
+            raise RuntimeError('The calculator worker failed: %s'
+                               % message[1])
+        return message[1], message[2]
+
+    def run(self, images, filename='calculator.traj'):
+        """Compute images and write them to a trajectory file
+
+        Parameters
+        ----------
+        images : list
+            Atoms objects.
+        filename : str
+            Trajectory file where images are written in order, as done by
+            the GPAW script of accelerate_neb.
+        """
+        output = Trajectory(filename, mode='w')
+        for image in images:
+            energy, forces = self.calculate(image)
+            image = image.copy()
+            image.set_calculator(SinglePointCalculator(image, energy=energy,
+                                                       forces=forces))
+            output.write(image)
+        output.close()
+
+    def close(self):
+        """Stop the worker"""
+        try:
+            self.connection.send(('close',))
+            self.connection.close()
+        except (IOError, OSError):
+            pass
+        self.process.wait()
+
+
+def load_calculator(calc):
+    """Create the calculator of the worker
+
+    Parameters
+    ----------
+    calc : str
+        'emt' or path to a python file that defines `calc`.
+    """
+    if calc == 'emt':
+        from ase.calculators.emt import EMT
+        return EMT()
+
+    namespace = {}
+    with open(calc) as f:
+        exec(f.read(), namespace)
+    return namespace['calc']
+
+
+def serve(calc, address_file='worker.address'):
+    """Compute images sent by a CalculatorWorker until it closes
+
+    Under MPI only the master rank talks to the client, and messages are
+    broadcast to the other ranks so all of them run the calculation.
+
+    Parameters
+    ----------
+    calc : object
+        The calculator.
+    address_file : str
+        File where the address of the listening socket is written.
+    """
+    from ase.parallel import world, broadcast
+
+    connection = None
+    if world.rank == 0:
+        authkey = os.environ['MLUTILS_WORKER_AUTHKEY'].encode()
+        listener = Listener(('localhost', 0), authkey=authkey)
+        with open(address_file + '.tmp', 'w') as f:
+            json.dump(list(listener.address), f)
+        os.rename(address_file + '.tmp', address_file)
+        connection = listener.accept()
+
+    atoms = None
+    while True:
+        message = connection.recv() if world.rank == 0 else None
+        message = broadcast(message, root=0)
+
+        if message[0] == 'close':
+            break
+
+        numbers, positions, cell, pbc = message[1:]
+        if (atoms is None or len(atoms) != len(numbers) or
+           (atoms.get_atomic_numbers() != numbers).any()):
+            atoms = Atoms(numbers=numbers, positions=positions, cell=cell,
+                          pbc=pbc)
+            atoms.set_calculator(calc)
+        else:
+            atoms.set_cell(cell)
+            atoms.set_positions(positions)
+
+        try:
+            energy = atoms.get_potential_energy(apply_constraint=False)
+            forces = atoms.get_forces(apply_constraint=False)
+            reply = ('result', energy, forces)
+        except Exception as error:
+            reply = ('error', repr(error))
+            atoms = None
+
+        if world.rank == 0:
+            connection.send(reply)
+
+    if world.rank == 0:
+        connection.close()
+        listener.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--address-file', default='worker.address')
+    parser.add_argument('--calc', default='gpaw.calc')
+    args = parser.parse_args()
+    serve(load_calculator(args.calc), address_file=args.address_file)
@@ -0,0 +1,95 @@
+# General imports
+import tempfile
+import shutil
+import os
+
+
+class Workspace(object):
+    """Directory where all files of a NEB acceleration are kept
+
+    Trajectories, Amp models, databases, logs and scripts of an
+    accelerate_neb instance are created inside the workspace, so that several
+    runs can share the same working directory without overwriting each
+    other's files.
+
+    Parameters
+    ----------
+    path : str
+        Directory of the workspace. It is created if it does not exist. By
+        default it is the current working directory.
+    persistent : str
+        Directory where the workspace is copied by checkpoint(). Useful when
+        path lives in fast local scratch storage that is not kept after the
+        job ends.
+    """
+    def __init__(self, path='.', persistent=None):
+        self.path = path
+        self.persistent = persistent
+
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+    @classmethod
+    def scratch(cls, prefix='neb-', root=None, persistent=None):
+        """Create a workspace in a new temporary directory
+
+        Parameters
+        ----------
+        prefix : str
+            Prefix of the directory name.
+        root : str
+            Directory where the workspace is created. By default /dev/shm is
+            used when it exists, otherwise the system temporary directory.
+        persistent : str
+            See Workspace.
+        """
+        if root is None and os.path.isdir('/dev/shm'):
+            root = '/dev/shm'
+        path = tempfile.mkdtemp(prefix=prefix, dir=root)
+        return cls(path=path, persistent=persistent)
+
+    def get_path(self, filename):
+        """Path of a file inside the workspace
+
+        Parameters
+        ----------
+        filename : str
+            Name of the file.
+        """
+        if self.path == '.':
+            return filename
+        return os.path.join(self.path, filename)
+
+    def checkpoint(self, logfile=None):
+        """Copy the content of the workspace to persistent storage
+
+        Files are copied only when they are new or were modified since the
+        last checkpoint. Nothing is done when persistent is not set.
+
+        Parameters
+        ----------
+        logfile : object
+            File object where to log the checkpoint.
+        """
+        if self.persistent is None:
+            return
+
+        copied = 0
+        for root, dirs, files in os.walk(self.path):
+            destination = os.path.join(self.persistent,
+                                       os.path.relpath(root, self.path))
+            if not os.path.isdir(destination):
+                os.makedirs(destination)
+
+            for filename in files:
+                source = os.path.join(root, filename)
+                target = os.path.join(destination, filename)
+                if (not os.path.isfile(target) or
+                   os.path.getmtime(source) > os.path.getmtime(target)):
+                    shutil.copy2(source, target)
+                    copied += 1
+
+        if logfile is not None:
+            logfile.write('Checkpoint: %s files copied to %s\n'
+                          % (copied, self.persistent))
+            logfile.flush()
@@ -0,0 +1,172 @@
+import numpy as np
+import pytest
+from ase.build import fcc100, add_adsorbate
+from ase.calculators.emt import EMT
+from ase.constraints import FixAtoms
+
+
+@pytest.fixture
+def emt_images():
+    """Factory of images of an Au adatom moving on Al(100), with EMT results
+
+    The adatom starts at a hollow site and is moved along x. Atoms below
+    the top layer of the slab are fixed.
+
+    Parameters of the factory
+    -------------------------
+    n : int
+        Number of images, the adatom moving step further in each one.
+    step : float
+        Displacement of the adatom between images, in Angstrom.
+    shifts : list
+        Displacement of the adatom in each image, instead of n and step.
+    size : tuple
+        Size of the slab.
+    rattle : float
+        Standard deviation of random displacements of all atoms, seeded
+        with the index of the image.
+    """
+    def make_images(n=None, step=0.1, shifts=None, size=(2, 2, 2),
+                    rattle=None):
+        slab = fcc100('Al', size=size)
+        add_adsorbate(slab, 'Au', 1.7, 'hollow')
+        slab.center(axis=2, vacuum=4.0)
+        slab.set_constraint(FixAtoms(mask=[atom.tag > 1 for atom in slab]))
+
+        if shifts is None:
+            shifts = step * np.arange(n)
+
+        images = []
+        for index, shift in enumerate(shifts):
+            image = slab.copy()
+            image.positions[-1, 0] += shift
+            if rattle is not None:
+                image.rattle(rattle, seed=index)
+            image.calc = EMT()
+            image.get_forces()
+            images.append(image)
+        return images
+    return make_images
+
+
+class Interrupted(Exception):
+    pass
+
+
+def get_amp_calc():
+    """Small Amp model that trains in a few seconds"""
+    from amp import Amp
+    from amp.descriptor.gaussian import Gaussian
+    from amp.model.neuralnetwork import NeuralNetwork
+    from amp.model import LossFunction
+
+    amp_calc = Amp(descriptor=Gaussian(cutoff=4.0),
+                   model=NeuralNetwork(hiddenlayers=(3,), checkpoints=None),
+                   cores=1, logging=False)
+    amp_calc.model.lossfunction = LossFunction(
+            convergence={'energy_rmse': 0.02, 'force_rmse': 0.5})
+    return amp_calc
+
+
+@pytest.fixture
+def amp_calc():
+    """Small Amp model, see get_amp_calc()"""
+    pytest.importorskip('amp')
+    return get_amp_calc()
+
+
+@pytest.fixture
+def make_neb(tmp_path, monkeypatch, emt_images):
+    """Factory of accelerate_neb instances for the Au adatom hop
+
+    The end points are the adatom in two neighboring hollow sites of
+    Al(100), computed with EMT, and the model is a small Amp network. All
+    files are written to the workspace tmp_path/run. Tests run in tmp_path,
+    where Amp writes the files of its worker processes.
+
+    Parameters of the factory
+    -------------------------
+    restart : bool
+        Passed to initialize().
+    neb_kwargs : dict
+        Keyword arguments of accelerate_neb, added to or replacing the
+        defaults.
+    **kwargs
+        Keyword arguments of initialize(), added to or replacing the
+        defaults.
+    """
+    pytest.importorskip('amp')
+    pytest.importorskip('ase.neb')
+    from ase.io import write
+    from mlutils.neb import accelerate_neb
+    from mlutils.workspace import Workspace
+
+    monkeypatch.chdir(tmp_path)
+    hop = emt_images(1)[0].get_cell()[0, 0] / 2.
+    initial, final = emt_images(shifts=[0., hop])
+    write(str(tmp_path / 'initial.traj'), initial)
+    write(str(tmp_path / 'final.traj'), final)
+
+    instances = []
+
+    def make(restart=False, neb_kwargs=None, **kwargs):
+        arguments = dict(initial=str(tmp_path / 'initial.traj'),
+                         final=str(tmp_path / 'final.traj'),
+                         tolerance=0.01, fmax=0.05, ifmax=0.5,
+                         maxrunsteps=20,
+                         workspace=Workspace(str(tmp_path / 'run')))
+        arguments.update(neb_kwargs or {})
+        neb = accelerate_neb(**arguments)
+        instances.append(neb)
+
+        arguments = dict(calc=EMT(), amp_calc=get_amp_calc(),
+                         intermediates=2, restart=restart)
+        arguments.update(kwargs)
+        neb.initialize(**arguments)
+        return neb
+
+    yield make
+
+    for neb in instances:
+        neb.logfile.close()
+
+
+@pytest.fixture
+def run_until(monkeypatch):
+    """Run accelerate() until the checkpoint of a phase is saved
+
+    accelerate() stops only once the tolerance is met, so the run is
+    interrupted right after the checkpoint of (iteration, phase).
+
+    Parameters of the function
+    --------------------------
+    neb : object
+        An initialized accelerate_neb instance.
+    iteration, phase : int, str
+        Last phase that is run.
+
+    Returns
+    -------
+    completed : list
+        The (iteration, phase) of each checkpoint saved by accelerate().
+    """
+    pytest.importorskip('amp')
+    pytest.importorskip('ase.neb')
+    from mlutils.neb import accelerate_neb
+    save = accelerate_neb.save_checkpoint
+
+    def run(neb, iteration, phase):
+        completed = []
+
+        def save_checkpoint(self, name, fmax):
+            save(self, name, fmax)
+            completed.append((self.iteration, name))
+            if (self.iteration, name) == (iteration, phase):
+                raise Interrupted()
+        monkeypatch.setattr(accelerate_neb, 'save_checkpoint',
+                            save_checkpoint)
+        with pytest.raises(Interrupted):
+            neb.accelerate()
+        monkeypatch.setattr(accelerate_neb, 'save_checkpoint', save)
+        return completed
+    return run
@@ -0,0 +1,27 @@
+import numpy as np
+from ase.calculators.singlepoint import SinglePointCalculator
+
+
+def test_insert_at_steepest_energy_change(make_neb):
+    neb = make_neb(neb_kwargs={'max_intermediates': 3})
+
+    # Positions are evenly spaced, but the energy changes fastest between
+    # the second intermediate and the final image. The end points have no
+    # results, as in a band optimized by the ML-NEB.
+    initial = neb.training_set[0].get_potential_energy()
+    band = [image.copy() for image in neb.training_set[0:4]]
+    for image, energy in zip(band[1:3], [initial + 0.5, initial + 0.6]):
+        image.set_calculator(SinglePointCalculator(image, energy=energy))
+
+    images = neb.insert_images(band)
+    assert len(images) == 5
+    assert np.allclose(images[3].positions,
+                       (band[2].positions + band[3].positions) / 2.)
+
+
+def test_accelerate_with_adaptive_band(make_neb, run_until):
+    neb = make_neb(neb_kwargs={'max_intermediates': 3})
+    run_until(neb, 1, 'neb')
+    assert len(neb.band) == 5
+    with open(neb.workspace.get_path('acceleration.log')) as f:
+        assert 'Images have no results' not in f.read()
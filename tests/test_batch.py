@@ -0,0 +1,95 @@
+import os
+import signal
+import threading
+import time
+
+import pytest
+from ase.calculators.emt import EMT
+
+pytest.importorskip('amp')
+pytest.importorskip('ase.neb')
+
+from mlutils import batch  # noqa: E402
+from mlutils.cache import ReferenceCache  # noqa: E402
+from mlutils.ensemble import BootstrapEnsemble  # noqa: E402
+from mlutils.fingerprints import FingerprintStore  # noqa: E402
+from mlutils.monitor import ExtrapolationMonitor  # noqa: E402
+from mlutils.neb import accelerate_neb  # noqa: E402
+
+
+class Interrupted(Exception):
+    pass
+
+
+def test_reactions_have_own_state(tmp_path, amp_calc):
+    store = FingerprintStore(str(tmp_path / 'fingerprints'))
+    cache = ReferenceCache(str(tmp_path / 'cache'))
+    kwargs = {'ensemble': BootstrapEnsemble(amp_calc, size=2),
+              'monitor': ExtrapolationMonitor(threshold=0.5),
+              'fingerprint_store': store, 'cache': cache, 'nselect': 1}
+
+    reactions = [batch.get_reaction_kwargs(kwargs, index)
+                 for index in range(2)]
+    for name in ('ensemble', 'monitor', 'fingerprint_store'):
+        assert reactions[0][name] is not kwargs[name]
+        assert reactions[0][name] is not reactions[1][name]
+    assert reactions[1]['fingerprint_store'].path == \
+        os.path.join(store.path, 'reaction-1')
+    assert reactions[0]['cache'] is cache
+    assert reactions[0]['nselect'] == 1
+    # The arguments given by the user are not modified.
+    assert kwargs['fingerprint_store'] is store
+
+
+def test_accelerate_batch(tmp_path, monkeypatch, emt_images, amp_calc):
+    from ase.io import write
+
+    monkeypatch.chdir(tmp_path)
+    hop = emt_images(1)[0].get_cell()[0, 0] / 2.
+    for name, image in zip(('initial', 'final'),
+                           emt_images(shifts=[0., hop])):
+        write(str(tmp_path / ('%s.traj' % name)), image)
+
+    # Reactions stop after the first iteration, their error is returned.
+    save = accelerate_neb.save_checkpoint
+
+    def save_checkpoint(self, phase, fmax):
+        save(self, phase, fmax)
+        if (self.iteration, phase) == (0, 'cross_validate'):
+            raise Interrupted()
+    monkeypatch.setattr(accelerate_neb, 'save_checkpoint', save_checkpoint)
+
+    reaction = (str(tmp_path / 'initial.traj'), str(tmp_path / 'final.traj'))
+    achieved = batch.accelerate_batch(
+            [reaction, reaction], calc=EMT(), amp_calc=amp_calc,
+            workers=2, path=str(tmp_path / 'batch'),
+            neb_kwargs={'ifmax': 0.5, 'maxrunsteps': 20},
+            initialize_kwargs={'intermediates': 2})
+
+    assert [type(error) for error in achieved] == [Interrupted] * 2
+    for index in range(2):
+        assert os.path.isfile(str(tmp_path / 'batch' / ('reaction-%s' % index)
+                                  / 'checkpoint.json'))
+
+
+def test_keyboard_interrupt_stops_batch(tmp_path, monkeypatch):
+    started = []
+    release = threading.Event()
+
+    def accelerate_reaction(initial, final, *args):
+        started.append(initial)
+        # Ctrl-C once the main thread waits for the reactions.
+        time.sleep(0.5)
+        os.kill(os.getpid(), signal.SIGINT)
+        release.wait(10.)
+    monkeypatch.setattr(batch, 'accelerate_reaction', accelerate_reaction)
+
+    start = time.time()
+    with pytest.raises(KeyboardInterrupt):
+        batch.accelerate_batch([(0, 0), (1, 1), (2, 2)], workers=1,
+                               concurrent=1, path=str(tmp_path))
+    assert time.time() - start < 5.
+    release.set()
+    # Reactions that did not start are cancelled.
+    time.sleep(0.5)
+    assert started == [0]
@@ -0,0 +1,81 @@
+import os
+
+import numpy as np
+from ase.build import molecule
+
+from mlutils.cache import ReferenceCache
+
+
+def make_image(shift=0.):
+    image = molecule('H2O')
+    image.positions[0, 0] += shift
+    return image
+
+
+def test_hit_and_miss(tmp_path):
+    cache = ReferenceCache(str(tmp_path / 'cache'))
+    image = make_image()
+    assert cache.get(image) is None
+
+    forces = np.arange(9.).reshape(3, 3)
+    cache.put(image, -1.5, forces)
+    energy, cached = cache.get(image)
+    assert energy == -1.5
+    assert (cached == forces).all()
+    assert len(cache) == 1
+
+    # Below the tolerance images are the same, above it they are not.
+    assert cache.get(make_image(1e-6)) is not None
+    assert cache.get(make_image(1e-2)) is None
+
+    # Results persist on disk.
+    assert ReferenceCache(str(tmp_path / 'cache')).get(image) is not None
+
+
+def test_key_depends_on_cell_and_pbc(tmp_path):
+    cache = ReferenceCache(str(tmp_path))
+    image = make_image()
+    cache.put(image, 0., np.zeros((3, 3)))
+
+    other = make_image()
+    other.set_cell([5., 5., 5.])
+    assert cache.get(other) is None
+    other = make_image()
+    other.set_pbc(True)
+    assert cache.get(other) is None
+
+
+def test_least_recently_used_are_evicted(tmp_path):
+    cache = ReferenceCache(str(tmp_path), maxsize=2)
+    images = [make_image(0.1 * index) for index in range(3)]
+    for index, image in enumerate(images[:2]):
+        cache.put(image, float(index), np.zeros((3, 3)))
+        filename = os.path.join(cache.path, cache.get_hash(image) + '.npz')
+        os.utime(filename, (1000. + index, 1000. + index))
+
+    # Reading the first image makes the second the least recently used.
+    assert cache.get(images[0]) is not None
+    cache.put(images[2], 2., np.zeros((3, 3)))
+
+    assert len(cache) == 2
+    assert cache.get(images[0]) is not None
+    assert cache.get(images[1]) is None
+    assert cache.get(images[2]) is not None
+
+
+def test_key_depends_on_calculator(tmp_path):
+    from ase.calculators.emt import EMT
+    from ase.calculators.lj import LennardJones
+
+    cache = ReferenceCache(str(tmp_path))
+    image = make_image()
+    cache.put(image, 1., np.zeros((3, 3)), LennardJones(sigma=1.))
+
+    assert cache.get(image, LennardJones(sigma=1.))[0] == 1.
+    assert cache.get(image, LennardJones(sigma=2.)) is None
+    assert cache.get(image, EMT()) is None
+    # Without a calculator the key is only the geometry.
+    assert cache.get(image) is None
+    cache.put(image, 2., np.zeros((3, 3)))
+    assert cache.get(image)[0] == 2.
+    assert cache.get(image, LennardJones(sigma=1.))[0] == 1.
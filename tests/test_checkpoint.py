@@ -0,0 +1,240 @@
+import os
+
+import numpy as np
+import pytest
+from ase.calculators.emt import EMT
+from ase.io import write
+
+from mlutils.checkpoint import Checkpoint, PHASES
+
+
+def make_endpoints(emt_images):
+    """Au adatom hopping between neighboring hollow sites"""
+    hop = emt_images(1)[0].get_cell()[0, 0] / 2.
+    return emt_images(shifts=[0., hop])
+
+
+@pytest.mark.parametrize('phase', PHASES)
+def test_save_and_load(tmp_path, phase, emt_images):
+    checkpoint = Checkpoint(str(tmp_path / 'checkpoint.json'))
+    assert checkpoint.load() is None
+
+    initial, final = make_endpoints(emt_images)
+    band = [initial, final]
+    checkpoint.save(3, phase, 0.1, final_fmax=True, achieved=(0.01, 0.2),
+                    model='3.amp', band=band, history=[(0.2, 0.1, 0.3)],
+                    flagged=[1], ensemble=['3-ensemble-0.amp'])
+    assert not os.path.exists(checkpoint.filename + '.tmp')
+
+    state = checkpoint.load()
+    assert state['iteration'] == 3
+    assert state['phase'] == phase
+    assert state['fmax'] == 0.1
+    assert state['final_fmax'] is True
+    assert state['achieved'] == [0.01, 0.2]
+    assert state['model'] == '3.amp'
+    assert state['history'] == [[0.2, 0.1, 0.3]]
+    assert state['flagged'] == [1]
+    assert state['ensemble'] == ['3-ensemble-0.amp']
+
+    restored = checkpoint.get_band(state, initial)
+    assert len(restored) == 2
+    for image, other in zip(band, restored):
+        assert np.allclose(image.positions, other.positions)
+        assert np.allclose(image.cell, other.cell)
+        assert other.constraints[0].index.tolist() == \
+            initial.constraints[0].index.tolist()
+
+
+def test_without_band(tmp_path, emt_images):
+    checkpoint = Checkpoint(str(tmp_path / 'checkpoint.json'))
+    checkpoint.save(0, 'extend', 0.5)
+    state = checkpoint.load()
+    assert state['achieved'] is None
+    assert state['ensemble'] == []
+    assert checkpoint.get_band(state, make_endpoints(emt_images)[0]) is None
+
+
+def test_unknown_phase(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / 'checkpoint.json'))
+    with pytest.raises(ValueError):
+        checkpoint.save(0, 'predict', 0.5)
+    assert checkpoint.load() is None
+
+
+def test_ensemble_without_members(emt_images):
+    pytest.importorskip('amp')
+    from mlutils.ensemble import BootstrapEnsemble
+
+    ensemble = BootstrapEnsemble(get_amp_calc(), size=2)
+    with pytest.raises(RuntimeError):
+        ensemble.get_uncertainty(list(make_endpoints(emt_images)))
+
+
+class Interrupted(Exception):
+    pass
+
+
+def interrupt_after(monkeypatch, accelerate_neb, stop, completed):
+    """Raise Interrupted once the checkpoint of a phase is saved
+
+    Parameters
+    ----------
+    stop : tuple
+        (iteration, phase) after which the run is interrupted.
+    completed : list
+        The (iteration, phase) of each checkpoint are appended to it.
+    """
+    save = accelerate_neb.save_checkpoint
+
+    def save_checkpoint(self, phase, fmax):
+        save(self, phase, fmax)
+        completed.append((self.iteration, phase))
+        if (self.iteration, phase) == stop:
+            raise Interrupted()
+    monkeypatch.setattr(accelerate_neb, 'save_checkpoint', save_checkpoint)
+
+
+def get_amp_calc():
+    from amp import Amp
+    from amp.descriptor.gaussian import Gaussian
+    from amp.model.neuralnetwork import NeuralNetwork
+    from amp.model import LossFunction
+
+    amp_calc = Amp(descriptor=Gaussian(cutoff=4.0),
+                   model=NeuralNetwork(hiddenlayers=(3,), checkpoints=None),
+                   cores=1, logging=False)
+    amp_calc.model.lossfunction = LossFunction(
+            convergence={'energy_rmse': 0.02, 'force_rmse': 0.5})
+    return amp_calc
+
+
+@pytest.mark.parametrize('phase', PHASES)
+def test_resume_after_phase(tmp_path, monkeypatch, phase, emt_images):
+    pytest.importorskip('amp')
+    pytest.importorskip('ase.neb')
+    from mlutils.neb import accelerate_neb
+    from mlutils.workspace import Workspace
+
+    initial, final = make_endpoints(emt_images)
+    write(str(tmp_path / 'initial.traj'), initial)
+    write(str(tmp_path / 'final.traj'), final)
+
+    def start(restart):
+        neb = accelerate_neb(initial=str(tmp_path / 'initial.traj'),
+                             final=str(tmp_path / 'final.traj'),
+                             tolerance=0.01, fmax=0.05, ifmax=0.5,
+                             maxrunsteps=20,
+                             workspace=Workspace(str(tmp_path / 'run')))
+        neb.initialize(calc=EMT(), amp_calc=get_amp_calc(),
+                       intermediates=2, restart=restart)
+        return neb
+
+    # The run is interrupted right after the phase of iteration 0. The
+    # extend phase of iteration 0 is saved by initialize().
+    completed = []
+    interrupt_after(monkeypatch, accelerate_neb, (0, phase), completed)
+    with pytest.raises(Interrupted):
+        start(restart=False).accelerate()
+    assert completed[-1] == (0, phase)
+
+    # The restart continues with the next phase and stops after extending
+    # the training set of iteration 1.
+    completed = []
+    interrupt_after(monkeypatch, accelerate_neb, (1, 'extend'), completed)
+    neb = start(restart=True)
+    assert neb.iteration == 0
+    with pytest.raises(Interrupted):
+        neb.accelerate()
+
+    remaining = [(0, name) for name in PHASES[PHASES.index(phase) + 1:]]
+    assert completed == remaining + [(1, 'extend')]
+
+    # Phases that were completed are not run again.
+    records = [record for record in neb.instrumentation.records
+               if record['iteration'] == 0 and '/' not in record['phase']]
+    assert [record['phase'] for record in records] == \
+        [name for iteration, name in remaining]
+    reference_calls = sum(record.get('reference_calls', 0)
+                          for record in records)
+    assert reference_calls == (2 if phase != 'cross_validate' else 0)
+
+    # Images of the cross validation are added to the training set once.
+    assert len(neb.training_set) == 6
+    neb.logfile.close()
+
+
+def test_resume_restores_ensemble(tmp_path, emt_images):
+    pytest.importorskip('amp')
+    pytest.importorskip('ase.neb')
+    from mlutils.ensemble import BootstrapEnsemble
+    from mlutils.neb import accelerate_neb
+    from mlutils.training_set import TrainingSet
+    from mlutils.workspace import Workspace
+
+    initial, final = make_endpoints(emt_images)
+    write(str(tmp_path / 'initial.traj'), initial)
+    write(str(tmp_path / 'final.traj'), final)
+    workspace = Workspace(str(tmp_path / 'run'))
+    TrainingSet([initial, initial, final]).save(
+            workspace.get_path('training.npz'))
+    members = [workspace.get_path('0-ensemble-%s.amp' % member)
+               for member in range(2)]
+    Checkpoint(workspace.get_path('checkpoint.json')).save(
+            0, 'train', 0.5, ensemble=members)
+
+    ensemble = BootstrapEnsemble(get_amp_calc(), size=2)
+    neb = accelerate_neb(initial=str(tmp_path / 'initial.traj'),
+                         final=str(tmp_path / 'final.traj'),
+                         workspace=workspace, ensemble=ensemble, nselect=1)
+    neb.initialize(calc=EMT(), amp_calc=get_amp_calc(), intermediates=1,
+                   restart=True)
+    assert ensemble.filenames == members
+    neb.logfile.close()
+
+
+def test_extend_is_not_repeated(tmp_path, monkeypatch, emt_images):
+    pytest.importorskip('amp')
+    pytest.importorskip('ase.neb')
+    from mlutils.neb import accelerate_neb
+    from mlutils.workspace import Workspace
+
+    initial, final = make_endpoints(emt_images)
+    write(str(tmp_path / 'initial.traj'), initial)
+    write(str(tmp_path / 'final.traj'), final)
+
+    def start(restart):
+        neb = accelerate_neb(initial=str(tmp_path / 'initial.traj'),
+                             final=str(tmp_path / 'final.traj'),
+                             tolerance=0.01, fmax=0.05, ifmax=0.5,
+                             maxrunsteps=20,
+                             workspace=Workspace(str(tmp_path / 'run')))
+        neb.initialize(calc=EMT(), amp_calc=get_amp_calc(),
+                       intermediates=2, restart=restart)
+        return neb
+
+    # The run is killed after the training set of iteration 1 is saved,
+    # but before its checkpoint.
+    save = Checkpoint.save
+
+    def killed(self, iteration, phase, *args, **kwargs):
+        if (iteration, phase) == (1, 'extend'):
+            raise Interrupted()
+        save(self, iteration, phase, *args, **kwargs)
+    monkeypatch.setattr(Checkpoint, 'save', killed)
+    with pytest.raises(Interrupted):
+        start(restart=False).accelerate()
+    assert (tmp_path / 'run' / 'training-1.npz').exists()
+    monkeypatch.setattr(Checkpoint, 'save', save)
+
+    completed = []
+    interrupt_after(monkeypatch, accelerate_neb, (1, 'extend'), completed)
+    neb = start(restart=True)
+    assert len(neb.training_set) == 4
+    with pytest.raises(Interrupted):
+        neb.accelerate()
+    assert completed == [(1, 'extend')]
+    assert len(neb.training_set) == 6
+    assert neb.checkpoint.load()['training_set'] == 'training-1.npz'
+    assert not (tmp_path / 'run' / 'training-0.npz').exists()
+    neb.logfile.close()
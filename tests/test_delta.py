@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from ase.calculators.emt import EMT
+from ase.calculators.lj import LennardJones
+
+pytest.importorskip('amp')
+
+from mlutils.delta import DeltaCalculator, get_delta_images  # noqa: E402
+
+
+def get_results(image, calc):
+    image = image.copy()
+    image.calc = calc
+    return (image.get_potential_energy(),
+            image.get_forces(apply_constraint=False))
+
+
+def test_delta_images_and_cache(emt_images):
+    images = emt_images(3, rattle=0.05)
+    baseline = LennardJones(sigma=2.3, rc=5.)
+    results = {}
+    delta_images = get_delta_images(images[:2], baseline, results)
+    assert len(results) == 2
+
+    for image, delta in zip(images, delta_images):
+        energy, forces = get_results(image, baseline)
+        assert delta.get_potential_energy() == pytest.approx(
+                image.get_potential_energy() - energy)
+        assert np.allclose(delta.get_forces(apply_constraint=False),
+                           image.get_forces(apply_constraint=False) - forces)
+        # The reference results of the image are kept.
+        assert image.calc.__class__ is EMT
+
+    get_delta_images(images, baseline, results)
+    assert len(results) == 3
+
+
+def test_calculator_adds_baseline_back(emt_images):
+    image = emt_images(1, rattle=0.05)[0]
+    baseline = LennardJones(sigma=2.3, rc=5.)
+    model = EMT()
+    calc = DeltaCalculator(baseline, model)
+
+    energy, forces = get_results(image, calc)
+    baseline_energy, baseline_forces = get_results(image, baseline)
+    model_energy, model_forces = get_results(image, model)
+    assert energy == pytest.approx(baseline_energy + model_energy)
+    assert np.allclose(forces, baseline_forces + model_forces)
+
+    energies, all_forces = calc.predict(emt_images(2, rattle=0.05))
+    assert energies[0] == pytest.approx(energy)
+    assert np.allclose(all_forces[0], forces)
+
+
+@pytest.mark.parametrize('prescreen, prescreened', [(1e-6, 0), (1e6, 2)])
+def test_accelerate_with_prescreen(make_neb, run_until, prescreen,
+                                   prescreened):
+    baseline = LennardJones(sigma=2.3, rc=5.)
+    neb = make_neb(neb_kwargs={'prescreen': prescreen}, baseline=baseline)
+    run_until(neb, 0, 'cross_validate')
+
+    records = [record for record in neb.instrumentation.records
+               if '/' not in record['phase']]
+    assert sum(record.get('prescreened', 0)
+               for record in records) == prescreened
+    # The initial band, and the intermediates that were not estimated.
+    assert sum(record.get('reference_calls', 0)
+               for record in records) == 6 - prescreened
+    assert len(neb.reference_images) == 4 - prescreened
+
+    # The model is trained on the difference to the baseline.
+    assert isinstance(neb.load_model('0'), DeltaCalculator)
@@ -0,0 +1,24 @@
+import os
+
+import numpy as np
+
+
+def test_accelerate_with_ensemble(make_neb, run_until, amp_calc):
+    from mlutils.ensemble import BootstrapEnsemble
+
+    ensemble = BootstrapEnsemble(amp_calc, size=2, seed=0)
+    neb = make_neb(neb_kwargs={'ensemble': ensemble, 'nselect': 1})
+    run_until(neb, 0, 'cross_validate')
+
+    assert len(ensemble.filenames) == 2
+    for filename in ensemble.filenames:
+        assert os.path.isfile(filename)
+    uncertainty = ensemble.get_uncertainty(neb.band[1:-1])
+    assert uncertainty.shape == (2,)
+    assert np.isfinite(uncertainty).all()
+
+    # Only the most uncertain intermediate is computed with the reference.
+    assert len(neb.reference_images) == 3
+    records = [record for record in neb.instrumentation.records
+               if record['phase'] == 'cross_validate']
+    assert records[0]['reference_calls'] == 1
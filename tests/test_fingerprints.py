@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+pytest.importorskip('amp')
+
+from amp.descriptor.gaussian import Gaussian  # noqa: E402
+from amp.utilities import hash_images, FileDatabase  # noqa: E402
+
+from mlutils.fingerprints import FingerprintStore  # noqa: E402
+
+
+def fingerprint(images, store):
+    descriptor = Gaussian(cutoff=4.0)
+    descriptor.dblabel = store.dblabel
+    descriptor.calculate_fingerprints(hash_images(images, log=None),
+                                      calculate_derivatives=True)
+
+
+def test_prune(tmp_path, emt_images):
+    store = FingerprintStore(str(tmp_path / 'fingerprints'))
+    assert os.path.isdir(store.path)
+
+    images = emt_images(3, size=(2, 2, 1))
+    fingerprint(images, store)
+    keys = set(hash_images(images, log=None).keys())
+    for database in store.get_databases():
+        assert store.keys(database) == keys
+
+    class Log(list):
+        write = list.append
+
+        def flush(self):
+            pass
+
+    logfile = Log()
+    store.prune(images[1:], logfile=logfile)
+    keys = set(hash_images(images[1:], log=None).keys())
+    for database in store.get_databases():
+        assert store.keys(database) == keys
+    assert logfile == ['Fingerprint store: 3 entries removed\n']
+
+    # Entries that are kept are found again by Amp.
+    fingerprint(images[1:], store)
+    for database in store.get_databases():
+        assert store.keys(database) == keys
+
+
+def test_prune_archive(tmp_path, emt_images):
+    store = FingerprintStore(str(tmp_path / 'fingerprints'))
+    images = emt_images(3, size=(2, 2, 1))
+    fingerprint(images, store)
+    for database in store.get_databases():
+        FileDatabase(database).archive()
+        assert os.path.isfile(os.path.join(database, 'archive.tar.gz'))
+
+    store.prune(images[:1])
+    keys = set(hash_images(images[:1], log=None).keys())
+    for database in store.get_databases():
+        assert store.keys(database) == keys
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from ase.io import Trajectory
+
+from mlutils.frames import (FrameReader, FrameWriter, write_frames,
+                            to_trajectory, from_trajectory)
+
+
+def check_same(image, other):
+    assert (image.numbers == other.numbers).all()
+    assert (image.pbc == other.pbc).all()
+    assert (image.get_tags() == other.get_tags()).all()
+    assert np.allclose(image.positions, other.positions)
+    assert np.allclose(image.cell, other.cell)
+    assert other.constraints[0].index.tolist() == \
+        image.constraints[0].index.tolist()
+    assert other.get_potential_energy() == pytest.approx(
+            image.get_potential_energy())
+    assert np.allclose(other.get_forces(apply_constraint=False),
+                       image.get_forces(apply_constraint=False))
+
+
+def test_round_trip(tmp_path, emt_images):
+    filename = str(tmp_path / 'images.frames')
+    images = emt_images(4)
+    write_frames(filename, images)
+
+    reader = FrameReader(filename)
+    assert len(reader) == 4
+    for image, other in zip(images, reader):
+        check_same(image, other)
+    assert np.allclose(reader.energies,
+                       [image.get_potential_energy() for image in images])
+    check_same(images[-1], reader[-1])
+    assert len(reader[1:3]) == 2
+    with pytest.raises(IndexError):
+        reader[4]
+
+
+def test_append(tmp_path, emt_images):
+    filename = str(tmp_path / 'images.frames')
+    images = emt_images(3)
+    write_frames(filename, images[:1])
+    write_frames(filename, images[1:], mode='a')
+
+    reader = FrameReader(filename)
+    assert len(reader) == 3
+    for image, other in zip(images, reader):
+        check_same(image, other)
+
+    with FrameWriter(filename, mode='a') as writer:
+        with pytest.raises(ValueError):
+            writer.write(images[0][:-1])
+
+
+def test_images_without_results(tmp_path, emt_images):
+    filename = str(tmp_path / 'images.frames')
+    image = emt_images(1)[0]
+    image.calc = None
+    write_frames(filename, [image])
+
+    reader = FrameReader(filename)
+    assert np.isnan(reader.energies[0])
+    assert reader[0].calc is None
+
+
+def test_empty_file(tmp_path, emt_images):
+    filename = str(tmp_path / 'images.frames')
+    FrameWriter(filename).close()
+    with pytest.raises(IOError):
+        FrameReader(filename)
+
+
+def test_trajectory_conversion(tmp_path, emt_images):
+    images = emt_images(3)
+    trajectory = str(tmp_path / 'images.traj')
+    with Trajectory(trajectory, mode='w') as output:
+        for image in images:
+            output.write(image)
+
+    filename = str(tmp_path / 'images.frames')
+    from_trajectory(trajectory, filename)
+    to_trajectory(filename, str(tmp_path / 'back.traj'))
+    for image, other in zip(images, Trajectory(str(tmp_path / 'back.traj'))):
+        check_same(image, other)
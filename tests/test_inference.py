@@ -0,0 +1,133 @@
+import os.path
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+from ase.io import read
+
+from mlutils.inference import NeuralNetworkEngine
+
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), os.pardir, 'examples',
+                        'neb_acceleration')
+
+
+def load_parameters(filename):
+    namespace = {'OrderedDict': OrderedDict, 'dict': dict,
+                 'array': np.array, '__builtins__': {}}
+    with open(filename) as f:
+        parameters = eval(f.read(), namespace)
+    return (eval(parameters['descriptor'], namespace),
+            eval(parameters['model'], namespace))
+
+
+def free_atoms(image):
+    fixed = set()
+    for constraint in image.constraints:
+        fixed.update(constraint.index)
+    return [index for index in range(len(image)) if index not in fixed]
+
+
+@pytest.mark.parametrize('iteration', range(6))
+@pytest.mark.parametrize('skin', [None, 0.3])
+def test_parity_with_amp(iteration, skin):
+    # The ML-NEB trajectories hold the predictions of Amp with the model of
+    # the same iteration.
+    images = read(os.path.join(EXAMPLES, 'neb_%d.traj' % iteration), ':')
+    engine = NeuralNetworkEngine.load(
+            os.path.join(EXAMPLES, '%d.amp' % iteration), skin=skin)
+    energies, forces = engine.predict(images)
+
+    free = free_atoms(images[0])
+    assert np.allclose(energies,
+                       [image.get_potential_energy() for image in images],
+                       rtol=0., atol=1e-10)
+    assert np.allclose(forces[:, free],
+                       [image.get_forces()[free] for image in images],
+                       rtol=0., atol=1e-10)
+
+
+def test_fingerprints_without_range_are_not_scaled():
+    descriptor, model = load_parameters(os.path.join(EXAMPLES, '5.amp'))
+    engine = NeuralNetworkEngine(descriptor, model)
+    fprange = np.array(model['fprange']['Au'])
+    constant = (fprange[:, 1] - fprange[:, 0]) <= 1e-8
+    assert constant.any()
+
+    shift, factor = engine.fprange['Au']
+    assert (factor[constant] == 1.).all()
+    assert (shift[constant] == 0.).all()
+
+
+def test_forces_are_derivatives_of_energy_with_offsets():
+    descriptor, model = load_parameters(os.path.join(EXAMPLES, '5.amp'))
+    for Gs in descriptor['Gs'].values():
+        for G in Gs:
+            if G['type'] == 'G2':
+                G['offset'] = 0.5
+    engine = NeuralNetworkEngine(descriptor, model, skin=None)
+
+    image = read(os.path.join(EXAMPLES, 'neb_5.traj'), '3')
+    energies, forces = engine.predict([image])
+
+    delta = 1e-5
+    for atom in free_atoms(image):
+        for axis in range(3):
+            displaced = []
+            for sign in (1., -1.):
+                copy = image.copy()
+                positions = copy.get_positions()
+                positions[atom, axis] += sign * delta
+                copy.set_positions(positions, apply_constraint=False)
+                displaced.append(copy)
+            plus, minus = engine.predict(displaced, forces=False)[0]
+            assert abs(-(plus - minus) / (2. * delta) -
+                       forces[0, atom, axis]) < 1e-6
+
+
+def test_cached_results_match_fresh_ones():
+    filename = os.path.join(EXAMPLES, '5.amp')
+    cached = NeuralNetworkEngine.load(filename, skin=0.3)
+    fresh = NeuralNetworkEngine.load(filename, skin=None)
+    band = read(os.path.join(EXAMPLES, 'neb_5.traj'), '0:7')
+    cached.predict(band)
+
+    # Moves within half the skin reuse the neighbor lists and the results
+    # of unaffected atoms, larger moves rebuild the lists.
+    rng = np.random.RandomState(0)
+    for step in range(4):
+        for image in band[1:-1]:
+            positions = image.get_positions()
+            positions[-1] += rng.uniform(-0.1, 0.1, 3) * (step + 1)
+            image.set_positions(positions, apply_constraint=False)
+        energies, forces = cached.predict(band)
+        reference = fresh.predict(band)
+        assert np.allclose(energies, reference[0], rtol=0., atol=1e-12)
+        assert np.allclose(forces, reference[1], rtol=0., atol=1e-12)
+
+
+@pytest.mark.parametrize('batched', [False, True])
+def test_accelerate_with_fast_inference(make_neb, run_until, batched):
+    from amp import Amp
+    from mlutils.inference import NeuralNetworkCalculator
+
+    neb = make_neb(neb_kwargs={'fast_inference': True},
+                   batched_prediction=batched)
+    run_until(neb, 0, 'neb')
+
+    with open(neb.workspace.get_path('acceleration.log')) as f:
+        assert 'is loaded with Amp' not in f.read()
+    model = neb.load_model('0')
+    assert isinstance(model, NeuralNetworkCalculator)
+
+    # The band optimized with the engine holds the predictions of Amp.
+    # After cross validation it would hold the reference results instead.
+    amp_calc = Amp.load(neb.workspace.get_path('0.amp'),
+                        label=neb.workspace.get_path('parity'))
+    for image in neb.band[1:-1]:
+        expected = image.copy()
+        expected.calc = amp_calc
+        assert image.get_potential_energy() == pytest.approx(
+                expected.get_potential_energy(), abs=1e-6)
+        assert np.allclose(image.get_forces(), expected.get_forces(),
+                           rtol=0., atol=1e-6)
@@ -0,0 +1,37 @@
+import os
+
+import numpy as np
+import pytest
+from ase.calculators.emt import EMT
+
+
+def test_needs_a_cheap_calculator(make_neb):
+    with pytest.raises(ValueError):
+        make_neb(prerelax=0.5)
+    with pytest.raises(ValueError):
+        make_neb(interpolation='spline')
+
+
+def test_initialize_with_idpp_and_prerelax(make_neb):
+    # The initial band is built and computed by initialize().
+    neb = make_neb(interpolation='idpp', prerelax=0.1, prerelax_calc=EMT())
+
+    assert os.path.isfile(neb.workspace.get_path('idpp.traj'))
+    assert os.path.isfile(neb.workspace.get_path('prerelax.traj'))
+    with open(neb.workspace.get_path('acceleration.log')) as f:
+        assert 'Initial band relaxed with EMT' in f.read()
+    phases = [record['phase'] for record in neb.instrumentation.records]
+    assert 'extend/prerelax' in phases
+
+    # The relaxed band is not the linear interpolation, and it is computed
+    # with the reference once the cheap calculator is removed.
+    initial, final = neb.training_set[0], neb.training_set[3]
+    for fraction, image in zip([1. / 3, 2. / 3], neb.training_set[1:3]):
+        linear = (1 - fraction) * initial.positions + \
+            fraction * final.positions
+        assert not np.allclose(image.positions, linear)
+
+        expected = image.copy()
+        expected.calc = EMT()
+        assert image.get_potential_energy() == pytest.approx(
+                expected.get_potential_energy())
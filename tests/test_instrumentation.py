@@ -0,0 +1,37 @@
+import threading
+
+from mlutils.instrumentation import Instrumentation
+
+
+def test_nested_phases_and_counters():
+    instrumentation = Instrumentation(filename=None)
+    with instrumentation.phase('cross_validate', iteration=1):
+        instrumentation.count('reference_calls', 2)
+        with instrumentation.phase('reference', iteration=1):
+            instrumentation.count('reference_calls', 3)
+            instrumentation.set('training_set', 7)
+
+    inner, outer = instrumentation.records
+    assert inner['phase'] == 'cross_validate/reference'
+    assert inner['reference_calls'] == 3
+    assert inner['training_set'] == 7
+    assert outer['phase'] == 'cross_validate'
+    assert outer['reference_calls'] == 5
+    assert 'training_set' not in outer
+
+
+def test_counters_from_threads():
+    instrumentation = Instrumentation(filename=None)
+
+    def count():
+        for step in range(1000):
+            instrumentation.count('surrogate_calls')
+
+    with instrumentation.phase('cross_validate'):
+        threads = [threading.Thread(target=count) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert instrumentation.records[0]['surrogate_calls'] == 4000
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from mlutils.monitor import ExtrapolationMonitor
+from mlutils.training_set import TrainingSet
+
+
+class Ensemble(object):
+    """Ensemble with fixed uncertainties"""
+    def __init__(self, uncertainties):
+        self.uncertainties = np.array(uncertainties)
+
+    def get_uncertainty(self, images):
+        return self.uncertainties[:len(images)]
+
+
+def test_needs_a_criterion():
+    with pytest.raises(ValueError):
+        ExtrapolationMonitor()
+
+
+def test_distance_threshold(emt_images):
+    training_set = TrainingSet(emt_images(shifts=[0., 0.1]))
+    monitor = ExtrapolationMonitor(threshold=0.2)
+    flagged = monitor.check(emt_images(shifts=[0.05, 0.5, 0.25]),
+                            training_set)
+    assert flagged == [1]
+    assert monitor.distances == pytest.approx([0.05, 0.4, 0.15])
+    assert monitor.uncertainties is None
+
+
+def test_uncertainty_threshold(emt_images):
+    training_set = TrainingSet(emt_images(shifts=[0.]))
+    monitor = ExtrapolationMonitor(uncertainty=0.1)
+    images = emt_images(shifts=[0., 0., 0.])
+    assert monitor.check(images, training_set,
+                         Ensemble([0.05, 0.2, 0.3])) == [1, 2]
+    # Without an ensemble only distances can be checked.
+    assert monitor.check(images, training_set) == []
+
+
+def test_both_thresholds(emt_images):
+    training_set = TrainingSet(emt_images(shifts=[0.]))
+    monitor = ExtrapolationMonitor(threshold=0.2, uncertainty=0.1)
+    flagged = monitor.check(emt_images(shifts=[0.5, 0., 0.]), training_set,
+                            Ensemble([0., 0.2, 0.]))
+    assert flagged == [0, 1]
+
+
+def test_accelerate_with_monitor(make_neb, run_until):
+    # Any step of the ML-NEB moves the band away from the training set.
+    monitor = ExtrapolationMonitor(threshold=1e-6)
+    neb = make_neb(neb_kwargs={'monitor': monitor})
+    run_until(neb, 0, 'cross_validate')
+
+    with open(neb.workspace.get_path('acceleration.log')) as f:
+        log = f.read()
+    assert 'ML-NEB stopped after' in log
+    assert 'are extrapolated' in log
+    assert neb.flagged == [0, 1]
+
+    records = [record for record in neb.instrumentation.records
+               if '/' not in record['phase']]
+    assert sum(record.get('extrapolation_stops', 0)
+               for record in records) == 1
+    # The flagged intermediates are computed in the cross validation.
+    assert sum(record.get('reference_calls', 0) for record in records) == 6
@@ -0,0 +1,25 @@
+import os
+
+import numpy as np
+import pytest
+
+
+@pytest.mark.parametrize('optimizer', ['BFGS', 'FIRE'])
+def test_accelerate_with_warm_optimizer(make_neb, run_until, optimizer):
+    neb = make_neb(neb_kwargs={'warm_optimizer': True},
+                   neb_optimizer=optimizer)
+    run_until(neb, 1, 'neb')
+
+    filename = neb.workspace.get_path('neb_0.optimizer.npz')
+    assert os.path.isfile(filename)
+    assert os.path.isfile(neb.workspace.get_path('neb_1.optimizer.npz'))
+    with np.load(filename) as data:
+        if optimizer == 'BFGS':
+            # Three coordinates of each atom of the two intermediates.
+            ndofs = 3 * 2 * len(neb.band[0])
+            assert data['H'].shape == (ndofs, ndofs)
+        else:
+            assert float(data['dt']) > 0.
+
+    with open(neb.workspace.get_path('acceleration.log')) as f:
+        assert 'Optimizer state read from %s' % filename in f.read()
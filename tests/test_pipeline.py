@@ -0,0 +1,49 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+import numpy as np
+import pytest
+from ase.calculators.emt import EMT
+
+from mlutils.cache import ReferenceCache
+
+
+def test_callback_fraction_counts_submitted_images(tmp_path, make_neb,
+                                                   emt_images):
+    neb = make_neb()
+    cache = ReferenceCache(str(tmp_path / 'cache'))
+    images = emt_images(4)
+    for image in images[:3]:
+        cache.put(image, 0., np.zeros((len(image), 3)), neb.calc)
+
+    # Only one image misses the cache, so half of the submitted images is
+    # reached as soon as it arrives.
+    arrived = []
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        neb.set_calculators([image.copy() for image in images], neb.calc,
+                            calc_name='EMT', cache=cache,
+                            callback=arrived.append, callback_fraction=0.5,
+                            executor=executor)
+    assert len(arrived) == 1
+    assert len(arrived[0]) == 1
+    assert np.allclose(arrived[0][0].positions, images[3].positions)
+
+
+def test_accelerate_with_pipeline(make_neb, run_until):
+    neb = make_neb(pipeline=True, workers=2)
+    run_until(neb, 1, 'train')
+
+    # The model of iteration 1 starts from the one pretrained while the
+    # reference calculations of iteration 0 were running.
+    with open(neb.workspace.get_path('acceleration.log')) as f:
+        log = f.read()
+    assert 'Pretraining 0-pretrained with 1 new images' in log
+    assert 'Warm start from parameters in %s' % \
+        neb.workspace.get_path('0-pretrained') in log
+    assert os.path.isfile(neb.workspace.get_path('1.amp'))
+    assert len(neb.training_set) == 6
+
+
+def test_pipeline_needs_workers(make_neb):
+    with pytest.raises(ValueError):
+        make_neb(pipeline=True, calc=EMT())
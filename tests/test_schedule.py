@@ -0,0 +1,38 @@
+import pytest
+
+from mlutils.schedule import StepSchedule, AdaptiveSchedule
+
+
+def test_step_schedule():
+    schedule = StepSchedule(2.)
+    assert schedule.get_fmax(1., 0.05, []) == 0.5
+    assert schedule.get_fmax(0.08, 0.05, []) == 0.05
+    assert StepSchedule().get_fmax(1., 0.05, []) == 1.
+
+
+def test_adaptive_schedule_first_iteration():
+    schedule = AdaptiveSchedule(0.01)
+    assert schedule.get_fmax(1., 0.05, []) == 1.
+    assert schedule.get_fmax(0.01, 0.05, []) == 0.05
+
+
+def test_adaptive_schedule_within_tolerance():
+    schedule = AdaptiveSchedule(0.01, max_factor=4.)
+    assert schedule.get_fmax(1., 0.05, [(1., 0.005, 0.008)]) == 0.25
+
+
+def test_adaptive_schedule_far_from_tolerance():
+    schedule = AdaptiveSchedule(0.01, max_factor=4.)
+    # Three times the tolerance divides by 1 + 3 / 3.
+    assert schedule.get_fmax(1., 0.05, [(1., 0.001, 0.03)]) == \
+        pytest.approx(0.5)
+
+
+def test_adaptive_schedule_uses_rate():
+    schedule = AdaptiveSchedule(0.01, max_factor=4.)
+    improving = [(1., 0.001, 0.06), (1., 0.001, 0.03)]
+    assert schedule.get_fmax(1., 0.05, improving) == pytest.approx(0.25)
+
+    # The fmax is kept when the error got worse.
+    worse = [(1., 0.001, 0.02), (1., 0.001, 0.03)]
+    assert schedule.get_fmax(1., 0.05, worse) == 1.
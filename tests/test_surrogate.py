@@ -0,0 +1,15 @@
+import numpy as np
+
+
+def test_accelerate_with_batched_prediction(make_neb, run_until):
+    neb = make_neb(batched_prediction=True)
+    completed = run_until(neb, 1, 'neb')
+    assert completed == [(0, 'train'), (0, 'neb'), (0, 'cross_validate'),
+                         (1, 'extend'), (1, 'train'), (1, 'neb')]
+
+    # All images of the optimized band keep the predictions of the model.
+    assert len(neb.band) == 4
+    for image in neb.band:
+        assert np.isfinite(image.get_potential_energy())
+        assert image.get_forces(apply_constraint=False).shape == \
+            (len(image), 3)
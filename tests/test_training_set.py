@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+from ase.calculators.emt import EMT
+
+from mlutils.training_set import TrainingSet
+
+
+def test_npz_round_trip(tmp_path, emt_images):
+    images = emt_images(20)
+    training_set = TrainingSet(images)
+    filename = str(tmp_path / 'training.npz')
+    training_set.save(filename)
+    assert not (tmp_path / 'training.npz.tmp').exists()
+
+    loaded = TrainingSet.load(filename)
+    assert len(loaded) == len(images)
+    for image, other in zip(images, loaded):
+        assert np.allclose(image.get_positions(), other.get_positions())
+        assert np.allclose(image.get_cell(), other.get_cell())
+        assert (image.get_tags() == other.get_tags()).all()
+        assert other.get_potential_energy() == pytest.approx(
+                image.get_potential_energy())
+        assert np.allclose(image.get_forces(apply_constraint=False),
+                           other.get_forces(apply_constraint=False))
+        assert other.constraints[0].index.tolist() == \
+            image.constraints[0].index.tolist()
+
+
+def test_append_other_atoms(emt_images):
+    training_set = TrainingSet(emt_images(2))
+    image = emt_images(1)[0]
+    del image[0]
+    image.calc = EMT()
+    with pytest.raises(ValueError):
+        training_set.append(image)
+
+
+def test_filter_duplicates(emt_images):
+    images = emt_images(4)
+    training_set = TrainingSet(images[:2])
+
+    duplicate = images[1].copy()
+    duplicate.positions[-1, 1] += 0.01
+    near = images[3].copy()
+    near.positions[-1, 1] += 0.01
+    accepted, rejected = training_set.filter_duplicates(
+            [duplicate, images[2], images[3], near], threshold=0.05)
+
+    assert accepted == [images[2], images[3]]
+    assert [image for image, distance in rejected] == [duplicate, near]
+    assert [distance for image, distance in rejected] == pytest.approx(
+            [0.01, 0.01])
+
+
+def test_evict_oldest(emt_images):
+    training_set = TrainingSet(emt_images(10))
+    removed = training_set.evict(6, policy='oldest', pinned=[0, 9])
+    assert removed == [1, 2, 3, 4]
+    assert len(training_set) == 6
+    assert training_set[1].positions[-1, 0] == pytest.approx(
+            emt_images(6)[5].positions[-1, 0])
+
+
+def test_evict_farthest(emt_images):
+    images = emt_images(10)
+    training_set = TrainingSet(images)
+    removed = training_set.evict(6, policy='farthest', pinned=[0],
+                                 band=images[:2])
+    assert removed == [6, 7, 8, 9]
+
+    with pytest.raises(ValueError):
+        training_set.evict(2, policy='farthest')
+
+
+def test_evict_diversity(emt_images):
+    training_set = TrainingSet(emt_images(9))
+    removed = training_set.evict(3, policy='diversity', pinned=[0])
+    # Farthest point sampling from the first image keeps both ends and
+    # the middle of the path.
+    assert removed == [1, 2, 3, 5, 6, 7]
+    assert len(training_set) == 3
+
+
+def test_evict_diversity_duplicates(emt_images):
+    images = emt_images(2) + [emt_images(2)[1] for index in range(4)]
+    training_set = TrainingSet(images)
+    removed = training_set.evict(4, policy='diversity', pinned=[0])
+    assert len(removed) == 2
+    assert len(training_set) == 4
+
+
+def test_evict_unknown_policy(emt_images):
+    training_set = TrainingSet(emt_images(4))
+    with pytest.raises(ValueError):
+        training_set.evict(2, policy='random')
@@ -0,0 +1,25 @@
+import os
+
+
+def test_warm_start_keeps_settings(tmp_path, make_neb, run_until, amp_calc):
+    from amp.regression import Regressor
+
+    amp_calc.model.regressor = Regressor(optimizer='L-BFGS-B')
+    amp_calc.model.checkpoints = 7
+    neb = make_neb(neb_kwargs={'warm_start': True}, amp_calc=amp_calc)
+    run_until(neb, 1, 'train')
+
+    # The model of iteration 1 started from the parameters of iteration 0.
+    with open(neb.workspace.get_path('acceleration.log')) as f:
+        assert 'Warm start from parameters in %s' % \
+            neb.workspace.get_path('0.amp') in f.read()
+
+    model = neb.get_model('2')
+    assert model.model.regressor.optimizer_kwargs['method'] == 'L-BFGS-B'
+    assert model.model.checkpoints == 7
+    assert model.model.lossfunction.parameters['convergence'] == \
+        amp_calc.model.lossfunction.parameters['convergence']
+    assert model.logging is False
+
+    # Nothing is written outside of the workspace.
+    assert not os.path.exists(str(tmp_path / 'amp-log.txt'))
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+from ase.build import bulk, molecule
+from ase.calculators.emt import EMT
+from ase.io import Trajectory
+
+from mlutils.worker import CalculatorWorker
+
+
+@pytest.fixture
+def worker(tmp_path):
+    worker = CalculatorWorker(calc='emt', path=str(tmp_path), timeout=60.)
+    yield worker
+    worker.close()
+
+
+def get_reference(image):
+    image = image.copy()
+    image.calc = EMT()
+    return image.get_potential_energy(), image.get_forces()
+
+
+def test_results_match_emt(worker):
+    image = bulk('Cu', cubic=True) * (2, 1, 1)
+    image.rattle(0.05, seed=1)
+    for step in range(3):
+        image.positions[0] += 0.02
+        energy, forces = worker.calculate(image)
+        reference = get_reference(image)
+        assert energy == pytest.approx(reference[0])
+        assert np.allclose(forces, reference[1])
+
+    # Other atoms are computed on a new Atoms object of the worker.
+    other = molecule('H2O')
+    energy, forces = worker.calculate(other)
+    assert energy == pytest.approx(get_reference(other)[0])
+
+
+def test_errors_are_raised_and_worker_continues(worker):
+    with pytest.raises(RuntimeError):
+        worker.calculate(molecule('CH3Cl'))
+
+    image = bulk('Al', cubic=True)
+    assert worker.calculate(image)[0] == pytest.approx(
+            get_reference(image)[0])
+
+
+def test_run_writes_trajectory(worker, tmp_path):
+    images = [bulk('Au', cubic=True) for index in range(2)]
+    images[1].positions[1] += 0.1
+    filename = str(tmp_path / 'calculator.traj')
+    worker.run(images, filename=filename)
+
+    written = list(Trajectory(filename))
+    assert len(written) == 2
+    for image, other in zip(images, written):
+        assert np.allclose(image.positions, other.positions)
+        assert other.get_potential_energy() == pytest.approx(
+                get_reference(image)[0])
+
+
+def test_calculator_file(tmp_path):
+    with open(str(tmp_path / 'emt.calc'), 'w') as f:
+        f.write('from ase.calculators.emt import EMT\n'
+                'calc = EMT()\n')
+    worker = CalculatorWorker(calc=str(tmp_path / 'emt.calc'),
+                              path=str(tmp_path), timeout=60.)
+    try:
+        image = bulk('Ni', cubic=True)
+        assert worker.calculate(image)[0] == pytest.approx(
+                get_reference(image)[0])
+    finally:
+        worker.close()
+    assert worker.process.returncode == 0
+
+
+def test_worker_that_does_not_start(tmp_path):
+    with pytest.raises(RuntimeError):
+        CalculatorWorker(calc=str(tmp_path / 'missing.calc'),
+                         path=str(tmp_path), timeout=60.)
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+from ase.calculators.emt import EMT
+
+
+def test_accelerate_with_workers(make_neb, run_until):
+    neb = make_neb(workers=2)
+    completed = run_until(neb, 0, 'cross_validate')
+    assert completed == [(0, 'train'), (0, 'neb'), (0, 'cross_validate')]
+
+    # Images computed by the workers carry the results of the reference.
+    images = neb.training_set[:] + neb.reference_images
+    for image in images:
+        expected = image.copy()
+        expected.calc = EMT()
+        assert image.get_potential_energy() == pytest.approx(
+                expected.get_potential_energy())
+        assert np.allclose(image.get_forces(apply_constraint=False),
+                           expected.get_forces(apply_constraint=False))
+
+    # The initial band, with its end points, and the two intermediates of
+    # the cross validation.
+    reference_calls = sum(record.get('reference_calls', 0)
+                          for record in neb.instrumentation.records
+                          if '/' not in record['phase'])
+    assert reference_calls == 6
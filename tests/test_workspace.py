@@ -0,0 +1,55 @@
+import os
+import time
+
+from mlutils.workspace import Workspace
+
+
+def test_get_path(tmp_path):
+    assert Workspace().get_path('neb_0.traj') == 'neb_0.traj'
+    workspace = Workspace(str(tmp_path / 'run'))
+    assert os.path.isdir(workspace.path)
+    assert workspace.get_path('neb_0.traj') == \
+        os.path.join(workspace.path, 'neb_0.traj')
+
+
+def test_scratch(tmp_path):
+    workspace = Workspace.scratch(prefix='test-', root=str(tmp_path))
+    assert os.path.dirname(workspace.path) == str(tmp_path)
+    assert os.path.basename(workspace.path).startswith('test-')
+
+
+def test_checkpoint_copies_new_and_modified_files(tmp_path):
+    persistent = str(tmp_path / 'persistent')
+    workspace = Workspace(str(tmp_path / 'scratch'), persistent=persistent)
+    os.makedirs(workspace.get_path('0.ampdb'))
+    for filename in ('acceleration.log', os.path.join('0.ampdb', 'data')):
+        with open(workspace.get_path(filename), 'w') as f:
+            f.write('first')
+    workspace.checkpoint()
+
+    with open(os.path.join(persistent, '0.ampdb', 'data')) as f:
+        assert f.read() == 'first'
+
+    # Only the modified file is copied again.
+    with open(workspace.get_path('acceleration.log'), 'w') as f:
+        f.write('second')
+    later = time.time() + 10.
+    os.utime(workspace.get_path('acceleration.log'), (later, later))
+
+    class Log(list):
+        write = list.append
+
+        def flush(self):
+            pass
+
+    logfile = Log()
+    workspace.checkpoint(logfile=logfile)
+    assert logfile == ['Checkpoint: 1 files copied to %s\n' % persistent]
+    with open(os.path.join(persistent, 'acceleration.log')) as f:
+        assert f.read() == 'second'
+
+
+def test_checkpoint_without_persistent(tmp_path):
+    workspace = Workspace(str(tmp_path))
+    workspace.checkpoint()
+    assert os.listdir(str(tmp_path)) == []